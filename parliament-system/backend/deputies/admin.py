@@ -1,8 +1,14 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Coalesce, NullIf
 from .models import User, Party, Deputy, Session, Attendance, Vote, DeputyVote
 
 
+# Вычисляемые колонки списков берутся из аннотаций get_queryset и сортируются по ним:
+# число запросов на страницу не зависит от числа строк
+
+
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     list_display = ['username', 'email', 'user_type', 'is_active', 'is_staff']
@@ -22,6 +28,13 @@ class PartyAdmin(admin.ModelAdmin):
     list_filter = ['founded_date']
     ordering = ['name']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_members_count()
+
+    @admin.display(description='Депутатов', ordering='deputies_count')
+    def members_count(self, obj):
+        return obj.members_count
+
 
 @admin.register(Deputy)
 class DeputyAdmin(admin.ModelAdmin):
@@ -30,14 +43,23 @@ class DeputyAdmin(admin.ModelAdmin):
     search_fields = ['first_name', 'last_name', 'middle_name', 'district']
     ordering = ['last_name', 'first_name']
     raw_id_fields = ['user', 'party']
-    
+    # Партия может быть пустой, а select_related() без аргументов такие связи не подгружает
+    list_select_related = ['party']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(attendance_rate_value=Case(
+            When(attendance_total=0, then=Value(0.0)),
+            default=F('attendance_present') * 100.0 / F('attendance_total'),
+            output_field=FloatField(),
+        ))
+
+    @admin.display(description='ФИО', ordering='last_name')
     def full_name(self, obj):
         return obj.full_name
-    full_name.short_description = 'ФИО'
-    
+
+    @admin.display(description='Посещаемость', ordering='attendance_rate_value')
     def attendance_rate(self, obj):
         return f"{obj.attendance_rate}%"
-    attendance_rate.short_description = 'Посещаемость'
 
 
 @admin.register(Session)
@@ -47,10 +69,19 @@ class SessionAdmin(admin.ModelAdmin):
     search_fields = ['title', 'agenda', 'location']
     ordering = ['-date']
     date_hierarchy = 'date'
-    
+
+    def get_queryset(self, request):
+        # Знаменатель явки как в Session.attendance_rate: снимок или текущее число активных депутатов
+        active = Deputy.active_count()
+        return super().get_queryset(request).with_attendance().annotate(attendance_rate_value=Coalesce(
+            F('present_count') * 100.0 / NullIf(Coalesce('deputies_snapshot', Value(active)), 0),
+            Value(0.0),
+            output_field=FloatField(),
+        ))
+
+    @admin.display(description='Явка', ordering='attendance_rate_value')
     def attendance_rate_display(self, obj):
         return f"{obj.attendance_rate}%"
-    attendance_rate_display.short_description = 'Явка'
 
 
 @admin.register(Attendance)
@@ -60,6 +91,9 @@ class AttendanceAdmin(admin.ModelAdmin):
     search_fields = ['deputy__first_name', 'deputy__last_name', 'session__title', 'absence_reason']
     raw_id_fields = ['deputy', 'session']
     ordering = ['-session__date', 'deputy__last_name']
+    list_select_related = ['deputy', 'session']
+    # Таблица большая: полный COUNT(*) при каждом фильтре не нужен
+    show_full_result_count = False
 
 
 @admin.register(Vote)
@@ -69,11 +103,12 @@ class VoteAdmin(admin.ModelAdmin):
     search_fields = ['title', 'description']
     raw_id_fields = ['session']
     ordering = ['-created_at']
-    
+    list_select_related = ['tally', 'session']
+
+    @admin.display(description='Результаты', ordering='tally__votes_for')
     def get_results(self, obj):
         results = obj.results
         return f"За: {results['for']}, Против: {results['against']}, Воздержались: {results['abstain']}"
-    get_results.short_description = 'Результаты'
 
 
 @admin.register(DeputyVote)
@@ -82,4 +117,7 @@ class DeputyVoteAdmin(admin.ModelAdmin):
     list_filter = ['choice', 'created_at', 'deputy__party']
     search_fields = ['deputy__first_name', 'deputy__last_name', 'vote__title']
     raw_id_fields = ['deputy', 'vote']
-    ordering = ['-created_at']
\ No newline at end of file
+    # Порядок записи по первичному ключу: сортировка по created_at без индекса перебирала бы всю таблицу
+    ordering = ['-id']
+    list_select_related = ['deputy', 'vote']
+    show_full_result_count = False
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+Аутентификация по токену с кэшем.
+
+TokenAuthentication читает Token вместе с User на каждый запрос, в том числе на
+каждое открытие списка или карточки. Здесь для чтения (GET, HEAD, OPTIONS) токен
+берется из кэша TOKEN_CACHE_ALIAS (ограниченного по числу записей, с TTL
+TOKEN_CACHE_TIMEOUT), и запрос к базе нужен только при промахе. В кэше лежит
+не сам Token с пользователем (в нем хэш пароля), а проекция: время создания
+токена и поля пользователя из USER_FIELDS; остальные поля пользователя
+отложены и читаются из базы при обращении.
+
+Запись сбрасывается при удалении токена (выход, смена пароля, деактивация - см.
+deputies/signals.py) и при любом сохранении пользователя. Кэш в памяти процесса
+сбрасывается только в том воркере, где произошло изменение, поэтому запросы на
+изменение данных всегда сверяют токен с базой (и обновляют кэш): отозванным
+токеном нельзя ничего записать ни в одном воркере. Чтение в остальных воркерах
+видит отзыв через TOKEN_CACHE_TIMEOUT секунд, а при CACHE_BACKEND=file (общий
+кэш воркеров одной машины, по умолчанию в контейнере) - сразу.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions, permissions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import User
+
+# Поля пользователя в кэше: все, что нужно проверкам прав. Порядок - как в модели:
+# from_db с частью полей сопоставляет значения с полями по этому порядку
+USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {'id', 'username', 'first_name', 'last_name', 'user_type', 'is_active',
+                         'is_staff', 'is_superuser'}
+)
+
+
+def get_cache():
+    alias = getattr(settings, 'TOKEN_CACHE_ALIAS', 'tokens')
+    return caches[alias if alias in settings.CACHES else 'default']
+
+
+def _key(token_key):
+    # Сам токен в ключ не попадает: ключи файлового кэша видны на диске
+    return 'auth:token:' + hashlib.sha256(token_key.encode('utf-8')).hexdigest()
+
+
+def invalidate(token_keys):
+    """Сбросить кэшированные токены token_keys"""
+    get_cache().delete_many([_key(key) for key in token_keys])
+
+
+def invalidate_user(user_id):
+    """Сбросить кэшированные токены пользователя"""
+    invalidate(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+
+
+def _load(key):
+    """(время создания токена, значения USER_FIELDS) из базы или None"""
+    row = Token.objects.filter(key=key).values_list(
+        'created', *[f'user__{name}' for name in USER_FIELDS]
+    ).first()
+    return None if row is None else (row[0], row[1:])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, читающая проекцию токена с пользователем из кэша"""
+
+    def authenticate(self, request):
+        # Аутентификатор создается на каждый запрос, состояние не переходит между ними
+        self.verify = request.method not in permissions.SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        cache = get_cache()
+        cache_key = _key(key)
+        entry = None if getattr(self, 'verify', False) else cache.get(cache_key)
+        if entry is None:
+            entry = _load(key)
+            if entry is None:
+                cache.delete(cache_key)
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            cache.set(cache_key, entry, getattr(settings, 'TOKEN_CACHE_TIMEOUT', 60))
+        created, values = entry
+        db = router.db_for_read(User)
+        user = User.from_db(db, USER_FIELDS, values)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        token = Token.from_db(db, ['key', 'user_id', 'created'], [key, user.pk, created])
+        token.user = user
+        return user, token
@@ -0,0 +1,207 @@
+"""
+Сплоченность партий и партийная дисциплина по голосам депутатов.
+
+Голоса пачки голосований загружаются одним запросом в массивы NumPy: число
+голосов каждой партии за каждый вариант, линия партии (вариант, набравший
+строго больше остальных) и отступники считаются для всех голосований сразу.
+Сплоченность - индекс согласия Хикса - Нури - Ролана (max - (n - max) / 2) / n:
+1 - партия голосует единогласно, 0 - голоса поровну разделились на три варианта.
+
+Разбор завершенного голосования (is_active=False) кэшируется по голосованию,
+активные считаются заново. Депутаты относятся к текущей партии, как и в
+сводной посещаемости; смена партии сбрасывает весь кэш.
+"""
+
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Deputy, DeputyVote, Vote
+from .rollups import buckets, day_start
+
+CHOICES = ('for', 'against', 'abstain')
+CHOICE_INDEX = {choice: index for index, choice in enumerate(CHOICES)}
+NO_PARTY = -1
+
+GENERATION_KEY = 'cohesion:generation'
+
+
+def get_cache():
+    return caches[getattr(settings, 'ANALYTICS_CACHE_ALIAS', 'default')]
+
+
+def _generation():
+    return get_cache().get(GENERATION_KEY, 0)
+
+
+def _vote_key(generation, vote_id):
+    return f'cohesion:vote:{generation}:{vote_id}'
+
+
+def agreement(counts):
+    """Индекс согласия для массива (..., 3) голосов за/против/воздержался"""
+    counts = np.asarray(counts, dtype=np.float64)
+    n = counts.sum(axis=-1)
+    top = counts.max(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 0, (top - (n - top) / 2) / n, np.nan)
+
+
+def _empty():
+    return {
+        'parties': np.empty(0, dtype=np.int64),
+        'counts': np.empty((0, len(CHOICES)), dtype=np.int64),
+        'deputies': np.empty(0, dtype=np.int64),
+        'party_of': np.empty(0, dtype=np.int64),
+        'defected': np.empty(0, dtype=bool),
+    }
+
+
+def analyze_votes(vote_ids):
+    """Разобрать голосования: {vote_id: массивы партий, их голосов и отступников}"""
+    vote_ids = list(vote_ids)
+    result = {vote_id: _empty() for vote_id in vote_ids}
+    rows = DeputyVote.objects.filter(vote_id__in=vote_ids).order_by().values_list(
+        'vote_id', 'deputy_id', 'deputy__party_id', 'choice'
+    )
+    data = np.array([
+        (vote_id, deputy_id, NO_PARTY if party_id is None else party_id, CHOICE_INDEX[choice])
+        for vote_id, deputy_id, party_id, choice in rows
+        if choice in CHOICE_INDEX
+    ], dtype=np.int64).reshape(-1, 4)
+    if not len(data):
+        return result
+
+    votes, vote_index = np.unique(data[:, 0], return_inverse=True)
+    parties, party_index = np.unique(data[:, 2], return_inverse=True)
+    choice = data[:, 3]
+    counts = np.zeros((len(votes), len(parties), len(CHOICES)), dtype=np.int64)
+    np.add.at(counts, (vote_index, party_index, choice), 1)
+
+    # Линия партии есть, только если один вариант набрал больше остальных
+    top = counts.max(axis=2)
+    clear = (counts == top[..., None]).sum(axis=2) == 1
+    line = counts.argmax(axis=2)
+    defected = (
+        clear[vote_index, party_index]
+        & (choice != line[vote_index, party_index])
+        & (data[:, 2] != NO_PARTY)
+    )
+
+    order = np.argsort(vote_index, kind='stable')
+    bounds = np.searchsorted(vote_index[order], np.arange(len(votes) + 1))
+    voted = counts.sum(axis=2) > 0
+    for position, vote_id in enumerate(votes.tolist()):
+        rows = order[bounds[position]:bounds[position + 1]]
+        result[vote_id] = {
+            'parties': parties[voted[position]],
+            'counts': counts[position][voted[position]],
+            'deputies': data[rows, 1],
+            'party_of': data[rows, 2],
+            'defected': defected[rows],
+        }
+    return result
+
+
+def vote_analyses(votes):
+    """Разборы голосований [(id, is_active)]: завершенные берутся из кэша"""
+    cache = get_cache()
+    generation = _generation()
+    keys = {vote_id: _vote_key(generation, vote_id) for vote_id, is_active in votes if not is_active}
+    cached = cache.get_many(keys.values())
+    analyses = {vote_id: cached[key] for vote_id, key in keys.items() if key in cached}
+    missing = [vote_id for vote_id, _ in votes if vote_id not in analyses]
+    if missing:
+        computed = analyze_votes(missing)
+        cache.set_many({keys[vote_id]: computed[vote_id] for vote_id in missing if vote_id in keys}, None)
+        analyses.update(computed)
+    return analyses
+
+
+def party_report(party_id, date_from=None, date_to=None, period='month', limit=20, rebels=10):
+    """Сплоченность партии по голосованиям и периодам и самые частые отступники"""
+    votes = Vote.objects.order_by('session__date', 'pk')
+    if date_from:
+        votes = votes.filter(session__date__gte=day_start(date_from))
+    if date_to:
+        votes = votes.filter(session__date__lt=day_start(date_to + timedelta(days=1)))
+    votes = list(votes.values_list('pk', 'is_active', 'title', 'session__date'))
+    analyses = vote_analyses([(pk, is_active) for pk, is_active, _, _ in votes])
+
+    per_vote = []
+    for vote_id, is_active, title, moment in votes:
+        analysis = analyses[vote_id]
+        found = np.flatnonzero(analysis['parties'] == party_id)
+        if not len(found):
+            continue
+        counts = analysis['counts'][found[0]]
+        per_vote.append({
+            'vote': vote_id,
+            'title': title,
+            'date': moment,
+            'period': buckets(moment)[period],
+            'results': dict(zip(CHOICES, counts.tolist())),
+            'cohesion': round(float(agreement(counts)), 4),
+        })
+
+    periods = {}
+    for item in per_vote:
+        periods.setdefault(item['period'], []).append(item['cohesion'])
+
+    members = [(analysis, analysis['party_of'] == party_id) for analysis in analyses.values()]
+    deputies = np.concatenate([analysis['deputies'][mask] for analysis, mask in members] + [_empty()['deputies']])
+    defected = np.concatenate([analysis['defected'][mask] for analysis, mask in members] + [_empty()['defected']])
+    top = []
+    if len(deputies):
+        ids, index = np.unique(deputies, return_inverse=True)
+        voted = np.bincount(index)
+        breaks = np.bincount(index, weights=defected).astype(np.int64)
+        # Чаще всего расходящиеся с партией: по числу расхождений, затем по их доле
+        ranking = np.lexsort((-breaks / voted, -breaks))
+        top = [
+            (int(ids[i]), int(voted[i]), int(breaks[i]))
+            for i in ranking[:rebels] if breaks[i] > 0
+        ]
+    names = {
+        deputy.pk: str(deputy)
+        for deputy in Deputy.objects.filter(pk__in=[pk for pk, _, _ in top]).only(
+            'first_name', 'last_name', 'middle_name'
+        )
+    } if top else {}
+
+    values = [item['cohesion'] for item in per_vote]
+    return {
+        'party': party_id,
+        'votes_count': len(per_vote),
+        'cohesion': round(float(np.mean(values)), 4) if values else None,
+        'periods': [
+            {'period': start, 'votes': len(items), 'cohesion': round(float(np.mean(items)), 4)}
+            for start, items in sorted(periods.items())
+        ],
+        'votes': [
+            {key: value for key, value in item.items() if key != 'period'}
+            for item in reversed(per_vote[-limit:])
+        ],
+        'rebels': [
+            {'deputy': pk, 'name': names.get(pk, ''), 'votes': voted_count, 'defections': count,
+             'rate': round(count * 100 / voted_count, 2)}
+            for pk, voted_count, count in top
+        ],
+    }
+
+
+def invalidate_votes(vote_ids):
+    """Сбросить разборы голосований vote_ids"""
+    generation = _generation()
+    get_cache().delete_many([_vote_key(generation, vote_id) for vote_id in vote_ids])
+
+
+def invalidate_all(**kwargs):
+    """Сбросить все разборы (смена партий депутатов); используется как обработчик сигналов"""
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
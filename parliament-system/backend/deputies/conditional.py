@@ -0,0 +1,79 @@
+"""
+Валидаторы для условных GET-запросов (ETag / Last-Modified).
+
+Состояние таблиц, от которых зависит ответ, - версии из TableVersion: одна
+строка на модель, читаются одним запросом по первичному ключу, сколько бы
+строк ни было в самих таблицах. Версия увеличивается после фиксации каждой
+записи в модель (post_save/post_delete, attendance_bulk_changed,
+deputy_votes_bulk_changed, см. deputies/signals.py), а код, пишущий в обход
+сигналов (bulk_create, update), вызывает touch сам. Ответ 304 отдается без
+сериализации.
+"""
+
+import hashlib
+
+from asgiref.local import Local
+from django.db import router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import TableVersion
+
+# Модели, версии которых увеличиваются в транзакции: псевдоним базы -> метки
+_pending = Local()
+
+
+def _bump(labels, using):
+    now = timezone.now()
+    versions = TableVersion.objects.using(using)
+    if versions.filter(label__in=labels).update(version=F('version') + 1, updated_at=now) < len(labels):
+        # Первая запись в модель: строки версии еще нет
+        versions.bulk_create([TableVersion(label=label, version=1, updated_at=now) for label in labels],
+                             ignore_conflicts=True)
+
+
+def _flush(using):
+    labels = getattr(_pending, using, None)
+    if labels:
+        setattr(_pending, using, None)
+        _bump(labels, using)
+
+
+def touch(models, using=None):
+    """Увеличить версии моделей models после фиксации транзакции (вне транзакции - сразу).
+
+    Сколько бы записей ни было в транзакции, версии обновляются одним запросом:
+    первый обработчик on_commit забирает все накопленные метки, остальные ничего не делают.
+    """
+    using = using or router.db_for_write(TableVersion)
+    pending = getattr(_pending, using, None)
+    if pending is None:
+        pending = set()
+        setattr(_pending, using, pending)
+    pending.update(model._meta.label for model in models)
+    transaction.on_commit(lambda: _flush(using), using)
+
+
+def changed(sender, **kwargs):
+    """Обработчик сигналов: изменились строки модели sender"""
+    touch([sender])
+
+
+def probe(models):
+    """Отпечаток таблиц: {метка модели: (время изменения, версия)} одним запросом"""
+    rows = TableVersion.objects.using(router.db_for_read(models[0])).filter(
+        label__in=[model._meta.label for model in models]
+    ).values_list('label', 'updated_at', 'version')
+    return {label: (updated_at, version) for label, updated_at, version in rows}
+
+
+def validators(models, *parts):
+    """ETag и время последнего изменения для ответа, зависящего от таблиц models.
+
+    parts - все, от чего еще зависит представление (путь с параметрами, тип
+    пользователя, формат ответа, период по умолчанию).
+    """
+    state = probe(models)
+    digest = hashlib.sha1(repr((parts, sorted(state.items()))).encode('utf-8')).hexdigest()
+    times = [last for last, _ in state.values() if last is not None]
+    return f'W/"{digest}"', max(times) if times else None
@@ -0,0 +1,116 @@
+"""
+Денормализованные счетчики, которые читают эндпоинты вместо COUNT по Attendance и DeputyVote.
+"""
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Deputy, Session, Attendance, Vote, VoteTally, DeputyVote
+
+
+def apply_attendance_delta(deputy_id, present=0, total=0):
+    """Атомарно сдвинуть счетчики посещаемости депутата"""
+    if not deputy_id or (present == 0 and total == 0):
+        return
+    Deputy.objects.filter(pk=deputy_id).update(
+        attendance_present=F('attendance_present') + present,
+        attendance_total=F('attendance_total') + total,
+    )
+
+
+def _attendance_subqueries():
+    counts = Attendance.objects.filter(deputy=OuterRef('pk')).order_by().values('deputy')
+    present = counts.annotate(c=Count('id', filter=Q(is_present=True))).values('c')
+    total = counts.annotate(c=Count('id')).values('c')
+    return Coalesce(Subquery(present), 0), Coalesce(Subquery(total), 0)
+
+
+def refresh_deputy_attendance(deputy_ids=None):
+    """Пересчитать счетчики посещаемости одним UPDATE (для всех депутатов или для указанных)"""
+    queryset = Deputy.objects.all()
+    if deputy_ids is not None:
+        queryset = queryset.filter(pk__in=list(deputy_ids))
+    present, total = _attendance_subqueries()
+    return queryset.update(attendance_present=present, attendance_total=total)
+
+
+def find_attendance_mismatches():
+    """Депутаты, у которых сохраненные счетчики расходятся с фактическими данными"""
+    present, total = _attendance_subqueries()
+    return list(
+        Deputy.objects.annotate(actual_present=present, actual_total=total)
+        .exclude(attendance_present=F('actual_present'), attendance_total=F('actual_total'))
+        .values('id', 'attendance_present', 'attendance_total', 'actual_present', 'actual_total')
+        .order_by('id')
+    )
+
+
+def snapshot_finished_sessions(active_count=None):
+    """Зафиксировать число активных депутатов у прошедших заседаний без снимка"""
+    if active_count is None:
+        active_count = Deputy.objects.filter(is_active=True).count()
+    return Session.objects.finished().filter(deputies_snapshot__isnull=True).update(
+        deputies_snapshot=active_count
+    )
+
+
+def apply_vote_delta(vote_id, old_choice=None, new_choice=None):
+    """Перенести голос в итогах голосования: снять old_choice и добавить new_choice"""
+    if not vote_id or old_choice == new_choice:
+        return
+    changes = {'updated_at': timezone.now()}
+    if old_choice in VoteTally.CHOICE_FIELDS:
+        field = VoteTally.CHOICE_FIELDS[old_choice]
+        changes[field] = F(field) - 1
+    if new_choice in VoteTally.CHOICE_FIELDS:
+        field = VoteTally.CHOICE_FIELDS[new_choice]
+        changes[field] = F(field) + 1
+    if old_choice is None:
+        changes['total'] = F('total') + 1
+    elif new_choice is None:
+        changes['total'] = F('total') - 1
+    updated = VoteTally.objects.filter(vote_id=vote_id).update(**changes)
+    if not updated and new_choice is not None:
+        # Итогов еще нет (голосование создано до появления таблицы) - считаем с нуля
+        refresh_vote_tallies([vote_id])
+
+
+def _tally_subqueries():
+    counts = DeputyVote.objects.filter(vote=OuterRef('vote_id')).order_by().values('vote')
+    fields = {
+        field: Coalesce(Subquery(counts.annotate(c=Count('id', filter=Q(choice=choice))).values('c')), 0)
+        for choice, field in VoteTally.CHOICE_FIELDS.items()
+    }
+    fields['total'] = Coalesce(Subquery(counts.annotate(c=Count('id')).values('c')), 0)
+    return fields
+
+
+def refresh_vote_tallies(vote_ids=None):
+    """Пересчитать итоги голосований, создав недостающие строки"""
+    votes = Vote.objects.all()
+    if vote_ids is not None:
+        votes = votes.filter(pk__in=list(vote_ids))
+    missing = votes.filter(tally__isnull=True).values_list('pk', flat=True)
+    VoteTally.objects.bulk_create(
+        [VoteTally(vote_id=pk) for pk in missing],
+        ignore_conflicts=True,
+    )
+    tallies = VoteTally.objects.all()
+    if vote_ids is not None:
+        tallies = tallies.filter(vote_id__in=list(vote_ids))
+    return tallies.update(updated_at=timezone.now(), **_tally_subqueries())
+
+
+def find_tally_mismatches():
+    """Голосования, итоги которых расходятся с голосами депутатов"""
+    actual = {f'actual_{name}': value for name, value in _tally_subqueries().items()}
+    stored = [*VoteTally.CHOICE_FIELDS.values(), 'total']
+    mismatches = VoteTally.objects.annotate(**actual).exclude(
+        **{name: F(f'actual_{name}') for name in stored}
+    )
+    missing = Vote.objects.filter(tally__isnull=True, deputy_votes__isnull=False).distinct()
+    return (
+        list(mismatches.values('vote_id', *stored, *actual).order_by('vote_id'))
+        + [{'vote_id': pk, 'missing': True} for pk in missing.values_list('pk', flat=True)]
+    )
@@ -0,0 +1,193 @@
+"""
+Рассылка событий голосования и регистрации подписчикам SSE (см. deputies/streams.py).
+
+Broker - раздача внутри процесса: у каждого подписчика своя очередь asyncio,
+публикация возможна из любого потока (сигналы, пакетная запись голосов).
+SpoolRelay - локальная замена межпроцессной шины (Redis pub/sub и т.п.): события
+дописываются в общий файл EVENTS_SPOOL_PATH, каждый процесс читает его хвост
+и раздает события своим подписчикам.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+RESYNC = object()
+
+
+class Subscription:
+    def __init__(self, broker, channels, max_queue):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_queue)
+
+    def offer(self, frame):
+        """Вызывается в цикле событий подписчика"""
+        if self.queue.full():
+            # Медленный клиент: сбрасываем очередь и просим его перечитать состояние
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            frame = RESYNC
+        self.queue.put_nowait(frame)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    def subscribe(self, *channels):
+        subscription = Subscription(self, channels, self.max_queue)
+        with self._lock:
+            for channel in channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].discard(subscription)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+    def has_subscribers(self, channels=None):
+        """Есть ли подписчики у каналов channels (None - хоть у одного канала)"""
+        with self._lock:
+            if channels is None:
+                return bool(self._subscribers)
+            return any(channel in self._subscribers for channel in channels)
+
+    def publish(self, channels, event):
+        """Отправить событие подписчикам каналов; кадр SSE кодируется один раз на все очереди"""
+        with self._lock:
+            self._sequence += 1
+            targets = set()
+            for channel in channels:
+                targets.update(self._subscribers.get(channel, ()))
+            sequence = self._sequence
+        if not targets:
+            return 0
+        frame = encode(event, sequence)
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, frame)
+            except RuntimeError:
+                # Цикл событий подписчика уже закрыт
+                self.unsubscribe(subscription)
+        return len(targets)
+
+
+class SpoolRelay:
+    """Межпроцессная раздача через общий файл (только для локального запуска нескольких воркеров)"""
+
+    poll_interval = 0.05
+
+    def __init__(self, path, broker):
+        self.path = path
+        self.broker = broker
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def publish(self, channels, event):
+        self._ensure_reader()
+        line = json.dumps({'channels': list(channels), 'event': event}, ensure_ascii=False) + '\n'
+        # Одна запись в режиме O_APPEND не перемешивается с записями других процессов
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    def _ensure_reader(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._tail, name='events-spool', daemon=True)
+                self._thread.start()
+
+    def _tail(self):
+        open(self.path, 'a').close()
+        with open(self.path, encoding='utf-8') as spool:
+            spool.seek(0, os.SEEK_END)
+            buffer = ''
+            while True:
+                chunk = spool.readline()
+                if not chunk:
+                    time.sleep(self.poll_interval)
+                    continue
+                buffer += chunk
+                if not buffer.endswith('\n'):
+                    continue
+                try:
+                    message = json.loads(buffer)
+                except ValueError:
+                    message = None
+                buffer = ''
+                if message:
+                    self.broker.publish(message['channels'], message['event'])
+
+
+def encode(event, sequence):
+    data = json.dumps(event, ensure_ascii=False, separators=(',', ':'))
+    return f'id: {sequence}\nevent: {event["type"]}\ndata: {data}\n\n'.encode('utf-8')
+
+
+broker = Broker(max_queue=getattr(settings, 'EVENTS_MAX_QUEUE', 256))
+_relay = None
+
+
+def get_relay():
+    global _relay
+    path = getattr(settings, 'EVENTS_SPOOL_PATH', None)
+    if path and _relay is None:
+        _relay = SpoolRelay(path, broker)
+        _relay._ensure_reader()
+    return _relay
+
+
+def publish(channels, build_event):
+    """Опубликовать событие после фиксации транзакции.
+
+    build_event вызывается только если событие кому-то нужно: при раздаче внутри
+    процесса без подписчиков запросы к базе не выполняются.
+    """
+    def send():
+        relay = get_relay()
+        if relay is None and not broker.has_subscribers(channels):
+            return
+        event = build_event()
+        if relay is not None:
+            relay.publish(channels, event)
+        else:
+            broker.publish(channels, event)
+
+    transaction.on_commit(send)
+
+
+def listening():
+    """Нужны ли события кому-нибудь: подписчики в этом процессе или раздача через общий файл"""
+    return get_relay() is not None or broker.has_subscribers()
+
+
+def session_channel(session_id):
+    return f'session:{session_id}'
+
+
+def vote_channel(vote_id):
+    return f'vote:{vote_id}'
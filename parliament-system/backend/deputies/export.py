@@ -0,0 +1,230 @@
+"""
+Потоковая выгрузка открытых данных: посещаемость, голосования, поименные голоса,
+заседания и депутаты в CSV и NDJSON.
+
+Строки читаются по возрастанию id итератором с chunk_size: на PostgreSQL это
+серверный курсор, на SQLite - fetchmany, поэтому память не зависит от объема
+выгрузки. Ответ сжимается gzip по мере генерации; после каждой пачки строк
+поток сбрасывается (Z_SYNC_FLUSH), так что оборванная загрузка распаковывается
+до последней полной пачки. Продолжение - ?since_id= с id последней полученной
+строки: id - первое поле каждой строки.
+"""
+
+import csv
+import io
+import json
+import re
+import zlib
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+
+from .models import Attendance, Deputy, DeputyVote, Session, Vote
+from .rollups import day_start
+
+CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+GZIP_LEVEL = getattr(settings, 'EXPORT_GZIP_LEVEL', 6)
+
+_ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+# Набор -> модель, путь к заседанию (для фильтра по датам и закрытых заседаний)
+# и колонки (имя, поле, преобразование). Преобразования: datetime - местное время
+# ISO 8601, iso - дата или время ISO 8601, session_date - дата заседания по его id
+# (заседаний немного, их даты загружаются один раз, а не соединением на каждую строку)
+DATASETS = {
+    'attendance': {
+        'model': Attendance,
+        'session': 'session__',
+        'columns': [
+            ('id', 'pk', None),
+            ('session', 'session_id', None),
+            ('session_date', 'session_id', 'session_date'),
+            ('deputy', 'deputy_id', None),
+            ('is_present', 'is_present', None),
+            ('absence_reason', 'absence_reason', None),
+            ('arrival_time', 'arrival_time', 'iso'),
+            ('departure_time', 'departure_time', 'iso'),
+        ],
+    },
+    'votes': {
+        'model': Vote,
+        'session': 'session__',
+        'columns': [
+            ('id', 'pk', None),
+            ('session', 'session_id', None),
+            ('session_date', 'session_id', 'session_date'),
+            ('title', 'title', None),
+            ('description', 'description', None),
+            ('is_active', 'is_active', None),
+            ('created_at', 'created_at', 'datetime'),
+        ],
+    },
+    'deputy-votes': {
+        'model': DeputyVote,
+        'session': 'vote__session__',
+        'columns': [
+            ('id', 'pk', None),
+            ('vote', 'vote_id', None),
+            ('session', 'vote__session_id', None),
+            ('session_date', 'vote__session_id', 'session_date'),
+            ('deputy', 'deputy_id', None),
+            ('choice', 'choice', None),
+            ('created_at', 'created_at', 'datetime'),
+        ],
+    },
+    'sessions': {
+        'model': Session,
+        'session': '',
+        'columns': [
+            ('id', 'pk', None),
+            ('date', 'date', 'datetime'),
+            ('session_type', 'session_type', None),
+            ('title', 'title', None),
+            ('agenda', 'agenda', None),
+            ('location', 'location', None),
+            ('duration_minutes', 'duration_minutes', None),
+            ('is_closed', 'is_closed', None),
+            ('deputies_snapshot', 'deputies_snapshot', None),
+        ],
+    },
+    # Депутаты не привязаны к заседаниям: фильтр по датам к ним не применяется
+    'deputies': {
+        'model': Deputy,
+        'session': None,
+        'columns': [
+            ('id', 'pk', None),
+            ('last_name', 'last_name', None),
+            ('first_name', 'first_name', None),
+            ('middle_name', 'middle_name', None),
+            ('party', 'party_id', None),
+            ('party_name', 'party__short_name', None),
+            ('district', 'district', None),
+            ('election_date', 'election_date', 'iso'),
+            ('is_active', 'is_active', None),
+        ],
+    },
+}
+
+
+def queryset(dataset, date_from=None, date_to=None, since_id=0, include_closed=False):
+    """Строки набора по возрастанию id после since_id (заседания в date_from..date_to)"""
+    spec = DATASETS[dataset]
+    rows = spec['model'].objects.order_by('pk')
+    if since_id:
+        rows = rows.filter(pk__gt=since_id)
+    prefix = spec['session']
+    if prefix is not None:
+        if date_from:
+            rows = rows.filter(**{f'{prefix}date__gte': day_start(date_from)})
+        if date_to:
+            rows = rows.filter(**{f'{prefix}date__lt': day_start(date_to + timedelta(days=1))})
+        if not include_closed:
+            rows = rows.filter(**{f'{prefix}is_closed': False})
+    # База выбирается сейчас: строки читаются уже после выхода из middleware маршрутизации
+    return rows.using(rows.db).values_list(*[field for _, field, _ in spec['columns']])
+
+
+def _converters(columns, rows):
+    zone = timezone.get_current_timezone()
+
+    def local(value):
+        return value.astimezone(zone).isoformat() if value else None
+
+    def iso(value):
+        return value.isoformat() if value else None
+
+    functions = {'datetime': local, 'iso': iso}
+    if any(convert == 'session_date' for _, _, convert in columns):
+        dates = {pk: local(moment) for pk, moment in Session.objects.using(rows.db).values_list('pk', 'date')}
+        functions['session_date'] = dates.get
+    return [(index, functions[convert]) for index, (_, _, convert) in enumerate(columns) if convert]
+
+
+def _batches(rows, columns, chunk_size):
+    converters = _converters(columns, rows)
+    batch = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        if converters:
+            row = list(row)
+            for index, convert in converters:
+                row[index] = convert(row[index])
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _csv(names, batch):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if names:
+        writer.writerow(names)
+    writer.writerows(batch)
+    return buffer.getvalue().encode('utf-8')
+
+
+def _ndjson(names, batch):
+    return ''.join(
+        json.dumps(dict(zip(names, row)), ensure_ascii=False) + '\n' for row in batch
+    ).encode('utf-8')
+
+
+def stream(dataset, fmt, rows, compress=False, chunk_size=CHUNK_SIZE):
+    """Байты выгрузки: заголовок CSV и строки пачками по chunk_size (сжатые gzip, если compress)"""
+    columns = DATASETS[dataset]['columns']
+    names = [name for name, _, _ in columns]
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+
+    def encode(data):
+        if compressor is None:
+            return data
+        return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    if fmt == 'csv':
+        yield encode(_csv(names, []))
+    for batch in _batches(rows, columns, chunk_size):
+        yield encode(_csv(None, batch) if fmt == 'csv' else _ndjson(names, batch))
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def _async(chunks):
+    """Асинхронная обертка: под ASGI синхронный итератор был бы прочитан в память целиком"""
+    async def generate():
+        try:
+            while True:
+                chunk = await sync_to_async(next, thread_sensitive=True)(chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            await sync_to_async(chunks.close, thread_sensitive=True)()
+    return generate()
+
+
+def accepts_gzip(request):
+    return bool(_ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+def response(dataset, fmt, rows, compress=False, asynchronous=False):
+    chunks = stream(dataset, fmt, rows, compress)
+    response = StreamingHttpResponse(_async(chunks) if asynchronous else chunks, content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    response['Cache-Control'] = 'no-store'
+    response['X-Accel-Buffering'] = 'no'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    return response
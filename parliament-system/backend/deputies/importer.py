@@ -0,0 +1,471 @@
+"""
+Массовая загрузка депутатов, заседаний, голосований, посещаемости и поименных
+голосов из CSV, NDJSON и JSON.
+
+Файл читается потоково (JSON-массив - тоже по одному объекту), строки
+собираются в пачки по batch_size, и каждая пачка пишется в своей транзакции
+bulk_create с update_conflicts; посещаемость и голоса на PostgreSQL идут через
+COPY во временную таблицу и INSERT ... ON CONFLICT. Ссылки на партии,
+депутатов, заседания и голосования разрешаются по словарям, загруженным один
+раз: id, а для партий и депутатов еще название и ФИО. Память ограничена
+пачкой и этими словарями, а не размером файла.
+
+Колонки совпадают с выгрузкой /api/export/ (лишние пропускаются), поэтому
+выгрузку можно загрузить обратно. Строки с id обновляют существующие записи.
+Значения проверяются валидаторами полей; строка с ошибкой и пачка, которую
+отвергла база, пропускаются и попадают в отчет, остальные загружаются.
+Сигналы сохранения не срабатывают: после загрузки посещаемости и голосов
+отправляются attendance_bulk_changed и deputy_votes_bulk_changed по затронутым
+id (как после поименной регистрации), после депутатов, заседаний, голосований
+и очень больших загрузок производные данные пересчитываются целиком
+(refresh_derived).
+"""
+
+import csv
+import io
+import json
+import re
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import DatabaseError, connections, router, transaction
+from django.utils import timezone
+
+from .models import Party, Deputy, Session, Attendance, Vote, DeputyVote
+from . import conditional
+from .signals import attendance_bulk_changed, deputy_votes_bulk_changed
+from .synthetic import refresh_derived
+
+BATCH_SIZE = getattr(settings, 'IMPORT_BATCH_SIZE', 5000)
+MAX_ERRORS = 20
+# Больше затронутых заседаний, голосований или депутатов - полный пересчет вместо точечного
+SCOPED_REFRESH_LIMIT = 2000
+# Размер одного объекта JSON, после которого файл считается поврежденным
+MAX_OBJECT_SIZE = 1 << 20
+
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.json': 'json'}
+
+# Набор -> модель, загружаемые поля и ключ, по которому строка обновляет существующую
+DATASETS = {
+    'deputies': {
+        'model': Deputy,
+        'fields': ['last_name', 'first_name', 'middle_name', 'party', 'birth_date', 'election_date',
+                   'district', 'biography', 'email', 'phone', 'is_active'],
+        'unique': ['id'],
+        'lookup': 'deputy',
+    },
+    'sessions': {
+        'model': Session,
+        'fields': ['title', 'session_type', 'date', 'agenda', 'location', 'duration_minutes', 'is_closed'],
+        'unique': ['id'],
+        'lookup': 'session',
+    },
+    'votes': {
+        'model': Vote,
+        'fields': ['session', 'title', 'description', 'is_active'],
+        'unique': ['id'],
+        'lookup': 'vote',
+    },
+    'attendance': {
+        'model': Attendance,
+        'fields': ['deputy', 'session', 'is_present', 'absence_reason', 'arrival_time', 'departure_time'],
+        'unique': ['deputy', 'session'],
+    },
+    'deputy-votes': {
+        'model': DeputyVote,
+        'fields': ['vote', 'deputy', 'choice'],
+        'unique': ['vote', 'deputy'],
+    },
+}
+
+
+class RowError(ValueError):
+    """Строку нельзя загрузить; остальные строки файла загружаются"""
+
+
+# --- Чтение ---
+
+def read_csv(stream):
+    return csv.DictReader(stream)
+
+
+def read_ndjson(stream):
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                raise ValueError(f'NDJSON, строка {number}: {error.msg}')
+
+
+_SEPARATORS = re.compile(r'[\s,]*')
+_INCOMPLETE = object()
+
+
+def read_json(stream, chunk_size=1 << 16):
+    """Объекты JSON-массива по одному, без чтения файла целиком"""
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    while True:
+        position = _SEPARATORS.match(buffer, position).end()
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError('JSON: ожидается массив объектов')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Объект не поместился в прочитанную часть - дочитываем
+                item = _INCOMPLETE
+            if item is not _INCOMPLETE:
+                yield item
+                continue
+        if len(buffer) - position > MAX_OBJECT_SIZE:
+            raise ValueError('JSON: поврежденный или слишком большой объект')
+        more = stream.read(chunk_size)
+        if not more:
+            raise ValueError('JSON: массив не завершен')
+        buffer = buffer[position:] + more
+        position = 0
+
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson, 'json': read_json}
+
+
+def detect_format(name):
+    for suffix, fmt in FORMATS.items():
+        if name.lower().endswith(suffix):
+            return fmt
+    raise ValueError(f'Формат определяется по расширению: {", ".join(FORMATS)}')
+
+
+# --- Ссылки ---
+
+class Lookups:
+    """Словари {ключ: id} для внешних ключей, загружаются при первом обращении"""
+
+    AMBIGUOUS = object()
+
+    def __init__(self, using):
+        self.using = using
+        self.maps = {}
+
+    def _load(self, name):
+        keys = {}
+
+        def add(key, pk):
+            key = str(key).strip().casefold()
+            if key:
+                keys[key] = pk if keys.get(key, pk) == pk else self.AMBIGUOUS
+
+        model = {'party': Party, 'deputy': Deputy, 'session': Session, 'vote': Vote}[name]
+        names = {'party': ('name', 'short_name'), 'deputy': ('last_name', 'first_name', 'middle_name')}
+        ids = []
+        if name in names:
+            for pk, *parts in model.objects.using(self.using).values_list('pk', *names[name]):
+                ids.append(pk)
+                if name == 'party':
+                    for title in parts:
+                        add(title, pk)
+                else:
+                    add(' '.join(parts), pk)
+        else:
+            ids = model.objects.using(self.using).values_list('pk', flat=True)
+        # id важнее совпадения с названием или ФИО
+        keys.update((str(pk), pk) for pk in ids)
+        return keys
+
+    def resolve(self, name, value):
+        if name not in self.maps:
+            self.maps[name] = self._load(name)
+        pk = self.maps[name].get(str(value).strip().casefold())
+        if pk is self.AMBIGUOUS:
+            raise RowError(f'{name}: неоднозначная ссылка {value!r}, укажите id')
+        if pk is None:
+            raise RowError(f'{name}: не найдено {value!r}')
+        return pk
+
+    def register(self, name, objs):
+        """Добавить только что записанные строки, чтобы на них могли ссылаться следующие"""
+        if name in self.maps:
+            self.maps[name].update((str(obj.pk), obj.pk) for obj in objs if obj.pk is not None)
+            if name == 'deputy':
+                for obj in objs:
+                    self.maps[name].setdefault(' '.join([obj.last_name, obj.first_name, obj.middle_name]).casefold(), obj.pk)
+
+
+# --- Строки ---
+
+def _convert(field, value, choices=None):
+    if isinstance(value, str):
+        value = value.strip()
+    if value is None or value == '':
+        if field.null:
+            return None
+        if field.has_default():
+            return field.get_default()
+        if field.blank:
+            return ''
+        raise RowError(f'{field.name}: обязательное поле')
+    try:
+        value = field.to_python(value)
+        # Валидаторы поля (max_length, формат email и т. п.), как при сохранении через API
+        field.run_validators(value)
+    except ValidationError as error:
+        raise RowError(f'{field.name}: {"; ".join(error.messages)}')
+    if choices is not None and value not in choices:
+        raise RowError(f'{field.name}: недопустимое значение {value!r}')
+    if getattr(value, 'tzinfo', False) is None and field.get_internal_type() == 'DateTimeField':
+        value = timezone.make_aware(value)
+    return value
+
+
+class Importer:
+    def __init__(self, dataset, batch_size=BATCH_SIZE, log=None):
+        self.spec = DATASETS[dataset]
+        self.model = self.spec['model']
+        self.using = router.db_for_write(self.model)
+        self.connection = connections[self.using]
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.lookups = Lookups(self.using)
+        meta = self.model._meta
+        self.fields = {name: meta.get_field(name) for name in self.spec['fields']}
+        self.required = [
+            name for name, field in self.fields.items()
+            if not field.null and not field.blank and not field.has_default()
+        ]
+        self.choices = {
+            name: {value for value, _ in field.flatchoices} for name, field in self.fields.items() if field.choices
+        }
+        self.explicit_ids = False
+        self.written = 0
+        self.touched = {name: set() for name in self.spec['unique'] if name != 'id'}
+
+    def build(self, record):
+        """Значения полей {attname: значение}, загруженные поля и id для строки файла"""
+        if not isinstance(record, dict):
+            raise RowError('ожидается объект с полями')
+        present = tuple(name for name in self.fields if name in record)
+        missing = [name for name in self.required if record.get(name) in (None, '')]
+        if missing:
+            raise RowError(f'нет обязательных полей: {", ".join(missing)}')
+        values = {}
+        for name in present:
+            field = self.fields[name]
+            if field.is_relation:
+                raw = record[name]
+                values[field.attname] = None if raw in (None, '') else self.lookups.resolve(name, raw)
+            else:
+                values[name] = _convert(field, record[name], self.choices.get(name))
+        pk = None
+        if self.spec['unique'] == ['id'] and record.get('id') not in (None, ''):
+            try:
+                pk = int(record['id'])
+            except (TypeError, ValueError):
+                raise RowError(f'id: ожидается целое число, получено {record["id"]!r}')
+        return values, present, pk
+
+    def write(self, rows):
+        """Записать пачку [(значения, поля, id)] одной транзакцией"""
+        groups = {}
+        for values, present, pk in rows:
+            groups.setdefault(present, []).append((values, pk))
+        written = 0
+        with transaction.atomic(using=self.using):
+            for present, items in groups.items():
+                if self.spec['unique'] == ['id']:
+                    written += self._write_objects(items, present)
+                else:
+                    written += self._write_rows([values for values, _ in items], present)
+            conditional.touch([self.model], self.using)
+        return written
+
+    def _update_fields(self, present):
+        fields = [self.fields[name].name for name in present]
+        if any(field.name == 'updated_at' for field in self.model._meta.concrete_fields):
+            fields.append('updated_at')
+        return fields
+
+    def _write_objects(self, items, present):
+        """Депутаты, заседания, голосования: bulk_create, строки с id обновляют существующие"""
+        manager = self.model.objects.using(self.using)
+        # Повторная строка с тем же id заменяет предыдущую
+        existing = list({pk: self.model(pk=pk, **values) for values, pk in items if pk is not None}.values())
+        new = [self.model(**values) for values, pk in items if pk is None]
+        if existing:
+            self.explicit_ids = True
+            manager.bulk_create(existing, update_conflicts=True, unique_fields=['id'],
+                                update_fields=self._update_fields(present))
+        if new:
+            manager.bulk_create(new)
+        self.lookups.register(self.spec['lookup'], existing + new)
+        return len(existing) + len(new)
+
+    def _write_rows(self, items, present):
+        """Посещаемость и голоса: INSERT ... ON CONFLICT мимо ORM.
+
+        Таких строк миллионы, а подготовка значений в bulk_create стоит дороже
+        самой записи: значения здесь приводятся по колонке, время изменения
+        одно на пачку.
+        """
+        meta = self.model._meta
+        unique = self.spec['unique']
+        # Повторная строка с тем же ключом заменяет предыдущую
+        keys = [self.fields[name].attname for name in unique]
+        items = list({tuple(values[key] for key in keys): values for values in items}.values())
+        for name, key in zip(unique, keys):
+            self.touched[name].update(values[key] for values in items)
+
+        fields = [field for field in meta.concrete_fields if not field.primary_key]
+        now = timezone.now()
+        columns = []
+        for field in fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                columns.append((field.attname, field.get_db_prep_save(now, self.connection), None))
+            elif field.get_internal_type() in ('DateField', 'DateTimeField', 'TimeField'):
+                columns.append((field.attname, None, field))
+            else:
+                columns.append((field.attname, field.get_default(), None))
+        rows = []
+        for values in items:
+            row = []
+            for attname, default, adapt in columns:
+                value = values.get(attname, default)
+                if adapt is not None:
+                    value = adapt.get_db_prep_save(value, self.connection)
+                row.append(value)
+            rows.append(row)
+
+        quote = self.connection.ops.quote_name
+        names = ', '.join(quote(field.column) for field in fields)
+        update = [meta.get_field(name).column for name in self._update_fields(
+            [name for name in present if name not in unique])]
+        conflict = (
+            f'ON CONFLICT ({", ".join(quote(meta.get_field(name).column) for name in unique)}) DO '
+            + ('UPDATE SET ' + ', '.join(f'{quote(column)} = EXCLUDED.{quote(column)}' for column in update)
+               if update else 'NOTHING')
+        )
+        table = quote(meta.db_table)
+        with self.connection.cursor() as cursor:
+            if self.connection.vendor == 'postgresql':
+                # COPY во временную таблицу и перенос одним INSERT ... SELECT
+                temporary = quote(f'import_{meta.db_table}')
+                buffer = io.StringIO(''.join('\t'.join(_copy_text(value) for value in row) + '\n' for row in rows))
+                cursor.execute(f'CREATE TEMPORARY TABLE IF NOT EXISTS {temporary} AS '
+                               f'SELECT {names} FROM {table} WITH NO DATA')
+                cursor.execute(f'TRUNCATE {temporary}')
+                cursor.copy_expert(f'COPY {temporary} ({names}) FROM STDIN', buffer)
+                cursor.execute(f'INSERT INTO {table} ({names}) SELECT {names} FROM {temporary} {conflict}')
+            else:
+                cursor.executemany(
+                    f'INSERT INTO {table} ({names}) VALUES ({", ".join(["%s"] * len(fields))}) {conflict}', rows
+                )
+        return len(rows)
+
+    def finish(self):
+        """После загрузки строк с явными id сдвинуть последовательность (PostgreSQL)"""
+        if not self.explicit_ids:
+            return
+        statements = self.connection.ops.sequence_reset_sql(no_style(), [self.model])
+        if statements:
+            with self.connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def refresh(self):
+        """Обновить счетчики, итоги, сводные таблицы и кэши после загрузки"""
+        touched = self.touched
+        if not touched or any(len(ids) > SCOPED_REFRESH_LIMIT for ids in touched.values()):
+            refresh_derived()
+        elif self.model is Attendance:
+            attendance_bulk_changed.send(
+                sender=Attendance, deputy_ids=list(touched['deputy']), session_ids=list(touched['session'])
+            )
+        else:
+            deputy_votes_bulk_changed.send(
+                sender=DeputyVote, vote_ids=list(touched['vote']), deputy_ids=list(touched['deputy'])
+            )
+
+    def run(self, records):
+        started = time.perf_counter()
+        report = {'rows': 0, 'written': 0, 'skipped': 0, 'errors': []}
+        batch, numbers = [], []
+
+        def add_error(number, message):
+            if len(report['errors']) < MAX_ERRORS:
+                report['errors'].append({'row': number, 'error': message})
+
+        def flush():
+            try:
+                written = self.write(batch)
+            except DatabaseError as error:
+                # Пачка откатилась целиком, следующие пишутся как обычно
+                report['skipped'] += len(batch)
+                add_error(numbers[0], f'строки {numbers[0]}-{numbers[-1]} не записаны: {error}')
+            else:
+                report['written'] += written
+                self.written += written
+            batch.clear()
+            numbers.clear()
+            elapsed = time.perf_counter() - started
+            self.log(f'Строк: {report["rows"]}, записано: {report["written"]}, '
+                     f'{report["rows"] / elapsed:.0f} строк/с')
+
+        try:
+            for number, record in enumerate(records, start=1):
+                report['rows'] += 1
+                try:
+                    batch.append(self.build(record))
+                except RowError as error:
+                    report['skipped'] += 1
+                    add_error(number, str(error))
+                    continue
+                numbers.append(number)
+                if len(batch) >= self.batch_size:
+                    flush()
+            if batch:
+                flush()
+        finally:
+            # Файл мог оборваться на середине: записанные пачки остаются
+            self.finish()
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        report['rows_per_second'] = round(report['rows'] / report['seconds']) if report['seconds'] else None
+        return report
+
+
+def _copy_text(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def import_file(dataset, stream, fmt, batch_size=BATCH_SIZE, refresh=True, log=None):
+    """Загрузить текстовый поток stream формата fmt и вернуть отчет.
+
+    refresh=False оставляет пересчет производных данных вызывающему (например,
+    после загрузки нескольких файлов подряд).
+    """
+    loader = Importer(dataset, batch_size, log)
+    report = {}
+    try:
+        report = loader.run(READERS[fmt](stream))
+        report['dataset'] = dataset
+    finally:
+        # И когда файл оборвался ошибкой: уже записанные пачки не должны остаться без пересчета
+        if refresh and loader.written:
+            started = time.perf_counter()
+            loader.refresh()
+            report['refresh_seconds'] = round(time.perf_counter() - started, 3)
+    return report
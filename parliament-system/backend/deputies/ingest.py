@@ -0,0 +1,148 @@
+"""
+Пакетная запись голосов для пиковой нагрузки на cast_vote.
+
+В режиме VOTE_INGEST_MODE = 'batched' запрос ставит голос в очередь процесса,
+фоновый поток собирает голоса за VOTE_INGEST_MAX_DELAY секунд (не больше
+VOTE_INGEST_MAX_BATCH штук) и записывает их одной транзакцией. Запрос получает
+ответ только после фиксации транзакции, поэтому подтверждение надежно.
+Внутри пачки и между пачками действует правило «последний голос побеждает»
+для пары (голосование, депутат) в порядке поступления.
+
+Пачку набирают одновременные запросы одного процесса, поэтому режим действует
+только при WORKER_CONCURRENT_REQUESTS (воркеры gthread, uvicorn, runserver).
+Синхронный воркер gunicorn обрабатывает по одному запросу: пачка из одного голоса
+лишь добавила бы VOTE_INGEST_MAX_DELAY к ответу, и голос пишется сразу.
+
+Если база отвергла пачку из-за данных (IntegrityError, DataError), пачка
+записывается половинами, пока ошибка не останется у отдельных голосов:
+исключение получают только их запросы, остальные голоса сохраняются.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+
+from .models import DeputyVote
+from .signals import deputy_votes_bulk_changed
+
+
+class VoteBatcher:
+    def __init__(self, max_batch=500, max_delay=0.02, using='default'):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.using = using
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, vote_id, deputy_id, choice):
+        """Поставить голос в очередь, вернуть Future с сохраненным DeputyVote"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((vote_id, deputy_id, choice, future))
+        return future
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='vote-batcher', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            close_old_connections()
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            rows = self.flush(batch)
+        except (IntegrityError, DataError) as exc:
+            if len(batch) == 1:
+                batch[0][3].set_exception(exc)
+                return
+            # Половины пишутся по порядку: правило «последний голос побеждает» сохраняется
+            middle = len(batch) // 2
+            self._write(batch[:middle])
+            self._write(batch[middle:])
+        except Exception as exc:
+            # База недоступна и т. п. - повторять по частям бессмысленно
+            for *_, future in batch:
+                future.set_exception(exc)
+        else:
+            for vote_id, deputy_id, choice, future in batch:
+                future.set_result(rows[(vote_id, deputy_id)])
+
+    def flush(self, batch):
+        """Записать пачку голосов одной транзакцией, вернуть {(vote_id, deputy_id): DeputyVote}"""
+        latest = {}
+        for vote_id, deputy_id, choice, _ in batch:
+            latest[(vote_id, deputy_id)] = choice
+
+        with transaction.atomic(using=self.using):
+            DeputyVote.objects.using(self.using).bulk_create(
+                [DeputyVote(vote_id=vote_id, deputy_id=deputy_id, choice=choice)
+                 for (vote_id, deputy_id), choice in latest.items()],
+                update_conflicts=True,
+                unique_fields=['vote', 'deputy'],
+                update_fields=['choice'],
+            )
+            vote_ids = {vote_id for vote_id, _ in latest}
+            deputy_ids = {deputy_id for _, deputy_id in latest}
+            rows = {
+                (row.vote_id, row.deputy_id): row
+                for row in DeputyVote.objects.using(self.using).filter(
+                    vote_id__in=vote_ids, deputy_id__in=deputy_ids
+                ).select_related('deputy')
+                if (row.vote_id, row.deputy_id) in latest
+            }
+            deputy_votes_bulk_changed.send(sender=DeputyVote, vote_ids=vote_ids, deputy_ids=deputy_ids)
+        return rows
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = VoteBatcher(
+                    max_batch=getattr(settings, 'VOTE_INGEST_MAX_BATCH', 500),
+                    max_delay=getattr(settings, 'VOTE_INGEST_MAX_DELAY', 0.02),
+                )
+    return _batcher
+
+
+def batching_enabled():
+    return (
+        getattr(settings, 'VOTE_INGEST_MODE', 'direct') == 'batched'
+        and getattr(settings, 'WORKER_CONCURRENT_REQUESTS', True)
+    )
+
+
+def submit_vote(vote_id, deputy_id, choice):
+    """Поставить голос в пакетную запись и дождаться фиксации"""
+    future = get_batcher().submit(vote_id, deputy_id, choice)
+    return future.result(timeout=getattr(settings, 'VOTE_INGEST_ACK_TIMEOUT', 5))
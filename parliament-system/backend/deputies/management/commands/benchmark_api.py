@@ -0,0 +1,204 @@
+import json
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from deputies.middleware import QueryRecorder
+from deputies.models import User, Party, Deputy, Session, Attendance, Vote, DeputyVote
+from deputies.synthetic import generate_parliament, percentile
+
+# (название, метод, адрес, авторизация, тело запроса)
+ENDPOINTS = [
+    ('statistics', 'get', '/api/statistics/', None, None),
+    ('parties.list', 'get', '/api/parties/', None, None),
+    ('parties.list.expand', 'get', '/api/parties/?expand=members_count', None, None),
+    ('parties.detail', 'get', '/api/parties/{party}/', None, None),
+    ('parties.members', 'get', '/api/parties/{party}/members/', None, None),
+    ('deputies.list', 'get', '/api/deputies/', None, None),
+    ('deputies.list.expand', 'get', '/api/deputies/?expand=attendance_rate', None, None),
+    ('deputies.search', 'get', '/api/deputies/?search=Кузнецов', None, None),
+    ('deputies.detail', 'get', '/api/deputies/{deputy}/', None, None),
+    ('deputies.attendance', 'get', '/api/deputies/{deputy}/attendance/', None, None),
+    ('deputies.votes', 'get', '/api/deputies/{deputy}/votes/', None, None),
+    ('deputies.similar', 'get', '/api/deputies/{deputy}/similar/', None, None),
+    ('deputies.similarity', 'get', '/api/deputies/similarity/?party={party}', None, None),
+    ('sessions.list', 'get', '/api/sessions/', 'admin', None),
+    ('sessions.list.expand', 'get', '/api/sessions/?expand=attendance_rate', 'admin', None),
+    ('sessions.detail', 'get', '/api/sessions/{session}/', 'admin', None),
+    ('votes.list', 'get', '/api/votes/', None, None),
+    ('votes.list.expand', 'get', '/api/votes/?expand=results', None, None),
+    ('votes.detail', 'get', '/api/votes/{vote}/', None, None),
+    ('votes.cast_vote', 'post', '/api/votes/{vote}/cast_vote/', 'deputy', {'choice': 'abstain'}),
+    ('sessions.mark_attendance', 'post', '/api/sessions/{session}/mark_attendance/', 'admin',
+     {'deputy_id': '{deputy}', 'is_present': True}),
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Замерить все эндпоинты API через тестовый клиент: задержка p50/p95/p99, число запросов '
+        'и пик памяти, сравнение с сохраненным эталоном. Все изменения в базе откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=30, help='Замеров на эндпоинт')
+        parser.add_argument('--warmup', type=int, default=3, help='Прогревочных запросов на эндпоинт')
+        parser.add_argument('--only', help='Замерить только эндпоинты, название которых начинается с префикса')
+        parser.add_argument('--cold', action='store_true', help='Очищать кэши перед каждым запросом')
+        parser.add_argument('--generate', action='store_true', help='Сгенерировать синтетический парламент на время прогона')
+        parser.add_argument('--deputies', type=int, default=450)
+        parser.add_argument('--years', type=float, default=1)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--baseline', help='JSON с эталоном для сравнения')
+        parser.add_argument('--save-baseline', help='Сохранить результаты как эталон')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Допустимый рост p95 и памяти (доля)')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Завершиться с ошибкой при регрессии')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+
+        try:
+            with transaction.atomic(), override_settings(VOTE_INGEST_MODE='direct'):
+                if options['generate']:
+                    generate_parliament(
+                        random.Random(options['seed']), deputies=options['deputies'],
+                        years=options['years'], log=self.stdout.write,
+                    )
+                dataset = self._dataset()
+                fixtures, tokens = self._fixtures()
+                results = self._run(fixtures, tokens, options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        report = {'dataset': dataset, 'endpoints': results}
+        self._report(results, baseline, options['tolerance'])
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Эталон сохранен: {options["save_baseline"]}')
+        if baseline and options['fail_on_regression'] and self.regressions:
+            raise CommandError(f'Регрессии: {", ".join(self.regressions)}')
+
+    def _dataset(self):
+        dataset = {
+            model._meta.model_name: model.objects.count()
+            for model in (Party, Deputy, Session, Attendance, Vote, DeputyVote)
+        }
+        self.stdout.write('Данные: ' + ', '.join(f'{name} {count}' for name, count in dataset.items()))
+        return dataset
+
+    def _fixtures(self):
+        party = Party.objects.annotate(size=Count('deputies')).order_by('-size').first()
+        deputy = Deputy.objects.filter(is_active=True).order_by('-attendance_total', 'pk').first()
+        session = Session.objects.order_by('-date').first()
+        vote = Vote.objects.filter(is_active=True).order_by('-created_at').first()
+        if not all([party, deputy, session, vote]):
+            raise CommandError('Нужны партия, депутат, заседание и активное голосование (используйте --generate)')
+
+        admin = User.objects.create(username='benchmark-admin', user_type='admin', password=make_password(None))
+        if deputy.user is None:
+            deputy.user = User.objects.create(username='benchmark-deputy', user_type='deputy',
+                                              password=make_password(None))
+            deputy.save(update_fields=['user'])
+        tokens = {
+            'admin': Token.objects.create(user=admin).key,
+            'deputy': Token.objects.get_or_create(user=deputy.user)[0].key,
+        }
+        fixtures = {'party': party.pk, 'deputy': deputy.pk, 'session': session.pk, 'vote': vote.pk}
+        return fixtures, tokens
+
+    def _run(self, fixtures, tokens, options):
+        clients = {None: APIClient(SERVER_NAME='localhost')}
+        for role, key in tokens.items():
+            clients[role] = APIClient(SERVER_NAME='localhost')
+            clients[role].credentials(HTTP_AUTHORIZATION=f'Token {key}')
+
+        results = {}
+        for name, method, url, auth, payload in ENDPOINTS:
+            if options['only'] and not name.startswith(options['only']):
+                continue
+            path = url.format(**fixtures)
+            data = {key: value.format(**fixtures) if isinstance(value, str) else value
+                    for key, value in (payload or {}).items()}
+
+            def call():
+                if options['cold']:
+                    for cache in caches.all():
+                        cache.clear()
+                response = getattr(clients[auth], method)(path, data or None, format='json')
+                if response.status_code >= 400:
+                    raise CommandError(f'{name}: {response.status_code} {response.content[:200]!r}')
+                return response
+
+            for _ in range(options['warmup']):
+                call()
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                call()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = QueryRecorder()
+            with connection.execute_wrapper(queries):
+                call()
+            # Память меряется отдельным запросом: трассировка искажает задержку
+            tracemalloc.start()
+            try:
+                call()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            results[name] = {
+                'p50': round(statistics.median(timings), 2),
+                'p95': round(percentile(timings, 0.95), 2),
+                'p99': round(percentile(timings, 0.99), 2),
+                'queries': queries.count,
+                'duplicates': sum(count - 1 for count in queries.duplicates.values()),
+                'peak_kib': round(peak / 1024, 1),
+            }
+        return results
+
+    def _report(self, results, baseline, tolerance):
+        self.regressions = []
+        previous = (baseline or {}).get('endpoints', {})
+        self.stdout.write(
+            f"{'эндпоинт':<28}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'запросов':>10}{'пик, КиБ':>11}"
+            + (f"{'p95 к эталону':>16}" if baseline else '')
+        )
+        for name, result in results.items():
+            line = (
+                f"{name:<28}{result['p50']:>10.2f}{result['p95']:>10.2f}{result['p99']:>10.2f}"
+                f"{result['queries']:>10}{result['peak_kib']:>11.1f}"
+            )
+            base = previous.get(name)
+            if base:
+                change = (result['p95'] - base['p95']) / base['p95'] * 100 if base['p95'] else 0
+                problems = []
+                if result['p95'] > base['p95'] * (1 + tolerance):
+                    problems.append('задержка')
+                if result['queries'] > base['queries']:
+                    problems.append(f"запросы {base['queries']}→{result['queries']}")
+                if result['peak_kib'] > base['peak_kib'] * (1 + tolerance):
+                    problems.append('память')
+                line += f'{change:>+15.0f}%'
+                if problems:
+                    self.regressions.append(name)
+                    line = self.style.ERROR(line + '  ' + ', '.join(problems))
+            self.stdout.write(line)
@@ -0,0 +1,119 @@
+import gzip
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from deputies.management.commands.benchmark_api import ENDPOINTS
+from deputies.models import Party, Deputy, Session, Vote
+from deputies.synthetic import percentile
+
+# Статический файл: отдается whitenoise (или staticfiles при runserver)
+STATIC_PATH = '/static/rest_framework/css/bootstrap.min.css'
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузить запущенный сервер по HTTP: открытые GET-эндпоинты API и статика в N потоков '
+        'с keep-alive, запросов в секунду и задержка p50/p95. Сервер должен работать с той же базой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Адрес сервера')
+        parser.add_argument('--concurrency', type=int, default=16, help='Одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=15, help='Длительность прогона, с')
+        parser.add_argument('--only', help='Только эндпоинты, название которых начинается с префикса')
+        parser.add_argument('--exclude', help='Пропустить эндпоинты, название которых начинается с префикса')
+        parser.add_argument('--no-static', action='store_true', help='Не запрашивать статику')
+
+    def handle(self, *args, **options):
+        paths = self._paths(options)
+        target = urlsplit(options['url'])
+        stop = time.perf_counter() + options['duration']
+        timings = {name: [] for name, _ in paths}
+        errors = {name: 0 for name, _ in paths}
+        lock = threading.Lock()
+
+        def client(offset):
+            connection = None
+            position = offset
+            local = {name: [] for name, _ in paths}
+            failed = {name: 0 for name, _ in paths}
+            while time.perf_counter() < stop:
+                name, path = paths[position % len(paths)]
+                position += 1
+                started = time.perf_counter()
+                try:
+                    if connection is None:
+                        connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+                    connection.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+                    response = connection.getresponse()
+                    body = response.read()
+                    if response.getheader('Content-Encoding') == 'gzip':
+                        gzip.decompress(body)
+                    if response.will_close:
+                        connection.close()
+                        connection = None
+                    if response.status >= 400:
+                        failed[name] += 1
+                        continue
+                except (OSError, http.client.HTTPException):
+                    failed[name] += 1
+                    connection = None
+                    continue
+                local[name].append((time.perf_counter() - started) * 1000)
+            with lock:
+                for name in local:
+                    timings[name].extend(local[name])
+                    errors[name] += failed[name]
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(options['concurrency'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._report(timings, errors, time.perf_counter() - started, options)
+
+    def _paths(self, options):
+        party = Party.objects.order_by('pk').first()
+        deputy = Deputy.objects.filter(is_active=True).order_by('-attendance_total', 'pk').first()
+        session = Session.objects.filter(is_closed=False).order_by('-date').first()
+        vote = Vote.objects.order_by('-created_at').first()
+        if not all([party, deputy, session, vote]):
+            raise CommandError('Нужны партия, депутат, заседание и голосование (generate_parliament)')
+        fixtures = {'party': party.pk, 'deputy': deputy.pk, 'session': session.pk, 'vote': vote.pk}
+        paths = [
+            (name, quote(url.format(**fixtures), safe='/?=&'))
+            for name, method, url, auth, _ in ENDPOINTS
+            if method == 'get' and auth is None
+        ]
+        if not options['no_static']:
+            paths.append(('static', STATIC_PATH))
+        if options['only']:
+            paths = [(name, path) for name, path in paths if name.startswith(options['only'])]
+        if options['exclude']:
+            paths = [(name, path) for name, path in paths if not name.startswith(options['exclude'])]
+        if not paths:
+            raise CommandError('Нет эндпоинтов для прогона')
+        return paths
+
+    def _report(self, timings, errors, elapsed, options):
+        total = sum(len(values) for values in timings.values())
+        self.stdout.write(f"{'эндпоинт':<28}{'запросов':>10}{'p50, мс':>10}{'p95, мс':>10}{'ошибок':>8}")
+        for name, values in timings.items():
+            if values:
+                self.stdout.write(
+                    f'{name:<28}{len(values):>10}{statistics.median(values):>10.1f}'
+                    f'{percentile(values, 0.95):>10.1f}{errors[name]:>8}'
+                )
+            else:
+                self.stdout.write(f"{name:<28}{0:>10}{'-':>10}{'-':>10}{errors[name]:>8}")
+        summary = (
+            f'Всего: {total} запросов за {elapsed:.1f} с, {total / elapsed:.1f} запросов/с '
+            f'({options["concurrency"]} клиентов), ошибок - {sum(errors.values())}'
+        )
+        self.stdout.write(self.style.ERROR(summary) if sum(errors.values()) else self.style.SUCCESS(summary))
@@ -0,0 +1,72 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from deputies import search
+from deputies.models import Deputy
+from deputies.synthetic import make_deputy
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Сравнить задержку поиска депутатов (индекс против icontains) на синтетических данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Сколько депутатов сгенерировать')
+        parser.add_argument('--repeat', type=int, default=30, help='Повторов на каждый запрос')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            # Все синтетические данные откатываются в конце
+            with transaction.atomic():
+                self._populate(rng, options['rows'])
+                backend = search.get_backend()
+                started = time.perf_counter()
+                backend.rebuild()
+                self.stdout.write(
+                    f'{type(backend).__name__}: индекс построен за {(time.perf_counter() - started) * 1000:.0f} мс'
+                )
+                self._run(backend, options['repeat'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _populate(self, rng, rows):
+        deputies = [make_deputy(rng, i) for i in range(rows)]
+        Deputy.objects.bulk_create(deputies, batch_size=2000)
+        self.stdout.write(f'Сгенерировано депутатов: {rows}')
+
+    def _run(self, backend, repeat):
+        queries = {
+            'фамилия': 'Кузнецов',
+            'префикс': 'Кузн',
+            'фамилия и имя': 'Иванова Анна',
+            'округ': 'Новосибирский',
+            'опечатка': 'Кузнецоф',
+        }
+        legacy = search.IContainsBackend()
+        base = Deputy.objects.filter(is_active=True)
+        self.stdout.write(f"{'запрос':<16}{'бэкенд':<24}{'p50, мс':>10}{'p95, мс':>10}{'найдено':>10}")
+        for label, text in queries.items():
+            for engine in (backend, legacy):
+                timings = []
+                found = 0
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    queryset = engine.search(base, text)
+                    found = queryset.count()
+                    list(queryset[:20])
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                self.stdout.write(
+                    f'{label:<16}{type(engine).__name__:<24}{statistics.median(timings):>10.2f}{p95:>10.2f}{found:>10}'
+                )
@@ -0,0 +1,63 @@
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from deputies import importer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузить депутатов, заседания, голосования, посещаемость или голоса депутатов из CSV, '
+        'NDJSON или JSON. Файл читается потоково и пишется пачками; строки с id обновляют '
+        'существующие записи, посещаемость и голоса - по паре депутат и заседание/голосование.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(importer.DATASETS))
+        parser.add_argument('path', help='Файл; - для стандартного ввода')
+        parser.add_argument(
+            '--format', dest='fmt', choices=sorted(set(importer.FORMATS.values())),
+            help='Формат файла (по умолчанию - по расширению)'
+        )
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE, help='Строк в одной транзакции')
+        parser.add_argument(
+            '--no-refresh', action='store_true',
+            help='Не пересчитывать счетчики, итоги и сводные таблицы; после загрузки всех файлов '
+                 'запустите rebuild_counters, rebuild_rollups и rebuild_search_index'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['fmt']
+        try:
+            if fmt is None:
+                if path == '-':
+                    raise CommandError('Для стандартного ввода укажите --format')
+                fmt = importer.detect_format(path)
+            if path == '-':
+                stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+            else:
+                stream = open(path, encoding='utf-8-sig', newline='')
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+
+        with stream:
+            try:
+                report = importer.import_file(
+                    options['dataset'], stream, fmt,
+                    batch_size=max(options['batch_size'], 1),
+                    refresh=not options['no_refresh'],
+                    log=self.stdout.write,
+                )
+            except ValueError as error:
+                raise CommandError(str(error))
+
+        for error in report['errors']:
+            self.stderr.write(f"Строка {error['row']}: {error['error']}")
+        if 'refresh_seconds' in report:
+            self.stdout.write(f"Производные данные пересчитаны за {report['refresh_seconds']:.1f} с")
+        self.stdout.write(self.style.SUCCESS(
+            f"Прочитано строк: {report['rows']}, записано: {report['written']}, пропущено: {report['skipped']} "
+            f"за {report['seconds']:.1f} с ({report['rows_per_second'] or 0} строк/с)"
+        ))
@@ -0,0 +1,131 @@
+import statistics
+import threading
+import time
+import uuid
+from datetime import date
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from deputies.models import User, Deputy, Session, Vote, DeputyVote
+from deputies.synthetic import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест cast_vote: N депутатов голосуют одновременно. '
+        'Создает временные данные в текущей базе и удаляет их после прогона.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--voters', type=int, default=450, help='Число одновременно голосующих депутатов')
+        parser.add_argument(
+            '--mode', choices=['direct', 'batched', 'both'], default='both',
+            help='Режим записи голосов (VOTE_INGEST_MODE)'
+        )
+        parser.add_argument(
+            '--revotes', type=float, default=0.2,
+            help='Доля депутатов, которые сразу меняют свой голос'
+        )
+
+    def handle(self, *args, **options):
+        modes = ['direct', 'batched'] if options['mode'] == 'both' else [options['mode']]
+        tokens, deputies, session = self._setup(options['voters'])
+        try:
+            for mode in modes:
+                vote = Vote.objects.create(session=session, title=f'Нагрузочный тест ({mode})', description='-')
+                with override_settings(VOTE_INGEST_MODE=mode):
+                    latencies, failures, elapsed = self._run(vote, tokens, options['revotes'])
+                self._report(mode, vote, latencies, failures, elapsed)
+        finally:
+            User.objects.filter(pk__in=[deputy.user_id for deputy in deputies]).delete()
+            session.delete()
+
+    def _setup(self, voters):
+        prefix = f'loadtest-{uuid.uuid4().hex[:8]}'
+        User.objects.bulk_create([
+            User(username=f'{prefix}-{i}', password=make_password(None), user_type='deputy')
+            for i in range(voters)
+        ])
+        users = list(User.objects.filter(username__startswith=prefix).order_by('id'))
+        deputies = Deputy.objects.bulk_create([
+            Deputy(user=user, first_name='Тест', last_name=f'Депутат {i}',
+                   election_date=date.today(), district='Нагрузочный')
+            for i, user in enumerate(users)
+        ])
+        tokens = [token.key for token in Token.objects.bulk_create([
+            Token(user=user, key=Token.generate_key()) for user in users
+        ])]
+        session = Session.objects.create(
+            title='Нагрузочный тест', date=timezone.now(), agenda='-', location='-'
+        )
+        self.stdout.write(f'Подготовлено депутатов: {len(deputies)}')
+        return tokens, deputies, session
+
+    def _run(self, vote, tokens, revotes):
+        barrier = threading.Barrier(len(tokens))
+        latencies = []
+        failures = []
+        lock = threading.Lock()
+        revote_every = max(1, round(1 / revotes)) if revotes > 0 else 0
+
+        def voter(index, token):
+            client = APIClient(SERVER_NAME='localhost')
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+            choices = ['for', 'against', 'abstain']
+            plan = [choices[index % 3]]
+            if revote_every and index % revote_every == 0:
+                plan.append(choices[(index + 1) % 3])
+            barrier.wait()
+            try:
+                for choice in plan:
+                    started = time.perf_counter()
+                    try:
+                        response = client.post(f'/api/votes/{vote.pk}/cast_vote/', {'choice': choice}, format='json')
+                        code = response.status_code
+                    except Exception as exc:
+                        code = type(exc).__name__
+                    with lock:
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        if code != 200:
+                            failures.append(code)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=voter, args=(i, token)) for i, token in enumerate(tokens)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, failures, time.perf_counter() - started
+
+    def _report(self, mode, vote, latencies, failures, elapsed):
+        vote = Vote.objects.select_related('tally').get(pk=vote.pk)
+        actual = {
+            choice: DeputyVote.objects.filter(vote=vote, choice=choice).count()
+            for choice in ('for', 'against', 'abstain')
+        }
+        actual['total'] = sum(actual.values())
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Режим {mode}'))
+        self.stdout.write(
+            f'  запросов: {len(latencies)}, ошибок: {len(failures)}, '
+            f'время: {elapsed:.2f} с, {len(latencies) / elapsed:.0f} запр/с'
+        )
+        if latencies:
+            self.stdout.write(
+                f'  задержка, мс: p50 {statistics.median(latencies):.1f}, '
+                f'p95 {percentile(latencies, 0.95):.1f}, p99 {percentile(latencies, 0.99):.1f}, '
+                f'max {max(latencies):.1f}'
+            )
+        if failures:
+            codes = {code: failures.count(code) for code in set(failures)}
+            self.stdout.write(f'  ответы с ошибкой: {codes}')
+        self.stdout.write(f'  сохранено голосов: {actual}, итоги VoteTally: {vote.results}')
+        if actual != vote.results:
+            self.stderr.write('  итоги голосования расходятся с сохраненными голосами')
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from deputies import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать и проверить денормализованные счетчики (посещаемость депутатов, итоги голосований, снимки заседаний)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только проверить счетчики, ничего не изменяя',
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            with transaction.atomic():
+                updated = counters.refresh_deputy_attendance()
+            self.stdout.write(f'Посещаемость: пересчитано депутатов - {updated}')
+            with transaction.atomic():
+                updated = counters.refresh_vote_tallies()
+            self.stdout.write(f'Голосования: пересчитано итогов - {updated}')
+            updated = counters.snapshot_finished_sessions()
+            self.stdout.write(f'Заседания: зафиксировано числа депутатов - {updated}')
+
+        mismatches = counters.find_attendance_mismatches()
+        for row in mismatches[:20]:
+            self.stderr.write(
+                f"Депутат #{row['id']}: сохранено {row['attendance_present']}/{row['attendance_total']}, "
+                f"фактически {row['actual_present']}/{row['actual_total']}"
+            )
+        tally_mismatches = counters.find_tally_mismatches()
+        for row in tally_mismatches[:20]:
+            self.stderr.write(f"Голосование #{row['vote_id']}: итоги расходятся с голосами ({row})")
+
+        if mismatches or tally_mismatches:
+            raise CommandError(
+                f'Расхождения в счетчиках: посещаемость - {len(mismatches)}, '
+                f'итоги голосований - {len(tally_mismatches)}'
+            )
+        self.stdout.write(self.style.SUCCESS('Счетчики согласованы'))
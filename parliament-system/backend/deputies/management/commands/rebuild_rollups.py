@@ -0,0 +1,92 @@
+import time
+from concurrent import futures
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from deputies import rollups
+from deputies.models import Session, AttendanceRollup
+
+
+def _month(value):
+    try:
+        return datetime.strptime(value, '%Y-%m').date()
+    except ValueError:
+        raise CommandError(f'Месяц указывается как ГГГГ-ММ: {value}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитать сводную посещаемость по дням и месяцам. История делится на интервалы '
+        'по месяцам, которые считаются параллельно и затем записываются каждый в своей транзакции.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=_month, help='Первый месяц (ГГГГ-ММ)')
+        parser.add_argument('--to', dest='date_to', type=_month, help='Последний месяц (ГГГГ-ММ)')
+        parser.add_argument('--chunk-months', type=int, default=3, help='Месяцев в одном интервале')
+        parser.add_argument('--workers', type=int, default=4, help='Параллельных потоков подсчета')
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сравнить сводные таблицы с отметками посещаемости',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            return self._verify()
+
+        bounds = Session.objects.aggregate(first=Min('date'), last=Max('date'))
+        if bounds['first'] is None:
+            deleted, _ = AttendanceRollup.objects.all().delete()
+            self.stdout.write(f'Заседаний нет, удалено корзин: {deleted}')
+            return
+        full = not options['date_from'] and not options['date_to']
+        date_from = options['date_from'] or timezone.localtime(bounds['first']).date()
+        date_to = options['date_to'] or timezone.localtime(bounds['last']).date()
+        chunks = rollups.month_chunks(date_from, date_to, max(options['chunk_months'], 1))
+
+        started = time.perf_counter()
+        written = 0
+        for (start, end), rows in self._compute(chunks, max(options['workers'], 1)):
+            written += rollups.replace(start, end, rows)
+            self.stdout.write(f'{start:%Y-%m} - {end:%Y-%m}: корзин {len(rows)}')
+        if full:
+            # Корзины за пределами истории заседаний остались от удаленных данных
+            AttendanceRollup.objects.exclude(
+                period_start__gte=chunks[0][0], period_start__lt=chunks[-1][1]
+            ).delete()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Интервалов: {len(chunks)}, корзин: {written} за {elapsed:.1f} с'
+        ))
+
+    def _compute(self, chunks, workers):
+        """Посчитать интервалы в пуле потоков.
+
+        Запись начинается после подсчета всех интервалов: SQLite не дает читать,
+        пока другая транзакция пишет.
+        """
+        if workers == 1:
+            return [(chunk, rollups.compute(*chunk)) for chunk in chunks]
+
+        def compute(chunk):
+            try:
+                return chunk, rollups.compute(*chunk)
+            finally:
+                # У каждого потока свое соединение с базой
+                connection.close()
+
+        with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(compute, chunks))
+
+    def _verify(self):
+        mismatches = rollups.find_mismatches()
+        for bucket, stored, actual in mismatches[:20]:
+            self.stderr.write(f'{bucket}: сохранено {stored}, фактически {actual}')
+        if mismatches:
+            raise CommandError(f'Расхождений в сводной посещаемости: {len(mismatches)}')
+        self.stdout.write(self.style.SUCCESS('Сводная посещаемость согласована'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from deputies import search
+
+
+class Command(BaseCommand):
+    help = 'Перестроить поисковый индекс депутатов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Алиас базы данных')
+
+    def handle(self, *args, **options):
+        backend = search.get_backend(options['database'])
+        with transaction.atomic(using=options['database']):
+            indexed = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'{type(backend).__name__}: проиндексировано депутатов - {indexed}'
+        ))
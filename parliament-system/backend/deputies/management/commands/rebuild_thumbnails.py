@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from deputies import thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Построить уменьшенные копии фотографий депутатов и логотипов партий '
+        '(после массовой загрузки или смены THUMBNAIL_VARIANTS)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Только для изображений, у которых копий еще нет',
+        )
+
+    def handle(self, *args, **options):
+        for model, (field, _) in thumbnails.SOURCES.items():
+            objects = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            if options['missing']:
+                objects = objects.filter(thumbnails.missing(model))
+            built = sum(thumbnails.generate(model, pk) for pk in objects.values_list('pk', flat=True).iterator())
+            self.stdout.write(f'{model._meta.verbose_name_plural}: обработано изображений - {built}')
+        self.stdout.write(self.style.SUCCESS('Уменьшенные копии построены'))
@@ -0,0 +1,79 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('deputies.queries')
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Запрос без различий в длине списков IN и пробелах (параметры передаются отдельно)"""
+    return _SPACES.sub(' ', _IN_LIST.sub('IN (...)', sql)).strip()
+
+
+class QueryRecorder:
+    """Обертка execute_wrapper: число запросов, время и повторы одного и того же запроса"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        """{отпечаток: число выполнений} для запросов, выполненных больше одного раза"""
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+class QueryCountMiddleware:
+    """Учет запросов к базе на каждый HTTP-запрос (включается QUERY_INSTRUMENTATION).
+
+    Результат отдается в заголовках X-DB-Queries, X-DB-Time-Ms, X-DB-Duplicates и
+    пишется в журнал deputies.queries; повторяющиеся запросы (признак N+1) - с
+    уровнем WARNING, если их не меньше QUERY_DUPLICATE_THRESHOLD.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'QUERY_DUPLICATE_THRESHOLD', 5)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        duplicates = recorder.duplicates
+        repeated = sum(count - 1 for count in duplicates.values())
+        response['X-DB-Queries'] = str(recorder.count)
+        response['X-DB-Time-Ms'] = f'{recorder.duration * 1000:.1f}'
+        response['X-DB-Duplicates'] = str(repeated)
+
+        message = '%s %s: %d запросов, %.1f мс, повторов %d'
+        args = (request.method, request.path, recorder.count, recorder.duration * 1000, repeated)
+        if duplicates and max(duplicates.values()) >= self.threshold:
+            worst = sorted(duplicates.items(), key=lambda item: -item[1])[:3]
+            logger.warning(message + '; чаще всего: %s', *args, '; '.join(f'{count}x {sql}' for sql, count in worst))
+        else:
+            logger.info(message, *args)
+        return response
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:16
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_attendance_counters(apps, schema_editor):
+    Deputy = apps.get_model('deputies', 'Deputy')
+    Attendance = apps.get_model('deputies', 'Attendance')
+    counts = Attendance.objects.filter(deputy=OuterRef('pk')).order_by().values('deputy')
+    Deputy.objects.update(
+        attendance_present=Coalesce(Subquery(counts.annotate(c=Count('id', filter=Q(is_present=True))).values('c')), 0),
+        attendance_total=Coalesce(Subquery(counts.annotate(c=Count('id')).values('c')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deputies', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deputy',
+            name='attendance_present',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Присутствий'),
+        ),
+        migrations.AddField(
+            model_name='deputy',
+            name='attendance_total',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Отметок посещаемости'),
+        ),
+        migrations.RunPython(fill_attendance_counters, migrations.RunPython.noop),
+    ]
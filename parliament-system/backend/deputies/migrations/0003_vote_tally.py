@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_vote_tallies(apps, schema_editor):
+    Vote = apps.get_model('deputies', 'Vote')
+    VoteTally = apps.get_model('deputies', 'VoteTally')
+    DeputyVote = apps.get_model('deputies', 'DeputyVote')
+    VoteTally.objects.bulk_create([VoteTally(vote_id=pk) for pk in Vote.objects.values_list('pk', flat=True)])
+    counts = DeputyVote.objects.filter(vote=OuterRef('vote_id')).order_by().values('vote')
+    VoteTally.objects.update(
+        votes_for=Coalesce(Subquery(counts.annotate(c=Count('id', filter=Q(choice='for'))).values('c')), 0),
+        votes_against=Coalesce(Subquery(counts.annotate(c=Count('id', filter=Q(choice='against'))).values('c')), 0),
+        votes_abstain=Coalesce(Subquery(counts.annotate(c=Count('id', filter=Q(choice='abstain'))).values('c')), 0),
+        total=Coalesce(Subquery(counts.annotate(c=Count('id')).values('c')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deputies', '0002_deputy_attendance_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteTally',
+            fields=[
+                ('vote', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='tally', serialize=False, to='deputies.vote', verbose_name='Голосование')),
+                ('votes_for', models.PositiveIntegerField(default=0, verbose_name='За')),
+                ('votes_against', models.PositiveIntegerField(default=0, verbose_name='Против')),
+                ('votes_abstain', models.PositiveIntegerField(default=0, verbose_name='Воздержались')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Всего голосов')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Итоги голосования',
+                'verbose_name_plural': 'Итоги голосований',
+            },
+        ),
+        migrations.RunPython(fill_vote_tallies, migrations.RunPython.noop),
+    ]
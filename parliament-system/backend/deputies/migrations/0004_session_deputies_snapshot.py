@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deputies', '0003_vote_tally'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='deputies_snapshot',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Активных депутатов на момент заседания'),
+        ),
+    ]
@@ -0,0 +1,186 @@
+import re
+
+from django.db import migrations
+
+# Копия deputies.search на момент миграции: миграция не должна меняться вместе
+# с кодом приложения (и ломаться, если его имена переименуют или удалят)
+FTS_TABLE = 'deputies_deputy_fts'
+FTS_VOCAB_TABLE = 'deputies_deputy_fts_vocab'
+PG_DOCUMENT = (
+    "to_tsvector('russian'::regconfig, "
+    "coalesce(last_name, '') || ' ' || coalesce(first_name, '') || ' ' || "
+    "coalesce(middle_name, '') || ' ' || coalesce(district, ''))"
+)
+PG_NAME = "(coalesce(last_name, '') || ' ' || coalesce(first_name, '') || ' ' || coalesce(middle_name, ''))"
+MAX_TERMS = 8
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+# --- Облегченный стеммер Snowball для русского языка ---
+
+_VOWELS = 'аеиоуыэюя'
+_PERFECTIVE_GERUND = (('вшись', 'вши', 'в'), ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв'))
+_REFLEXIVE = ('ся', 'сь')
+_ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое', 'ей', 'ий', 'ый',
+    'ой', 'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)
+_PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+_VERB = (
+    ('ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н'),
+    (
+        'ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило', 'ыло', 'ено', 'ует', 'уют',
+        'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю',
+    ),
+)
+_NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие', 'ье', 'еи', 'ии', 'ей',
+    'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах', 'ях', 'ию', 'ью', 'ия', 'ья',
+    'а', 'е', 'и', 'й', 'о', 'у', 'ы', 'ь', 'ю', 'я',
+)
+
+
+def _region_after_vowel_consonant(word, start=0):
+    for i in range(start + 1, len(word)):
+        if word[i - 1] in _VOWELS and word[i] not in _VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _strip(rv, endings, preceded_by_a=False):
+    """Отрезать самое длинное окончание из списка, вернуть новую строку или None"""
+    for ending in sorted(endings, key=len, reverse=True):
+        if rv.endswith(ending):
+            stem = rv[:-len(ending)]
+            if preceded_by_a and not stem.endswith(('а', 'я')):
+                continue
+            return stem
+    return None
+
+
+def _strip_groups(rv, groups):
+    first, second = groups
+    candidates = [s for s in (_strip(rv, first, preceded_by_a=True), _strip(rv, second)) if s is not None]
+    # Выбираем вариант с самым длинным отрезанным окончанием
+    return min(candidates, key=len) if candidates else None
+
+
+def stem(word):
+    """Основа русского слова (упрощенный алгоритм Snowball)"""
+    word = word.lower().replace('ё', 'е')
+    first_vowel = next((i for i, ch in enumerate(word) if ch in _VOWELS), None)
+    if first_vowel is None:
+        return word
+    prefix, rv = word[:first_vowel + 1], word[first_vowel + 1:]
+
+    # Шаг 1
+    result = _strip_groups(rv, _PERFECTIVE_GERUND)
+    if result is None:
+        reflexive = _strip(rv, _REFLEXIVE)
+        if reflexive is not None:
+            rv = reflexive
+        adjective = _strip(rv, _ADJECTIVE)
+        if adjective is not None:
+            participle = _strip_groups(adjective, _PARTICIPLE)
+            result = participle if participle is not None else adjective
+        else:
+            result = _strip_groups(rv, _VERB)
+            if result is None:
+                result = _strip(rv, _NOUN)
+    rv = rv if result is None else result
+
+    # Шаг 2
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательные окончания в R2
+    word = prefix + rv
+    r2 = _region_after_vowel_consonant(word, _region_after_vowel_consonant(word))
+    for ending in ('ость', 'ост'):
+        if word.endswith(ending) and len(word) - len(ending) >= r2:
+            rv = rv[:-len(ending)]
+            break
+
+    # Шаг 4
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        superlative = _strip(rv, ('ейше', 'ейш'))
+        if superlative is not None:
+            rv = superlative[:-1] if superlative.endswith('нн') else superlative
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text):
+    return [token.lower().replace('ё', 'е') for token in _WORD_RE.findall(text or '')][:MAX_TERMS * 8]
+
+
+def index_terms(text):
+    """Слова и их основы для индекса: «Иванова» находится и по «Иванов», и по «Иванову»"""
+    terms = []
+    for token in tokenize(text):
+        for term in (token, stem(token)):
+            if term not in terms:
+                terms.append(term)
+    return ' '.join(terms)
+
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            has_fts5 = cursor.fetchone()[0]
+        if not has_fts5:
+            # Без FTS5 поиск остается на icontains
+            return
+        Deputy = apps.get_model('deputies', 'Deputy')
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"name, district, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_VOCAB_TABLE} USING fts5vocab({FTS_TABLE}, 'row')"
+        )
+        rows = [
+            (pk, index_terms(' '.join([last_name, first_name, middle_name])), index_terms(district))
+            for pk, last_name, first_name, middle_name, district in Deputy.objects.values_list(
+                'pk', 'last_name', 'first_name', 'middle_name', 'district'
+            )
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, district) VALUES (%s, %s, %s)', rows)
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS deputies_deputy_search_idx ON deputies_deputy USING GIN ({PG_DOCUMENT})'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS deputies_deputy_name_trgm_idx ON deputies_deputy '
+            f'USING GIN ({PG_NAME} gin_trgm_ops)'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_VOCAB_TABLE}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS deputies_deputy_name_trgm_idx')
+        schema_editor.execute('DROP INDEX IF EXISTS deputies_deputy_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deputies', '0004_session_deputies_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
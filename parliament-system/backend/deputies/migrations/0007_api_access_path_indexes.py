@@ -0,0 +1,69 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deputies', '0006_vote_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(condition=models.Q(('is_present', True)), fields=['session'], name='attendance_present_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(condition=models.Q(('is_present', True)), fields=['deputy'], name='attendance_present_deputy_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['updated_at'], name='attendance_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deputy',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['last_name', 'first_name', 'id'], name='deputy_active_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deputy',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['party', 'last_name'], name='deputy_active_party_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deputy',
+            index=models.Index(fields=['updated_at'], name='deputy_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deputyvote',
+            index=models.Index(fields=['vote', 'choice'], name='deputyvote_vote_choice_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['date', 'id'], name='session_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(condition=models.Q(('is_closed', False)), fields=['date', 'id'], name='session_open_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['session_type', 'date'], name='session_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['updated_at'], name='session_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['created_at', 'id'], name='vote_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['updated_at'], name='vote_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='votetally',
+            index=models.Index(fields=['updated_at'], name='votetally_updated_idx'),
+        ),
+    ]
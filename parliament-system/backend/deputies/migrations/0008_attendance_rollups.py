@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:48
+
+from django.db import migrations, models
+from django.db.models import Count, DateField, F, Q
+from django.db.models.functions import Trunc
+
+
+def fill_attendance_rollups(apps, schema_editor):
+    Attendance = apps.get_model('deputies', 'Attendance')
+    AttendanceRollup = apps.get_model('deputies', 'AttendanceRollup')
+    dimensions = {'deputy': 'deputy_id', 'party': 'deputy__party_id', 'session_type': 'session__session_type'}
+    rows = []
+    for period in ('day', 'month'):
+        bucket = Trunc('session__date', period, output_field=DateField())
+        for dimension, field in dimensions.items():
+            grouped = Attendance.objects.order_by().values(period_start=bucket, value=F(field)).annotate(
+                present=Count('id', filter=Q(is_present=True)),
+                total=Count('id'),
+            )
+            rows.extend(
+                AttendanceRollup(
+                    dimension=dimension, period=period, key='' if item['value'] is None else str(item['value']),
+                    period_start=item['period_start'], present=item['present'], total=item['total'],
+                )
+                for item in grouped
+            )
+    AttendanceRollup.objects.bulk_create(rows, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deputies', '0007_api_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('deputy', 'Депутат'), ('party', 'Партия'), ('session_type', 'Тип заседания')], max_length=20, verbose_name='Разрез')),
+                ('period', models.CharField(choices=[('day', 'День'), ('month', 'Месяц')], max_length=10, verbose_name='Период')),
+                ('key', models.CharField(blank=True, max_length=32, verbose_name='Ключ')),
+                ('period_start', models.DateField(verbose_name='Начало периода')),
+                ('present', models.PositiveIntegerField(default=0, verbose_name='Присутствий')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Отметок')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Сводная посещаемость',
+                'verbose_name_plural': 'Сводная посещаемость',
+                'indexes': [models.Index(fields=['period_start'], name='attendance_rollup_start_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='attendancerollup',
+            constraint=models.UniqueConstraint(fields=('dimension', 'period', 'key', 'period_start'), name='attendance_rollup_bucket'),
+        ),
+        migrations.RunPython(fill_attendance_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:24
+
+from django.db import migrations, models
+
+
+def create_locks(apps, schema_editor):
+    # Имя - как stats.LOCK_NAME на момент миграции
+    apps.get_model('deputies', 'ComputeLock').objects.using(schema_editor.connection.alias).get_or_create(
+        name='statistics'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deputies', '0010_table_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComputeLock',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Имя')),
+                ('owner', models.CharField(blank=True, default='', max_length=64, verbose_name='Владелец')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Действует до')),
+            ],
+            options={
+                'verbose_name': 'Блокировка пересчета',
+                'verbose_name_plural': 'Блокировки пересчета',
+            },
+        ),
+        migrations.RunPython(create_locks, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
+from django.core.cache import cache
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
@@ -20,12 +23,32 @@ class User(AbstractUser):
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_password = instance.__dict__.get('password')
+        instance._loaded_is_active = instance.__dict__.get('is_active')
+        return instance
+
+
+class PartyQuerySet(models.QuerySet):
+    def with_members_count(self):
+        """Подсчитать депутатов партий одним запросом вместо COUNT на каждую партию"""
+        members = (
+            Deputy.objects.filter(party=models.OuterRef('pk'))
+            .order_by().values('party').annotate(c=Count('id')).values('c')
+        )
+        return self.annotate(deputies_count=Coalesce(models.Subquery(members), 0))
+
 
 class Party(models.Model):
     """Модель политической партии"""
     name = models.CharField(max_length=200, verbose_name='Название партии')
     short_name = models.CharField(max_length=50, verbose_name='Краткое название')
     logo = models.ImageField(upload_to='party_logos/', blank=True, null=True)
+    # Уменьшенные копии логотипа, строятся в фоне после загрузки (см. deputies/thumbnails.py)
+    logo_thumb = models.ImageField(blank=True, null=True, editable=False)
+    logo_medium = models.ImageField(blank=True, null=True, editable=False)
     description = models.TextField(blank=True, verbose_name='Описание')
     founded_date = models.DateField(null=True, blank=True, verbose_name='Дата основания')
     website = models.URLField(blank=True, verbose_name='Веб-сайт')
@@ -33,6 +56,10 @@ class Party(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PartyQuerySet.as_manager()
+
+    THUMBNAIL_FIELDS = ('logo_thumb', 'logo_medium')
+
     class Meta:
         verbose_name = 'Партия'
         verbose_name_plural = 'Партии'
@@ -41,8 +68,27 @@ class Party(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'logo' in instance.__dict__:
+            instance._loaded_logo = instance.__dict__['logo'] or ''
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Уменьшенные копии записывает фоновый поток, не перезаписываем их устаревшими значениями
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.THUMBNAIL_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def members_count(self):
+        # Списки партий аннотируют число депутатов одним запросом (deputies_count)
+        if hasattr(self, 'deputies_count'):
+            return self.deputies_count
         return self.deputies.count()
 
 
@@ -54,6 +100,9 @@ class Deputy(models.Model):
     middle_name = models.CharField(max_length=100, blank=True, verbose_name='Отчество')
     party = models.ForeignKey(Party, on_delete=models.SET_NULL, null=True, related_name='deputies', verbose_name='Партия')
     photo = models.ImageField(upload_to='deputy_photos/', blank=True, null=True)
+    # Уменьшенные копии фотографии, строятся в фоне после загрузки (см. deputies/thumbnails.py)
+    photo_thumb = models.ImageField(blank=True, null=True, editable=False)
+    photo_medium = models.ImageField(blank=True, null=True, editable=False)
     birth_date = models.DateField(null=True, blank=True, verbose_name='Дата рождения')
     election_date = models.DateField(verbose_name='Дата избрания')
     district = models.CharField(max_length=200, verbose_name='Избирательный округ')
@@ -61,17 +110,62 @@ class Deputy(models.Model):
     email = models.EmailField(blank=True)
     phone = models.CharField(max_length=20, blank=True)
     is_active = models.BooleanField(default=True, verbose_name='Активен')
+    # Денормализованные счетчики посещаемости, поддерживаются сигналами Attendance
+    attendance_present = models.PositiveIntegerField(default=0, editable=False, verbose_name='Присутствий')
+    attendance_total = models.PositiveIntegerField(default=0, editable=False, verbose_name='Отметок посещаемости')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    COUNTER_FIELDS = ('attendance_present', 'attendance_total')
+    THUMBNAIL_FIELDS = ('photo_thumb', 'photo_medium')
+
     class Meta:
         verbose_name = 'Депутат'
         verbose_name_plural = 'Депутаты'
         ordering = ['last_name', 'first_name']
+        indexes = [
+            # Список активных депутатов и фильтр по партии
+            models.Index(fields=['last_name', 'first_name', 'id'], condition=models.Q(is_active=True),
+                         name='deputy_active_name_idx'),
+            models.Index(fields=['party', 'last_name'], condition=models.Q(is_active=True),
+                         name='deputy_active_party_idx'),
+            models.Index(fields=['updated_at'], name='deputy_updated_idx'),
+        ]
 
     def __str__(self):
         return f'{self.last_name} {self.first_name} {self.middle_name}'.strip()
 
+    ACTIVE_COUNT_CACHE_KEY = 'deputies:active_count'
+    ACTIVE_COUNT_CACHE_TIMEOUT = 300
+
+    @classmethod
+    def active_count(cls):
+        """Число активных депутатов (кэшируется, сбрасывается при смене is_active)"""
+        return cache.get_or_set(
+            cls.ACTIVE_COUNT_CACHE_KEY,
+            lambda: cls.objects.filter(is_active=True).count(),
+            cls.ACTIVE_COUNT_CACHE_TIMEOUT,
+        )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_is_active = instance.__dict__.get('is_active')
+        instance._loaded_party_id = instance.__dict__.get('party_id')
+        if 'photo' in instance.__dict__:
+            instance._loaded_photo = instance.__dict__['photo'] or ''
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Счетчики обновляются только атомарными UPDATE, уменьшенные копии - фоновым потоком:
+        # не перезаписываем их устаревшими значениями
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS + self.THUMBNAIL_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def full_name(self):
         return f'{self.last_name} {self.first_name} {self.middle_name}'.strip()
@@ -79,11 +173,23 @@ class Deputy(models.Model):
     @property
     def attendance_rate(self):
         """Процент посещаемости заседаний"""
-        total_sessions = self.attendances.count()
-        if total_sessions == 0:
+        if self.attendance_total == 0:
             return 0
-        present_sessions = self.attendances.filter(is_present=True).count()
-        return round((present_sessions / total_sessions) * 100, 2)
+        return round((self.attendance_present / self.attendance_total) * 100, 2)
+
+
+class SessionQuerySet(models.QuerySet):
+    def with_attendance(self):
+        """Подсчитать присутствующих одним запросом вместо COUNT на каждое заседание"""
+        present = (
+            Attendance.objects.filter(session=models.OuterRef('pk'), is_present=True)
+            .order_by().values('session').annotate(c=Count('id')).values('c')
+        )
+        return self.annotate(present_count=Coalesce(models.Subquery(present), 0))
+
+    def finished(self, now=None):
+        """Заседания, которые уже прошли"""
+        return self.filter(date__lte=now or timezone.now())
 
 
 class Session(models.Model):
@@ -103,24 +209,47 @@ class Session(models.Model):
     duration_minutes = models.IntegerField(default=60, verbose_name='Продолжительность (минут)')
     documents = models.FileField(upload_to='session_documents/', blank=True, null=True)
     is_closed = models.BooleanField(default=False, verbose_name='Закрытое заседание')
+    deputies_snapshot = models.PositiveIntegerField(
+        null=True, blank=True, editable=False,
+        verbose_name='Активных депутатов на момент заседания'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SessionQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Заседание'
         verbose_name_plural = 'Заседания'
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date', 'id'], name='session_date_idx'),
+            # Гости видят только открытые заседания
+            models.Index(fields=['date', 'id'], condition=models.Q(is_closed=False), name='session_open_date_idx'),
+            models.Index(fields=['session_type', 'date'], name='session_type_date_idx'),
+            models.Index(fields=['updated_at'], name='session_updated_idx'),
+        ]
 
     def __str__(self):
         return f'{self.title} - {self.date.strftime("%d.%m.%Y")}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Дата и тип определяют корзины сводной посещаемости
+        instance._loaded_bucket = (instance.__dict__.get('date'), instance.__dict__.get('session_type'))
+        return instance
+
     @property
     def attendance_rate(self):
         """Процент посещаемости заседания"""
-        total_deputies = Deputy.objects.filter(is_active=True).count()
+        # Для прошедших заседаний знаменатель зафиксирован (в том числе нулевой), для остальных берется из кэша
+        total_deputies = self.deputies_snapshot if self.deputies_snapshot is not None else Deputy.active_count()
         if total_deputies == 0:
             return 0
-        present_deputies = self.attendances.filter(is_present=True).count()
+        present_deputies = getattr(self, 'present_count', None)
+        if present_deputies is None:
+            present_deputies = self.attendances.filter(is_present=True).count()
         return round((present_deputies / total_deputies) * 100, 2)
 
 
@@ -140,11 +269,30 @@ class Attendance(models.Model):
         verbose_name_plural = 'Посещаемость'
         unique_together = ['deputy', 'session']
         ordering = ['session', 'deputy']
+        indexes = [
+            # Подсчет присутствующих на заседании и присутствий депутата
+            models.Index(fields=['session'], condition=models.Q(is_present=True), name='attendance_present_session_idx'),
+            models.Index(fields=['deputy'], condition=models.Q(is_present=True), name='attendance_present_deputy_idx'),
+            models.Index(fields=['updated_at'], name='attendance_updated_idx'),
+        ]
 
     def __str__(self):
         status = 'Присутствовал' if self.is_present else 'Отсутствовал'
         return f'{self.deputy} - {self.session} ({status})'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем состояние из БД, чтобы сигналы могли посчитать разницу для счетчиков
+        instance._loaded_state = (instance.__dict__.get('deputy_id'), instance.__dict__.get('is_present'))
+        instance._loaded_session_id = instance.__dict__.get('session_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Запись и обновление счетчиков депутата выполняются в одной транзакции
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
 
 class Vote(models.Model):
     """Модель голосования"""
@@ -152,24 +300,60 @@ class Vote(models.Model):
     title = models.CharField(max_length=300, verbose_name='Вопрос голосования')
     description = models.TextField(verbose_name='Описание')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True, verbose_name='Активно')
 
     class Meta:
         verbose_name = 'Голосование'
         verbose_name_plural = 'Голосования'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], condition=models.Q(is_active=True), name='vote_active_created_idx'),
+            models.Index(fields=['updated_at'], name='vote_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     @property
     def results(self):
-        """Подсчет результатов голосования"""
-        votes = self.deputy_votes.all()
+        """Результаты голосования из таблицы итогов (без подсчета по голосам)"""
+        try:
+            return self.tally.as_dict()
+        except VoteTally.DoesNotExist:
+            return VoteTally(vote=self).as_dict()
+
+
+class VoteTally(models.Model):
+    """Итоги голосования, обновляются вместе с голосами депутатов"""
+    CHOICE_FIELDS = {
+        'for': 'votes_for',
+        'against': 'votes_against',
+        'abstain': 'votes_abstain',
+    }
+
+    vote = models.OneToOneField(Vote, on_delete=models.CASCADE, primary_key=True, related_name='tally', verbose_name='Голосование')
+    votes_for = models.PositiveIntegerField(default=0, verbose_name='За')
+    votes_against = models.PositiveIntegerField(default=0, verbose_name='Против')
+    votes_abstain = models.PositiveIntegerField(default=0, verbose_name='Воздержались')
+    total = models.PositiveIntegerField(default=0, verbose_name='Всего голосов')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Итоги голосования'
+        verbose_name_plural = 'Итоги голосований'
+        indexes = [
+            models.Index(fields=['updated_at'], name='votetally_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.vote}: {self.votes_for}/{self.votes_against}/{self.votes_abstain}'
+
+    def as_dict(self):
         return {
-            'for': votes.filter(choice='for').count(),
-            'against': votes.filter(choice='against').count(),
-            'abstain': votes.filter(choice='abstain').count(),
-            'total': votes.count()
+            'for': self.votes_for,
+            'against': self.votes_against,
+            'abstain': self.votes_abstain,
+            'total': self.total
         }
 
 
@@ -190,6 +374,87 @@ class DeputyVote(models.Model):
         verbose_name = 'Голос депутата'
         verbose_name_plural = 'Голоса депутатов'
         unique_together = ['vote', 'deputy']
+        indexes = [
+            # Итоги голосования: число голосов каждого варианта
+            models.Index(fields=['vote', 'choice'], name='deputyvote_vote_choice_idx'),
+        ]
 
     def __str__(self):
-        return f'{self.deputy} - {self.get_choice_display()}'
\ No newline at end of file
+        return f'{self.deputy} - {self.get_choice_display()}'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем голос из БД, чтобы сигналы могли перенести его в итогах при смене выбора
+        instance._loaded_state = (instance.__dict__.get('vote_id'), instance.__dict__.get('choice'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Голос и итоги голосования обновляются в одной транзакции
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class AttendanceRollup(models.Model):
+    """Посещаемость, сведенная по дням и месяцам для депутата, партии и типа заседания"""
+    PERIOD_CHOICES = [
+        ('day', 'День'),
+        ('month', 'Месяц'),
+    ]
+    DIMENSION_CHOICES = [
+        ('deputy', 'Депутат'),
+        ('party', 'Партия'),
+        ('session_type', 'Тип заседания'),
+    ]
+
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES, verbose_name='Разрез')
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES, verbose_name='Период')
+    # id депутата или партии (пустая строка - депутаты без партии) либо тип заседания
+    key = models.CharField(max_length=32, blank=True, verbose_name='Ключ')
+    period_start = models.DateField(verbose_name='Начало периода')
+    present = models.PositiveIntegerField(default=0, verbose_name='Присутствий')
+    total = models.PositiveIntegerField(default=0, verbose_name='Отметок')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Сводная посещаемость'
+        verbose_name_plural = 'Сводная посещаемость'
+        constraints = [
+            # Ряд одного ключа за интервал дат - срез этого индекса
+            models.UniqueConstraint(fields=['dimension', 'period', 'key', 'period_start'],
+                                    name='attendance_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['period_start'], name='attendance_rollup_start_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.dimension}:{self.key} {self.period} {self.period_start}: {self.present}/{self.total}'
+
+
+class TableVersion(models.Model):
+    """Версия таблицы для ETag: увеличивается при каждой записи в модель (см. deputies/conditional.py)"""
+    label = models.CharField(max_length=100, primary_key=True, verbose_name='Модель')
+    version = models.PositiveBigIntegerField(default=0, verbose_name='Версия')
+    updated_at = models.DateTimeField(verbose_name='Изменена')
+
+    class Meta:
+        verbose_name = 'Версия таблицы'
+        verbose_name_plural = 'Версии таблиц'
+
+    def __str__(self):
+        return f'{self.label}: {self.version}'
+
+
+class ComputeLock(models.Model):
+    """Право на пересчет общего кэша одним процессом (см. deputies/stats.py)"""
+    name = models.CharField(max_length=100, primary_key=True, verbose_name='Имя')
+    owner = models.CharField(max_length=64, blank=True, default='', verbose_name='Владелец')
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name='Действует до')
+
+    class Meta:
+        verbose_name = 'Блокировка пересчета'
+        verbose_name_plural = 'Блокировки пересчета'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,123 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Курсорная пагинация: следующая страница выбирается по ключу последней строки, без OFFSET.
+
+    Курсор хранит значения всех полей порядка последней (для previous - первой)
+    строки страницы, и страница начинается строго после этого ключа: совпадения
+    первых полей (однофамильцы, одна дата) различает последнее поле, а строки,
+    добавленные или удаленные между запросами, не сдвигают выдачу. Последнее поле
+    порядка должно быть уникальным (id), поля - без NULL.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = None if self.cursor is None else self.cursor.position
+
+        ordering = [self._flip(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self._after(ordering, position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+        # Пустая страница (курсор за концом выдачи) ссылок не дает
+        self.has_next = bool(self.page) and (position is not None if reverse else has_more)
+        self.has_previous = bool(self.page) and (has_more if reverse else position is not None)
+        if (self.has_next or self.has_previous) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self._position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self._position(self.page[0])))
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def _position(self, instance):
+        values = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            values.append(str(instance[name] if isinstance(instance, dict) else getattr(instance, name)))
+        return json.dumps(values, ensure_ascii=False)
+
+    def _after(self, ordering, position):
+        """Условие "строка после ключа position" в порядке ordering:
+        (a > x) | (a = x & b > y) | (a = x & b = y & id > z), с учетом направления полей"""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+
+class HistoryPagination(KeysetPagination):
+    """История депутата: сначала последние заседания"""
+    ordering = ('-session_date', '-id')
+
+
+class HybridPagination(PageNumberPagination):
+    """Номера страниц по умолчанию, курсор - по запросу.
+
+    ?pagination=cursor включает курсорный режим с порядком cursor_ordering представления,
+    ссылки next/previous несут параметр cursor и сохраняют режим. Курсор недоступен, если представление упорядочивает
+    выдачу само (например, по релевантности поиска) - тогда остаются номера страниц.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self._keyset = None
+        wants_cursor = (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+        if wants_cursor and getattr(view, 'cursor_ordering', None) and not getattr(view, 'custom_ordering', False):
+            self._keyset = KeysetPagination()
+            self._keyset.page_size = self.page_size
+            self._keyset.ordering = view.cursor_ordering
+            return self._keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self._keyset is not None:
+            return self._keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,99 @@
+"""
+Кэш ответов списков API (партии, депутаты).
+
+Ключ ответа строится из хоста, пути, отсортированных параметров запроса,
+класса видимости (тип пользователя) и поколений моделей, от которых зависит
+ответ. Сохранение или удаление такой модели увеличивает ее поколение
+(см. deputies/signals.py), и старые ответы больше не читаются - их вытесняет
+сам бэкенд кэша (MAX_ENTRIES) или истечение RESPONSE_CACHE_TIMEOUT.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from . import routers
+
+HITS_KEY = 'responses:hits'
+MISSES_KEY = 'responses:misses'
+
+
+def get_cache():
+    alias = getattr(settings, 'RESPONSE_CACHE_ALIAS', 'responses')
+    return caches[alias if alias in settings.CACHES else 'default']
+
+
+def _generation_key(model):
+    return f'responses:generation:{model._meta.label}'
+
+
+def generations(models):
+    cache = get_cache()
+    keys = [_generation_key(model) for model in models]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            # Начальное поколение - время, чтобы после вытеснения ключа не совпасть со старым
+            cache.add(key, time.time_ns(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def _bump(model):
+    cache = get_cache()
+    # Метка раньше поколения: запрос, увидевший новое поколение, соберет ответ с основной базы
+    routers.mark_written(cache)
+    key = _generation_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def invalidate(sender, **kwargs):
+    """Обработчик сигналов: устарели ответы, зависящие от модели sender.
+
+    Поколение увеличивается сразу и еще раз после фиксации транзакции, чтобы
+    ответ, собранный параллельным запросом по незафиксированным данным, не остался в кэше.
+    """
+    _bump(sender)
+    transaction.on_commit(lambda: _bump(sender))
+
+
+def make_key(request, visibility, models):
+    params = sorted((name, value) for name, values in request.query_params.lists() for value in values)
+    parts = (request.get_host(), request.path, params, visibility, generations(models))
+    return 'responses:' + hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _count(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def lookup(key):
+    data = get_cache().get(key)
+    _count(MISSES_KEY if data is None else HITS_KEY)
+    return data
+
+
+def store(key, data):
+    get_cache().set(key, data, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+
+
+def statistics():
+    cache = get_cache()
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+    return {
+        'backend': type(cache).__name__,
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses) * 100, 2) if hits + misses else 0,
+    }
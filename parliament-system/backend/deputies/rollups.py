@@ -0,0 +1,262 @@
+"""
+Сводная посещаемость по дням и месяцам (AttendanceRollup).
+
+Отметка попадает в корзины депутата, его текущей партии и типа заседания;
+день и месяц считаются в часовом поясе проекта. Одиночные отметки сдвигают
+счетчики одним INSERT ... ON CONFLICT, массовая запись пересчитывает только
+затронутые ключи, перенос заседания - месяцы целиком. Полный пересчет делится
+на интервалы по месяцам, которые команда rebuild_rollups считает параллельно.
+"""
+
+import operator
+from datetime import datetime, time, timedelta
+from functools import reduce
+
+from django.db import connections, router, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Deputy, Session, Attendance, AttendanceRollup
+
+# Разрез -> поле отметки, по которому группируются корзины
+DIMENSIONS = {
+    'deputy': 'deputy_id',
+    'party': 'deputy__party_id',
+    'session_type': 'session__session_type',
+}
+PERIODS = ('day', 'month')
+
+
+def _key(value):
+    return '' if value is None else str(value)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def buckets(moment):
+    """Начала периодов, в которые попадает заседание: {'day': ..., 'month': ...}"""
+    day = timezone.localtime(moment).date()
+    return {'day': day, 'month': month_start(day)}
+
+
+def day_start(day):
+    """Начало дня day в часовом поясе проекта"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _shift(keys, present, total):
+    """Сдвинуть счетчики корзин [(разрез, период, ключ, начало)] на present и total одним запросом"""
+    if present < 0 or total < 0:
+        # Уменьшаются только существующие корзины; CHECK не пропустил бы отрицательную вставку
+        AttendanceRollup.objects.filter(reduce(operator.or_, (
+            Q(dimension=dimension, period=period, key=key, period_start=start)
+            for dimension, period, key, start in keys
+        ))).update(present=F('present') + present, total=F('total') + total, updated_at=timezone.now())
+        return
+    connection = connections[router.db_for_write(AttendanceRollup)]
+    quote = connection.ops.quote_name
+    table = quote(AttendanceRollup._meta.db_table)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    sql = (
+        f'INSERT INTO {table} ({quote("dimension")}, {quote("period")}, {quote("key")}, '
+        f'{quote("period_start")}, {quote("present")}, {quote("total")}, {quote("updated_at")}) '
+        f'VALUES {", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(keys))} '
+        f'ON CONFLICT ({quote("dimension")}, {quote("period")}, {quote("key")}, {quote("period_start")}) '
+        f'DO UPDATE SET {quote("present")} = {table}.{quote("present")} + EXCLUDED.{quote("present")}, '
+        f'{quote("total")} = {table}.{quote("total")} + EXCLUDED.{quote("total")}, '
+        f'{quote("updated_at")} = EXCLUDED.{quote("updated_at")}'
+    )
+    params = []
+    for dimension, period, key, start in keys:
+        params.extend([dimension, period, key, connection.ops.adapt_datefield_value(start), present, total, now])
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def apply_attendance_delta(attendance, present=0, total=0, session_id=None, deputy_id=None):
+    """Сдвинуть корзины отметки attendance (или ее прежнего заседания и депутата)"""
+    if present == 0 and total == 0:
+        return
+    session_id = session_id or attendance.session_id
+    deputy_id = deputy_id or attendance.deputy_id
+    # Заседание и депутат обычно уже загружены вместе с отметкой
+    if session_id == attendance.session_id and Attendance.session.is_cached(attendance):
+        session = attendance.session
+    else:
+        session = Session.objects.filter(pk=session_id).only('date', 'session_type').first()
+    if deputy_id == attendance.deputy_id and Attendance.deputy.is_cached(attendance):
+        party_id = attendance.deputy.party_id
+    else:
+        party_id = Deputy.objects.filter(pk=deputy_id).values_list('party_id', flat=True).first()
+    if session is None:
+        return
+    keys = {'deputy': _key(deputy_id), 'party': _key(party_id), 'session_type': session.session_type}
+    _shift([
+        (dimension, period, key, start)
+        for period, start in buckets(session.date).items()
+        for dimension, key in keys.items()
+    ], present, total)
+
+
+def recount_parties(party_ids):
+    """Пересчитать всю историю партий party_ids (None - депутаты без партии)"""
+    scope = Q(deputy__party_id__in=[pk for pk in party_ids if pk is not None])
+    if None in party_ids:
+        scope |= Q(deputy__party_id__isnull=True)
+    rows = compute(scopes={'party': scope}, dimensions=['party'])
+    with transaction.atomic():
+        AttendanceRollup.objects.filter(dimension='party', key__in=[_key(pk) for pk in party_ids]).delete()
+        AttendanceRollup.objects.bulk_create(rows, batch_size=2000)
+
+
+def compute(start=None, end=None, scopes=None, dimensions=tuple(DIMENSIONS)):
+    """Посчитать корзины по отметкам заседаний в [start, end) без записи в базу.
+
+    База группирует отметки по заседаниям, день заседания и месячные корзины
+    досчитываются здесь: усечение даты с часовым поясом на каждой строке обходится
+    дороже самой группировки. scopes ограничивает ключи разреза ({разрез: Q}).
+    """
+    sessions = Session.objects.order_by()
+    if start:
+        sessions = sessions.filter(date__gte=day_start(start))
+    if end:
+        sessions = sessions.filter(date__lt=day_start(end))
+    days = {pk: buckets(moment)['day'] for pk, moment in sessions.values_list('pk', 'date')}
+    attendances = Attendance.objects.order_by()
+    if start or end:
+        attendances = attendances.filter(session__in=sessions.values('pk'))
+    counts = {}
+    for dimension in dimensions:
+        grouped = attendances.filter((scopes or {}).get(dimension, Q())).values_list(
+            'session_id', DIMENSIONS[dimension]
+        ).annotate(
+            present=Count('id', filter=Q(is_present=True)),
+            total=Count('id'),
+        )
+        for session_id, value, present, total in grouped:
+            day = days.get(session_id)
+            if day is None:
+                # Заседание создано уже после выборки дат
+                continue
+            for period, period_start in (('day', day), ('month', month_start(day))):
+                bucket = counts.setdefault((dimension, period, _key(value), period_start), [0, 0])
+                bucket[0] += present
+                bucket[1] += total
+    return [
+        AttendanceRollup(dimension=dimension, period=period, key=key, period_start=period_start,
+                         present=present, total=total)
+        for (dimension, period, key, period_start), (present, total) in counts.items()
+    ]
+
+
+def replace(start, end, rows, batch_size=2000):
+    """Заменить корзины с началом в [start, end) заранее посчитанными строками"""
+    stored = AttendanceRollup.objects.all()
+    if start:
+        stored = stored.filter(period_start__gte=start)
+    if end:
+        stored = stored.filter(period_start__lt=end)
+    with transaction.atomic():
+        stored.delete()
+        AttendanceRollup.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def rebuild(date_from=None, date_to=None):
+    """Пересчитать корзины месяцев, в которые попадают даты date_from..date_to (по умолчанию - все)"""
+    start = month_start(date_from) if date_from else None
+    end = next_month(date_to) if date_to else None
+    with transaction.atomic():
+        return replace(start, end, compute(start, end))
+
+
+def refresh(session_ids, deputy_ids):
+    """Пересчитать корзины депутатов deputy_ids, их партий и типов заседаний session_ids.
+
+    Подходит для массовой записи отметок, которая только добавляет или меняет строки:
+    пересчитываются лишь затронутые ключи в месяцах этих заседаний.
+    """
+    sessions = list(Session.objects.filter(pk__in=list(session_ids)).values_list('date', 'session_type'))
+    deputy_ids = list(deputy_ids)
+    scopes = {
+        'deputy': Q(deputy_id__in=deputy_ids),
+        'party': Q(deputy__party_id__in=Deputy.objects.filter(pk__in=deputy_ids).values('party_id'))
+        | Q(deputy__party_id__isnull=True),
+        'session_type': Q(session__session_type__in={session_type for _, session_type in sessions}),
+    }
+    for month in sorted({buckets(moment)['month'] for moment, _ in sessions}):
+        AttendanceRollup.objects.bulk_create(
+            compute(month, next_month(month), scopes),
+            update_conflicts=True,
+            unique_fields=['dimension', 'period', 'key', 'period_start'],
+            update_fields=['present', 'total', 'updated_at'],
+            batch_size=500,
+        )
+
+
+def rebuild_sessions(session_ids):
+    """Пересчитать месяцы, в которые попадают заседания session_ids"""
+    months = {
+        buckets(moment)['month']
+        for moment in Session.objects.filter(pk__in=list(session_ids)).values_list('date', flat=True)
+    }
+    for month in sorted(months):
+        rebuild(month, month)
+
+
+def month_chunks(date_from, date_to, months=1):
+    """Интервалы [начало, конец) по months месяцев, покрывающие даты date_from..date_to"""
+    chunks = []
+    start = month_start(date_from)
+    last = next_month(date_to)
+    while start < last:
+        end = start
+        for _ in range(months):
+            end = next_month(end)
+        chunks.append((start, min(end, last)))
+        start = end
+    return chunks
+
+
+def find_mismatches():
+    """Корзины, расходящиеся с отметками посещаемости: [(корзина, сохранено, фактически)]"""
+    def index(rows):
+        return {
+            (row.dimension, row.period, row.key, row.period_start): (row.present, row.total)
+            for row in rows if row.total
+        }
+
+    actual = index(compute())
+    stored = index(AttendanceRollup.objects.all())
+    return [
+        (bucket, stored.get(bucket), actual.get(bucket))
+        for bucket in sorted(set(actual) | set(stored))
+        if stored.get(bucket) != actual.get(bucket)
+    ]
+
+
+def series(dimension, period, keys=None, date_from=None, date_to=None):
+    """Ряды {ключ: [корзины по возрастанию даты]} из сводной таблицы"""
+    rows = AttendanceRollup.objects.filter(dimension=dimension, period=period, total__gt=0)
+    if keys:
+        rows = rows.filter(key__in=keys)
+    if date_from:
+        rows = rows.filter(period_start__gte=month_start(date_from) if period == 'month' else date_from)
+    if date_to:
+        rows = rows.filter(period_start__lte=date_to)
+    result = {}
+    for key, start, present, total in rows.order_by('key', 'period_start').values_list(
+            'key', 'period_start', 'present', 'total'):
+        result.setdefault(key, []).append({
+            'period': start,
+            'present': present,
+            'total': total,
+            'rate': round(present * 100 / total, 2),
+        })
+    return result
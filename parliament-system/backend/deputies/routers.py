@@ -0,0 +1,116 @@
+"""
+Чтение с реплики и закрепление клиента за основной базой после записи.
+
+Чтение идет на алиас REPLICA_DATABASE только внутри безопасных HTTP-запросов
+(GET, HEAD, OPTIONS) - это решает ReplicaRoutingMiddleware. Запись, чтение
+внутри POST/PUT/DELETE, команды управления и фоновые потоки работают с
+основной базой. После успешной записи клиент на REPLICA_PIN_SECONDS
+закрепляется за основной базой (cookie и ключ в кэше по токену), чтобы
+депутат сразу видел свой голос, даже если реплика отстает.
+
+Общие кэши (ответы списков, снимок статистики) заполняет любой клиент, поэтому
+после их сброса в течение REPLICA_PIN_SECONDS и заполнение идет с основной
+базы (mark_written/filling): иначе ответ, собранный по отстающей реплике, лег
+бы в кэш под новым поколением.
+"""
+
+import hashlib
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'primary_pin'
+WRITE_MARK_KEY = 'replica:written'
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def replica_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get():
+            return replica_alias() or 'default'
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика - копия основной базы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def mark_written(cache):
+    """Отметить в кэше cache сброс по записи: REPLICA_PIN_SECONDS он заполняется с основной базы"""
+    if replica_alias() is not None:
+        pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+        cache.set(WRITE_MARK_KEY, True, pin_seconds)
+
+
+@contextmanager
+def filling(cache):
+    """Чтение для заполнения кэша cache: с основной базы, если его недавно сбросили"""
+    if not _read_from_replica.get() or not cache.get(WRITE_MARK_KEY):
+        yield
+        return
+    token = _read_from_replica.set(False)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+def _pin_key(request):
+    credentials = request.META.get('HTTP_AUTHORIZATION')
+    if not credentials:
+        return None
+    return 'replica:pin:' + hashlib.sha1(credentials.encode('utf-8')).hexdigest()
+
+
+def _is_pinned(request):
+    try:
+        if float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    key = _pin_key(request)
+    return bool(key and cache.get(key))
+
+
+class ReplicaRoutingMiddleware:
+    """Направляет чтение безопасных запросов на реплику, если она настроена"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+        use_replica = (
+            replica_alias() is not None
+            and request.method in SAFE_METHODS
+            and not _is_pinned(request)
+        )
+        token = _read_from_replica.set(use_replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_from_replica.reset(token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replica_alias():
+            expires = time.time() + pin_seconds
+            response.set_cookie(PIN_COOKIE, f'{expires:.0f}', max_age=pin_seconds, httponly=True, samesite='Lax')
+            key = _pin_key(request)
+            if key:
+                cache.set(key, True, pin_seconds)
+        return response
@@ -0,0 +1,303 @@
+"""
+Полнотекстовый поиск депутатов.
+
+SQLite: виртуальная таблица FTS5 с основами слов, синхронизируется сигналами Deputy.
+PostgreSQL: GIN-индексы по выражениям to_tsvector('russian', ...) и pg_trgm
+(создаются миграцией, синхронизируются самой СУБД).
+Для остальных СУБД остается прежний поиск через icontains.
+"""
+
+import difflib
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'deputies_deputy_fts'
+FTS_VOCAB_TABLE = 'deputies_deputy_fts_vocab'
+
+# Выражения должны совпадать с индексами из миграции, иначе PostgreSQL их не использует
+PG_DOCUMENT = (
+    "to_tsvector('russian'::regconfig, "
+    "coalesce(last_name, '') || ' ' || coalesce(first_name, '') || ' ' || "
+    "coalesce(middle_name, '') || ' ' || coalesce(district, ''))"
+)
+PG_NAME = "(coalesce(last_name, '') || ' ' || coalesce(first_name, '') || ' ' || coalesce(middle_name, ''))"
+
+MAX_TERMS = 8
+MIN_STEM_PREFIX = 4
+TYPO_CUTOFF = 0.75
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+# --- Облегченный стеммер Snowball для русского языка ---
+# Миграция 0005 наполняет индекс своей копией стеммера: после его изменения
+# индекс пересобирается командой rebuild_search_index
+
+_VOWELS = 'аеиоуыэюя'
+_PERFECTIVE_GERUND = (('вшись', 'вши', 'в'), ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв'))
+_REFLEXIVE = ('ся', 'сь')
+_ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое', 'ей', 'ий', 'ый',
+    'ой', 'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)
+_PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+_VERB = (
+    ('ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н'),
+    (
+        'ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило', 'ыло', 'ено', 'ует', 'уют',
+        'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю',
+    ),
+)
+_NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие', 'ье', 'еи', 'ии', 'ей',
+    'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах', 'ях', 'ию', 'ью', 'ия', 'ья',
+    'а', 'е', 'и', 'й', 'о', 'у', 'ы', 'ь', 'ю', 'я',
+)
+
+
+def _region_after_vowel_consonant(word, start=0):
+    for i in range(start + 1, len(word)):
+        if word[i - 1] in _VOWELS and word[i] not in _VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _strip(rv, endings, preceded_by_a=False):
+    """Отрезать самое длинное окончание из списка, вернуть новую строку или None"""
+    for ending in sorted(endings, key=len, reverse=True):
+        if rv.endswith(ending):
+            stem = rv[:-len(ending)]
+            if preceded_by_a and not stem.endswith(('а', 'я')):
+                continue
+            return stem
+    return None
+
+
+def _strip_groups(rv, groups):
+    first, second = groups
+    candidates = [s for s in (_strip(rv, first, preceded_by_a=True), _strip(rv, second)) if s is not None]
+    # Выбираем вариант с самым длинным отрезанным окончанием
+    return min(candidates, key=len) if candidates else None
+
+
+def stem(word):
+    """Основа русского слова (упрощенный алгоритм Snowball)"""
+    word = word.lower().replace('ё', 'е')
+    first_vowel = next((i for i, ch in enumerate(word) if ch in _VOWELS), None)
+    if first_vowel is None:
+        return word
+    prefix, rv = word[:first_vowel + 1], word[first_vowel + 1:]
+
+    # Шаг 1
+    result = _strip_groups(rv, _PERFECTIVE_GERUND)
+    if result is None:
+        reflexive = _strip(rv, _REFLEXIVE)
+        if reflexive is not None:
+            rv = reflexive
+        adjective = _strip(rv, _ADJECTIVE)
+        if adjective is not None:
+            participle = _strip_groups(adjective, _PARTICIPLE)
+            result = participle if participle is not None else adjective
+        else:
+            result = _strip_groups(rv, _VERB)
+            if result is None:
+                result = _strip(rv, _NOUN)
+    rv = rv if result is None else result
+
+    # Шаг 2
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательные окончания в R2
+    word = prefix + rv
+    r2 = _region_after_vowel_consonant(word, _region_after_vowel_consonant(word))
+    for ending in ('ость', 'ост'):
+        if word.endswith(ending) and len(word) - len(ending) >= r2:
+            rv = rv[:-len(ending)]
+            break
+
+    # Шаг 4
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        superlative = _strip(rv, ('ейше', 'ейш'))
+        if superlative is not None:
+            rv = superlative[:-1] if superlative.endswith('нн') else superlative
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text):
+    return [token.lower().replace('ё', 'е') for token in _WORD_RE.findall(text or '')][:MAX_TERMS * 8]
+
+
+def index_terms(text):
+    """Слова и их основы для индекса: «Иванова» находится и по «Иванов», и по «Иванову»"""
+    terms = []
+    for token in tokenize(text):
+        for term in (token, stem(token)):
+            if term not in terms:
+                terms.append(term)
+    return ' '.join(terms)
+
+
+# --- Бэкенды ---
+
+class IContainsBackend:
+    """Поиск без индекса (прежнее поведение)"""
+
+    def search(self, queryset, text):
+        condition = Q()
+        # Без понижения регистра: LIKE в SQLite не сравняет регистр кириллицы за нас
+        for token in text.split()[:MAX_TERMS]:
+            condition &= (
+                Q(first_name__icontains=token) |
+                Q(last_name__icontains=token) |
+                Q(middle_name__icontains=token) |
+                Q(district__icontains=token)
+            )
+        return queryset.filter(condition)
+
+    def index(self, deputy):
+        pass
+
+    def remove(self, deputy_id):
+        pass
+
+    def rebuild(self):
+        return 0
+
+
+class SQLiteFTSBackend(IContainsBackend):
+    """FTS5: bm25 с весом ФИО выше округа, префиксный поиск и исправление опечаток по словарю индекса"""
+
+    name_weight = 10.0
+    district_weight = 2.0
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def _match_expression(self, tokens):
+        groups = []
+        for token in tokens:
+            variants = [f'"{token}"*']
+            token_stem = stem(token)
+            if token_stem != token:
+                # Короткая основа как префикс дает слишком много совпадений («ан*» для «Анна»)
+                variants.append(f'"{token_stem}"*' if len(token_stem) >= MIN_STEM_PREFIX else f'"{token_stem}"')
+            groups.append('(' + ' OR '.join(variants) + ')')
+        return ' AND '.join(groups)
+
+    def _matches(self, expression):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'SELECT 1 FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s LIMIT 1', [expression])
+            return cursor.fetchone() is not None
+
+    def _corrected(self, token):
+        """Ближайшие по написанию термины индекса с той же первой буквой"""
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT term FROM {FTS_VOCAB_TABLE} WHERE term >= %s AND term < %s',
+                [token[0], chr(ord(token[0]) + 1)],
+            )
+            vocabulary = [row[0] for row in cursor.fetchall()]
+        return difflib.get_close_matches(token, vocabulary, n=3, cutoff=TYPO_CUTOFF)
+
+    def search(self, queryset, text):
+        tokens = tokenize(text)[:MAX_TERMS]
+        if not tokens:
+            return queryset
+        expression = self._match_expression(tokens)
+        if not self._matches(expression):
+            groups = []
+            for token in tokens:
+                variants = [token] + self._corrected(token)
+                groups.append('(' + ' OR '.join(f'"{variant}"' for variant in variants) + ')')
+            expression = ' AND '.join(groups)
+        # Соединение с FTS-таблицей по rowid: SQLite сначала выполняет MATCH, затем берет строки по ключу
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[expression],
+            select={'search_rank': f'bm25({FTS_TABLE}, %s, %s)'},
+            select_params=[self.name_weight, self.district_weight],
+            order_by=['search_rank'],
+        )
+
+    def index(self, deputy):
+        name = ' '.join([deputy.last_name, deputy.first_name, deputy.middle_name])
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [deputy.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, district) VALUES (%s, %s, %s)',
+                [deputy.pk, index_terms(name), index_terms(deputy.district)],
+            )
+
+    def remove(self, deputy_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [deputy_id])
+
+    def rebuild(self):
+        from .models import Deputy
+
+        rows = Deputy.objects.values_list('pk', 'last_name', 'first_name', 'middle_name', 'district')
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            batch = []
+            for pk, last_name, first_name, middle_name, district in rows.iterator(chunk_size=2000):
+                name = ' '.join([last_name, first_name, middle_name])
+                batch.append((pk, index_terms(name), index_terms(district)))
+                if len(batch) >= 2000:
+                    cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, district) VALUES (%s, %s, %s)', batch)
+                    batch = []
+            if batch:
+                cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, district) VALUES (%s, %s, %s)', batch)
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        return rows.count()
+
+
+class PostgresSearchBackend(IContainsBackend):
+    """tsvector с русской морфологией плюс pg_trgm для опечаток, ранжирование ts_rank + similarity"""
+
+    def search(self, queryset, text):
+        tokens = tokenize(text)[:MAX_TERMS]
+        if not tokens:
+            return queryset
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        phrase = ' '.join(tokens)
+        rank = RawSQL(
+            f"ts_rank({PG_DOCUMENT}, to_tsquery('russian'::regconfig, %s)) + similarity({PG_NAME}, %s)",
+            [tsquery, phrase],
+        )
+        matches = RawSQL(
+            f"{PG_DOCUMENT} @@ to_tsquery('russian'::regconfig, %s) OR {PG_NAME} %% %s",
+            [tsquery, phrase],
+        )
+        return queryset.annotate(search_rank=rank, search_match=matches).filter(
+            search_match=True
+        ).order_by('-search_rank', 'last_name', 'first_name')
+
+
+def _fts_available(connection):
+    # Запоминаем только положительный ответ: таблица может появиться после миграции
+    if not getattr(connection, '_deputy_fts_available', False):
+        connection._deputy_fts_available = FTS_TABLE in connection.introspection.table_names()
+    return connection._deputy_fts_available
+
+
+def get_backend(using='default'):
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and _fts_available(connection):
+        return SQLiteFTSBackend(connection)
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return IContainsBackend()
+
+
+def search_deputies(queryset, text):
+    return get_backend(queryset.db).search(queryset, text)
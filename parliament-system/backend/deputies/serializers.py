@@ -3,6 +3,63 @@ from django.contrib.auth import authenticate
 from .models import User, Party, Deputy, Session, Attendance, Vote, DeputyVote
 
 
+def split_param(value):
+    """Множество значений параметра запроса через запятую: "a, b" -> {'a', 'b'}"""
+    return {name.strip() for name in value.split(',') if name.strip()} if value else set()
+
+
+def selected_fields(serializer_class, request, collapse):
+    """Поля сериализатора, которые попадут в ответ.
+
+    ?fields=a,b оставляет только перечисленные поля. Поля из Meta.expandable_fields
+    (вложенные коллекции и вычисляемые свойства) в списках (collapse=True) выводятся
+    только по ?expand=a,b или при явном указании в ?fields=.
+    """
+    names = set(serializer_class.Meta.fields)
+    if request is None or request.method != 'GET':
+        return names
+    requested = split_param(request.query_params.get('fields'))
+    expand = split_param(request.query_params.get('expand'))
+    if requested:
+        names &= requested
+    if collapse:
+        names -= set(getattr(serializer_class.Meta, 'expandable_fields', ())) - expand - requested
+    return names
+
+
+class DynamicFieldsMixin:
+    """Выборочный вывод полей по ?fields= и ?expand= (см. selected_fields).
+
+    Действует только на сериализатор верхнего уровня ответа; список сворачивается
+    для действия list представления.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        root = self.parent.parent if isinstance(self.parent, serializers.ListSerializer) else self.parent
+        if root is not None:
+            return fields
+        view = self.context.get('view')
+        keep = selected_fields(type(self), self.context.get('request'), getattr(view, 'action', None) == 'list')
+        return {name: field for name, field in fields.items() if name in keep}
+
+
+class VariantImageField(serializers.ImageField):
+    """Уменьшенная копия изображения (см. deputies/thumbnails.py), пока ее нет - оригинал.
+
+    Копии строятся после загрузки, а у изображений, загруженных до их появления, -
+    командой rebuild_thumbnails; до того список показывает оригинал, а не пустое место.
+    """
+
+    def __init__(self, original, **kwargs):
+        self.original = original
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return super().get_attribute(instance) or getattr(instance, self.original)
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -32,41 +89,50 @@ class LoginSerializer(serializers.Serializer):
         return data
 
 
-class PartySerializer(serializers.ModelSerializer):
+class PartySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     members_count = serializers.ReadOnlyField()
     founded_year = serializers.SerializerMethodField()
+    logo_thumb = VariantImageField('logo')
+    logo_medium = VariantImageField('logo')
 
     class Meta:
         model = Party
         fields = [
-            'id', 'name', 'short_name', 'logo', 'description',
+            'id', 'name', 'short_name', 'logo', 'logo_thumb', 'logo_medium', 'description',
             'founded_date', 'founded_year',  # 👈 добавили год
             'website', 'color', 'members_count'
         ]
+        # Оригинал логотипа в списке - только по ?expand=logo, обычно хватает уменьшенных копий
+        expandable_fields = ['members_count', 'logo']
 
     def get_founded_year(self, obj):
         return obj.founded_date.year if obj.founded_date else None
 
-class DeputyListSerializer(serializers.ModelSerializer):
+class DeputyListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     party_name = serializers.CharField(source='party.name', read_only=True)
     party_color = serializers.CharField(source='party.color', read_only=True)
+    photo_thumb = VariantImageField('photo')
+    photo_medium = VariantImageField('photo')
     attendance_rate = serializers.ReadOnlyField()
     
     class Meta:
         model = Deputy
         fields = [
-            'id', 'full_name', 'photo', 'party', 'party_name', 
+            'id', 'full_name', 'photo_thumb', 'photo_medium', 'party', 'party_name', 
             'party_color', 'district', 'attendance_rate', 'is_active'
         ]
+        expandable_fields = ['attendance_rate']
 
 
-class DeputyDetailSerializer(serializers.ModelSerializer):
+class DeputyDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     party = PartySerializer(read_only=True)
     party_id = serializers.PrimaryKeyRelatedField(
         queryset=Party.objects.all(), 
         source='party', 
         write_only=True
     )
+    photo_thumb = VariantImageField('photo')
+    photo_medium = VariantImageField('photo')
     attendance_rate = serializers.ReadOnlyField()
     full_name = serializers.ReadOnlyField()
     
@@ -74,13 +140,13 @@ class DeputyDetailSerializer(serializers.ModelSerializer):
         model = Deputy
         fields = [
             'id', 'first_name', 'last_name', 'middle_name', 'full_name',
-            'party', 'party_id', 'photo', 'birth_date', 'election_date',
+            'party', 'party_id', 'photo', 'photo_thumb', 'photo_medium', 'birth_date', 'election_date',
             'district', 'biography', 'email', 'phone', 'is_active',
             'attendance_rate', 'created_at', 'updated_at'
         ]
 
 
-class AttendanceSerializer(serializers.ModelSerializer):
+class AttendanceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     deputy_name = serializers.CharField(source='deputy.full_name', read_only=True)
     session_title = serializers.CharField(source='session.title', read_only=True)
     
@@ -92,7 +158,16 @@ class AttendanceSerializer(serializers.ModelSerializer):
         ]
 
 
-class SessionListSerializer(serializers.ModelSerializer):
+class RollCallEntrySerializer(serializers.Serializer):
+    """Одна строка поименной регистрации"""
+    deputy_id = serializers.IntegerField()
+    is_present = serializers.BooleanField(default=True)
+    absence_reason = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+    arrival_time = serializers.TimeField(required=False, allow_null=True, default=None)
+    departure_time = serializers.TimeField(required=False, allow_null=True, default=None)
+
+
+class SessionListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     attendance_rate = serializers.ReadOnlyField()
     
     class Meta:
@@ -101,9 +176,10 @@ class SessionListSerializer(serializers.ModelSerializer):
             'id', 'title', 'session_type', 'date', 'location',
             'attendance_rate', 'is_closed'
         ]
+        expandable_fields = ['attendance_rate']
 
 
-class SessionDetailSerializer(serializers.ModelSerializer):
+class SessionDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     attendance_rate = serializers.ReadOnlyField()
     attendances = AttendanceSerializer(many=True, read_only=True)
     
@@ -114,9 +190,10 @@ class SessionDetailSerializer(serializers.ModelSerializer):
             'duration_minutes', 'documents', 'is_closed', 'attendance_rate',
             'attendances', 'created_at', 'updated_at'
         ]
+        expandable_fields = ['attendance_rate', 'attendances']
 
 
-class DeputyVoteSerializer(serializers.ModelSerializer):
+class DeputyVoteSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     deputy_name = serializers.CharField(source='deputy.full_name', read_only=True)
     
     class Meta:
@@ -124,7 +201,7 @@ class DeputyVoteSerializer(serializers.ModelSerializer):
         fields = ['id', 'deputy', 'deputy_name', 'choice', 'created_at']
 
 
-class VoteSerializer(serializers.ModelSerializer):
+class VoteSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     results = serializers.ReadOnlyField()
     deputy_votes = DeputyVoteSerializer(many=True, read_only=True)
     
@@ -134,6 +211,7 @@ class VoteSerializer(serializers.ModelSerializer):
             'id', 'session', 'title', 'description', 
             'results', 'deputy_votes', 'is_active', 'created_at'
         ]
+        expandable_fields = ['results', 'deputy_votes']
 
 
 class StatisticsSerializer(serializers.Serializer):
@@ -0,0 +1,310 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+
+from .models import User, Party, Deputy, Session, Attendance, AttendanceRollup, Vote, VoteTally, DeputyVote
+from . import authentication, cohesion, conditional, counters, events, response_cache, rollups, search, stats, thumbnails
+
+# Массовая запись посещаемости (bulk_create/update) не вызывает post_save,
+# поэтому отправитель сообщает о ней сам: deputy_ids и session_ids затронутых строк
+attendance_bulk_changed = Signal()
+# То же для голосов депутатов: vote_ids и deputy_ids затронутых строк
+deputy_votes_bulk_changed = Signal()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Отозвать токены при смене пароля и деактивации, иначе сбросить их кэш"""
+    if raw or created:
+        return
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        # Вход в систему: на проверку токена не влияет
+        return
+    # Пользователь из кэша токенов загружен без пароля: не заданный пароль не менялся
+    deferred = instance.get_deferred_fields()
+    password_changed = 'password' not in deferred and (
+        getattr(instance, '_loaded_password', instance.password) != instance.password
+    )
+    deactivated = getattr(instance, '_loaded_is_active', instance.is_active) and not instance.is_active
+    if password_changed or deactivated:
+        # Удаление токенов сбрасывает и их кэш (token_deleted)
+        Token.objects.filter(user=instance).delete()
+    else:
+        authentication.invalidate_user(instance.pk)
+    instance._loaded_password = instance.__dict__.get('password')
+    instance._loaded_is_active = instance.__dict__.get('is_active')
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    authentication.invalidate([instance.key])
+
+
+@receiver(post_save, sender=Deputy)
+def deputy_saved(sender, instance, created, raw=False, **kwargs):
+    """Сбросить кэш числа активных депутатов при смене is_active, перенести сводную посещаемость при смене партии"""
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_loaded_is_active', None)
+    if bool(previous) != bool(instance.is_active):
+        # Прошедшие заседания сохраняют знаменатель, действовавший до изменения
+        active_now = Deputy.objects.filter(is_active=True).count()
+        counters.snapshot_finished_sessions(active_now - 1 if instance.is_active else active_now + 1)
+        cache.delete(Deputy.ACTIVE_COUNT_CACHE_KEY)
+    instance._loaded_is_active = instance.is_active
+    # Сводная посещаемость партий ведется по текущей партии депутата
+    previous_party_id = instance.party_id if created else getattr(instance, '_loaded_party_id', instance.party_id)
+    if previous_party_id != instance.party_id:
+        rollups.recount_parties([previous_party_id, instance.party_id])
+        cohesion.invalidate_all()
+    instance._loaded_party_id = instance.party_id
+
+
+@receiver(post_delete, sender=Deputy)
+def deputy_deleted(sender, instance, **kwargs):
+    if instance.is_active:
+        counters.snapshot_finished_sessions(Deputy.objects.filter(is_active=True).count() + 1)
+    cache.delete(Deputy.ACTIVE_COUNT_CACHE_KEY)
+    # Отметки удалены каскадом и уже сняты с корзин, остались пустые строки
+    AttendanceRollup.objects.filter(dimension='deputy', key=str(instance.pk)).delete()
+
+
+@receiver(post_delete, sender=Party)
+def party_deleted(sender, instance, **kwargs):
+    # Депутаты удаленной партии уже остались без партии (SET_NULL)
+    rollups.recount_parties([instance.pk, None])
+    cohesion.invalidate_all()
+
+
+@receiver(post_save, sender=Session)
+def session_saved(sender, instance, created, raw=False, **kwargs):
+    """Пересчитать сводную посещаемость, если заседание перенесено или сменило тип"""
+    previous = None if created else getattr(instance, '_loaded_bucket', None)
+    if not raw and previous and previous[0] is not None:
+        old_date, old_type = previous
+        if old_type != instance.session_type or rollups.buckets(old_date) != rollups.buckets(instance.date):
+            for month in {rollups.buckets(old_date)['month'], rollups.buckets(instance.date)['month']}:
+                rollups.rebuild(month, month)
+    instance._loaded_bucket = (instance.date, instance.session_type)
+
+
+@receiver(post_save, sender=Deputy)
+def deputy_search_index_saved(sender, instance, raw=False, using='default', **kwargs):
+    """Обновить запись депутата в поисковом индексе"""
+    search.get_backend(using).index(instance)
+
+
+@receiver(post_delete, sender=Deputy)
+def deputy_search_index_deleted(sender, instance, using='default', **kwargs):
+    search.get_backend(using).remove(instance.pk)
+
+
+@receiver(post_save, sender=Attendance)
+def attendance_saved(sender, instance, created, raw=False, **kwargs):
+    """Обновить счетчики посещаемости депутата и сводную посещаемость после сохранения отметки"""
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_state', None)
+    if created:
+        counters.apply_attendance_delta(instance.deputy_id, present=int(instance.is_present), total=1)
+        rollups.apply_attendance_delta(instance, present=int(instance.is_present), total=1)
+    elif previous is None:
+        # Объект создан вручную с известным pk - исходное состояние неизвестно
+        counters.refresh_deputy_attendance([instance.deputy_id])
+        rollups.rebuild_sessions([instance.session_id])
+    else:
+        old_deputy_id, old_present = previous
+        old_session_id = getattr(instance, '_loaded_session_id', instance.session_id)
+        if old_deputy_id != instance.deputy_id:
+            counters.apply_attendance_delta(old_deputy_id, present=-int(bool(old_present)), total=-1)
+            counters.apply_attendance_delta(instance.deputy_id, present=int(instance.is_present), total=1)
+        elif bool(old_present) != bool(instance.is_present):
+            counters.apply_attendance_delta(instance.deputy_id, present=1 if instance.is_present else -1)
+        if old_deputy_id != instance.deputy_id or old_session_id != instance.session_id:
+            rollups.apply_attendance_delta(instance, present=-int(bool(old_present)), total=-1,
+                                           session_id=old_session_id, deputy_id=old_deputy_id)
+            rollups.apply_attendance_delta(instance, present=int(instance.is_present), total=1)
+        elif bool(old_present) != bool(instance.is_present):
+            rollups.apply_attendance_delta(instance, present=1 if instance.is_present else -1)
+    instance._loaded_state = (instance.deputy_id, instance.is_present)
+    instance._loaded_session_id = instance.session_id
+
+
+@receiver(post_delete, sender=Attendance)
+def attendance_deleted(sender, instance, **kwargs):
+    """Уменьшить счетчики посещаемости после удаления отметки"""
+    previous = getattr(instance, '_loaded_state', None)
+    deputy_id, is_present = previous or (instance.deputy_id, instance.is_present)
+    counters.apply_attendance_delta(deputy_id, present=-int(bool(is_present)), total=-1)
+    rollups.apply_attendance_delta(instance, present=-int(bool(is_present)), total=-1,
+                                   session_id=getattr(instance, '_loaded_session_id', None), deputy_id=deputy_id)
+
+
+@receiver(attendance_bulk_changed)
+def attendance_bulk_saved(sender, deputy_ids, session_ids, **kwargs):
+    """Пересчитать счетчики депутатов после массовой записи посещаемости"""
+    counters.refresh_deputy_attendance(deputy_ids)
+    rollups.refresh(session_ids, deputy_ids)
+    stats.invalidate_snapshot()
+
+
+@receiver(post_save, sender=Vote)
+def vote_saved(sender, instance, created, raw=False, **kwargs):
+    """Завести пустые итоги для нового голосования"""
+    if created and not raw:
+        VoteTally.objects.get_or_create(vote=instance)
+
+
+@receiver(post_save, sender=DeputyVote)
+def deputy_vote_saved(sender, instance, created, raw=False, **kwargs):
+    """Учесть новый или измененный голос в итогах голосования"""
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_state', None)
+    if created:
+        counters.apply_vote_delta(instance.vote_id, new_choice=instance.choice)
+    elif previous is None:
+        counters.refresh_vote_tallies([instance.vote_id])
+    else:
+        old_vote_id, old_choice = previous
+        if old_vote_id != instance.vote_id:
+            counters.apply_vote_delta(old_vote_id, old_choice=old_choice)
+            counters.apply_vote_delta(instance.vote_id, new_choice=instance.choice)
+            cohesion.invalidate_votes([old_vote_id])
+        else:
+            counters.apply_vote_delta(instance.vote_id, old_choice=old_choice, new_choice=instance.choice)
+    # Разбор завершенного голосования для аналитики партий устарел
+    cohesion.invalidate_votes([instance.vote_id])
+    instance._loaded_state = (instance.vote_id, instance.choice)
+
+
+@receiver(post_delete, sender=DeputyVote)
+def deputy_vote_deleted(sender, instance, **kwargs):
+    """Снять удаленный голос из итогов голосования"""
+    previous = getattr(instance, '_loaded_state', None)
+    vote_id, choice = previous or (instance.vote_id, instance.choice)
+    counters.apply_vote_delta(vote_id, old_choice=choice)
+    cohesion.invalidate_votes([vote_id])
+
+
+@receiver(deputy_votes_bulk_changed)
+def deputy_votes_bulk_saved(sender, vote_ids, deputy_ids, **kwargs):
+    """Пересчитать итоги голосований после массовой записи голосов"""
+    counters.refresh_vote_tallies(vote_ids)
+    cohesion.invalidate_votes(vote_ids)
+
+
+# Снимок /api/statistics/ зависит от партий, депутатов, заседаний и посещаемости
+for model in (Party, Deputy, Session, Attendance):
+    post_save.connect(stats.invalidate_snapshot, sender=model, dispatch_uid=f'stats-save-{model.__name__}')
+    post_delete.connect(stats.invalidate_snapshot, sender=model, dispatch_uid=f'stats-delete-{model.__name__}')
+
+# Кэшированные списки партий и депутатов (члены партий, посещаемость депутатов)
+for model in (Party, Deputy, Attendance):
+    post_save.connect(response_cache.invalidate, sender=model, dispatch_uid=f'responses-save-{model.__name__}')
+    post_delete.connect(response_cache.invalidate, sender=model, dispatch_uid=f'responses-delete-{model.__name__}')
+attendance_bulk_changed.connect(response_cache.invalidate, dispatch_uid='responses-bulk-Attendance')
+
+# Версии таблиц для ETag. Голос депутата меняет итоги голосования (VoteTally),
+# массовая запись посещаемости - еще и счетчики депутатов
+for model in (Party, Deputy, Session, Attendance, Vote, VoteTally, DeputyVote):
+    post_save.connect(conditional.changed, sender=model, dispatch_uid=f'versions-save-{model.__name__}')
+    post_delete.connect(conditional.changed, sender=model, dispatch_uid=f'versions-delete-{model.__name__}')
+
+
+@receiver(post_save, sender=DeputyVote)
+@receiver(post_delete, sender=DeputyVote)
+def deputy_vote_version(sender, **kwargs):
+    conditional.touch([VoteTally])
+
+
+@receiver(attendance_bulk_changed)
+def attendance_bulk_version(sender, **kwargs):
+    conditional.touch([Attendance, Deputy])
+
+
+@receiver(deputy_votes_bulk_changed)
+def deputy_votes_bulk_version(sender, **kwargs):
+    conditional.touch([DeputyVote, VoteTally])
+
+
+# Уменьшенные копии фотографий депутатов и логотипов партий
+for model in thumbnails.SOURCES:
+    post_save.connect(thumbnails.source_changed, sender=model, dispatch_uid=f'thumbnails-{model.__name__}')
+
+
+# --- События для подписчиков SSE (отправляются после фиксации транзакции) ---
+
+def _publish_tally(vote_id, session_id, deputy_id=None, choice=None):
+    def build():
+        tally = VoteTally.objects.filter(vote_id=vote_id).first()
+        return {
+            'type': 'vote',
+            'vote': vote_id,
+            'session': session_id,
+            'deputy': deputy_id,
+            'choice': choice,
+            'results': tally.as_dict() if tally else VoteTally(vote_id=vote_id).as_dict(),
+        }
+    events.publish([events.vote_channel(vote_id), events.session_channel(session_id)], build)
+
+
+def _publish_attendance(session_id, marks):
+    def build():
+        return {
+            'type': 'attendance',
+            'session': session_id,
+            'present_count': Attendance.objects.filter(session_id=session_id, is_present=True).count(),
+            'marks': marks() if callable(marks) else marks,
+        }
+    events.publish([events.session_channel(session_id)], build)
+
+
+# Заседание голосования читается, только если события кто-то слушает: без
+# подписчиков голос не должен стоить лишнего запроса
+
+@receiver(post_save, sender=DeputyVote)
+def deputy_vote_event(sender, instance, raw=False, **kwargs):
+    if not raw and events.listening():
+        _publish_tally(instance.vote_id, instance.vote.session_id, instance.deputy_id, instance.choice)
+
+
+@receiver(post_delete, sender=DeputyVote)
+def deputy_vote_deleted_event(sender, instance, **kwargs):
+    if not events.listening():
+        return
+    session_id = Vote.objects.filter(pk=instance.vote_id).values_list('session_id', flat=True).first()
+    if session_id is not None:
+        _publish_tally(instance.vote_id, session_id, instance.deputy_id)
+
+
+@receiver(deputy_votes_bulk_changed)
+def deputy_votes_bulk_event(sender, vote_ids, deputy_ids, **kwargs):
+    if not events.listening():
+        return
+    for vote_id, session_id in Vote.objects.filter(pk__in=vote_ids).values_list('pk', 'session_id'):
+        _publish_tally(vote_id, session_id)
+
+
+@receiver(post_save, sender=Attendance)
+def attendance_event(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _publish_attendance(instance.session_id, [[instance.deputy_id, instance.is_present, instance.absence_reason]])
+
+
+@receiver(post_delete, sender=Attendance)
+def attendance_deleted_event(sender, instance, **kwargs):
+    _publish_attendance(instance.session_id, [[instance.deputy_id, None, '']])
+
+
+@receiver(attendance_bulk_changed)
+def attendance_bulk_event(sender, deputy_ids, session_ids, **kwargs):
+    deputy_ids = list(deputy_ids)
+    for session_id in session_ids:
+        _publish_attendance(session_id, lambda session_id=session_id: [
+            list(row) for row in Attendance.objects.filter(
+                session_id=session_id, deputy_id__in=deputy_ids
+            ).values_list('deputy_id', 'is_present', 'absence_reason')
+        ])
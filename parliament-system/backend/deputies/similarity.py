@@ -0,0 +1,148 @@
+"""
+Сходство голосований депутатов.
+
+Поименные голоса раскладываются в матрицу депутаты × голосования. Совпадения
+для всех пар считаются матричным умножением по каждому варианту:
+same = Σ B_c·B_cᵀ, overlap = P·Pᵀ, где B_c - индикатор выбора c, P - индикатор
+участия. Согласие пары - same / overlap по голосованиям, в которых участвовали оба.
+
+Суммы same и overlap складываются по месяцам. Отрезок периода внутри месяца
+кэшируется под своими границами вместе с отпечатком своих голосований (их id и
+последнее изменение итогов VoteTally, которое сдвигает каждый новый голос).
+При чтении отпечаток сверяется: новый голос пересчитывает только свой месяц и
+заменяет его запись, а остальные берутся из кэша. Записи живут
+SIMILARITY_CACHE_TIMEOUT секунд: отрезки произвольных периодов не копятся в кэше.
+"""
+
+import hashlib
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+from .cohesion import CHOICES, get_cache
+from .models import DeputyVote, Vote
+from .rollups import buckets, day_start, next_month
+
+MIN_OVERLAP = 10
+CACHE_TIMEOUT = getattr(settings, 'SIMILARITY_CACHE_TIMEOUT', 24 * 3600)
+
+
+def _chunks(date_from, date_to):
+    """Отрезки [начало, конец) периода по границам месяцев"""
+    chunks = []
+    start = date_from
+    end = date_to + timedelta(days=1)
+    while start < end:
+        chunk_end = min(next_month(start), end)
+        chunks.append((start, chunk_end))
+        start = chunk_end
+    return chunks
+
+
+def _chunk_key(chunk):
+    return f'similarity:{chunk[0]}:{chunk[1]}'
+
+
+def _fingerprint(votes):
+    return hashlib.sha1(repr(sorted(votes)).encode('utf-8')).hexdigest()
+
+
+def pair_counts(rows):
+    """Совпадения и общие голосования для всех пар по строкам (депутат, голосование, вариант)"""
+    rows = np.asarray(rows, dtype=np.int64).reshape(-1, 3)
+    deputies, deputy_index = np.unique(rows[:, 0], return_inverse=True)
+    _, vote_index = np.unique(rows[:, 1], return_inverse=True)
+    roll_call = np.zeros((len(deputies), vote_index.max(initial=-1) + 1), dtype=np.int8)
+    roll_call[deputy_index, vote_index] = rows[:, 2] + 1
+
+    # float32 точно хранит целые до 2^24 и умножается через BLAS
+    same = np.zeros((len(deputies), len(deputies)), dtype=np.float32)
+    for code in range(1, len(CHOICES) + 1):
+        chosen = (roll_call == code).astype(np.float32)
+        same += chosen @ chosen.T
+    voted = (roll_call > 0).astype(np.float32)
+    overlap = voted @ voted.T
+    return deputies, np.rint(same).astype(np.int32), np.rint(overlap).astype(np.int32)
+
+
+def _load(chunks, votes):
+    """Посчитать отрезки одним запросом голосов: {отрезок: (депутаты, same, overlap)}"""
+    condition = Q()
+    for start, end in chunks:
+        condition |= Q(session__date__gte=day_start(start), session__date__lt=day_start(end))
+    chunk_of = {vote_id: chunk for chunk in chunks for vote_id in votes[chunk]}
+    codes = {choice: index for index, choice in enumerate(CHOICES)}
+    rows = {chunk: [] for chunk in chunks}
+    # Голоса выбираются по индексу (vote, deputy), а не соединением с заседаниями
+    ballots = DeputyVote.objects.filter(vote__in=Vote.objects.filter(condition).values('pk'))
+    for deputy_id, vote_id, choice in ballots.order_by().values_list('deputy_id', 'vote_id', 'choice'):
+        # Голосования, появившиеся после выборки отпечатков, попадут в следующий пересчет
+        if vote_id in chunk_of and choice in codes:
+            rows[chunk_of[vote_id]].append((deputy_id, vote_id, codes[choice]))
+    return {chunk: pair_counts(chunk_rows) for chunk, chunk_rows in rows.items()}
+
+
+def pairwise(date_from, date_to):
+    """Суммы same и overlap за период: (id депутатов, same, overlap)"""
+    chunks = _chunks(date_from, date_to)
+    votes = {chunk: [] for chunk in chunks}
+    for vote_id, moment, changed in Vote.objects.filter(
+        session__date__gte=day_start(date_from), session__date__lt=day_start(date_to + timedelta(days=1))
+    ).order_by().values_list('pk', 'session__date', 'tally__updated_at'):
+        day = buckets(moment)['day']
+        for chunk in chunks:
+            if chunk[0] <= day < chunk[1]:
+                votes[chunk].append((vote_id, changed))
+                break
+
+    cache = get_cache()
+    keys = {chunk: _chunk_key(chunk) for chunk in chunks if votes[chunk]}
+    fingerprints = {chunk: _fingerprint(votes[chunk]) for chunk in keys}
+    cached = cache.get_many(keys.values())
+    parts = {}
+    for chunk, key in keys.items():
+        # Запись прежнего состояния отрезка не подходит: он пересчитывается и перезаписывается
+        if key in cached and cached[key][0] == fingerprints[chunk]:
+            parts[chunk] = cached[key][1]
+    missing = [chunk for chunk in keys if chunk not in parts]
+    if missing:
+        computed = _load(missing, {chunk: [vote_id for vote_id, _ in votes[chunk]] for chunk in missing})
+        cache.set_many({keys[chunk]: (fingerprints[chunk], computed[chunk]) for chunk in missing}, CACHE_TIMEOUT)
+        parts.update(computed)
+
+    parts = list(parts.values())
+    if not parts:
+        empty = np.zeros((0, 0), dtype=np.int32)
+        return np.empty(0, dtype=np.int64), empty, empty
+    deputies = np.unique(np.concatenate([ids for ids, _, _ in parts]))
+    same = np.zeros((len(deputies), len(deputies)), dtype=np.int32)
+    overlap = np.zeros_like(same)
+    for ids, part_same, part_overlap in parts:
+        index = np.searchsorted(deputies, ids)
+        same[np.ix_(index, index)] += part_same
+        overlap[np.ix_(index, index)] += part_overlap
+    return deputies, same, overlap
+
+
+def agreement_matrix(date_from, date_to, min_overlap=MIN_OVERLAP):
+    """Доля совпавших голосов для всех пар (NaN, если общих голосований меньше min_overlap)"""
+    deputies, same, overlap = pairwise(date_from, date_to)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        agreement = np.where(overlap >= max(min_overlap, 1), same / overlap, np.nan)
+    return deputies, agreement, overlap
+
+
+def most_similar(deputy_id, date_from, date_to, limit=10, min_overlap=MIN_OVERLAP):
+    """Депутаты, чаще всего голосующие так же, как deputy_id: [(id, согласие, общих голосований)]"""
+    deputies, agreement, overlap = agreement_matrix(date_from, date_to, min_overlap)
+    position = np.searchsorted(deputies, deputy_id)
+    if position >= len(deputies) or deputies[position] != deputy_id:
+        return []
+    row = agreement[position].copy()
+    row[position] = np.nan
+    candidates = np.flatnonzero(~np.isnan(row))
+    # По убыванию согласия, при равенстве - по числу общих голосований
+    ranking = candidates[np.lexsort((-overlap[position, candidates], -row[candidates]))][:limit]
+    return [(int(deputies[i]), float(row[i]), int(overlap[position, i])) for i in ranking]
@@ -0,0 +1,176 @@
+"""
+Снимок общей статистики для /api/statistics/.
+
+Снимок считается один раз и отдается из кэша. При изменении данных поколение снимка
+увеличивается, а пересчет выполняет только один запрос во всех процессах (право
+на пересчет - строка ComputeLock): остальные получают предыдущий снимок или ждут,
+пока он будет готов.
+
+Снимок и поколение хранятся в кэше STATS_CACHE_ALIAS (по умолчанию - кэш ответов
+API, общий для воркеров при CACHE_BACKEND=file), иначе сброс в одном воркере не
+виден остальным.
+"""
+
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import routers
+from .models import Party, Deputy, Session, AttendanceRollup, ComputeLock
+from .serializers import SessionListSerializer, DeputyListSerializer
+
+SNAPSHOT_KEY = 'statistics:snapshot'
+STALE_KEY = 'statistics:snapshot:stale'
+GENERATION_KEY = 'statistics:generation'
+LOCK_NAME = 'statistics'
+
+SNAPSHOT_TIMEOUT = 300
+LOCK_TIMEOUT = 30
+WAIT_TIMEOUT = 5
+WAIT_INTERVAL = 0.05
+
+
+def get_cache():
+    alias = getattr(settings, 'STATS_CACHE_ALIAS', 'responses')
+    return caches[alias if alias in settings.CACHES else 'default']
+
+
+def compute_snapshot():
+    """Посчитать статистику по базе"""
+    now = timezone.now()
+
+    deputies = Deputy.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(is_active=True)),
+    )
+    sessions = Session.objects.aggregate(
+        total=Count('id'),
+        upcoming=Count('id', filter=Q(date__gt=now)),
+    )
+
+    # Средняя посещаемость - доля отметок «присутствовал» по месячным корзинам типов заседаний
+    attendance = AttendanceRollup.objects.filter(dimension='session_type', period='month').aggregate(
+        present=Coalesce(Sum('present'), 0),
+        total=Coalesce(Sum('total'), 0),
+    )
+    avg_attendance = 0
+    if attendance['total']:
+        avg_attendance = attendance['present'] * 100.0 / attendance['total']
+
+    recent_sessions = Session.objects.with_attendance().filter(
+        date__lte=now
+    ).order_by('-date')[:5]
+
+    # Топ депутатов по посещаемости - по денормализованным счетчикам
+    top_attendees = Deputy.objects.filter(
+        is_active=True, attendance_total__gt=0
+    ).select_related('party').order_by('-attendance_present')[:10]
+
+    return {
+        'total_deputies': deputies['total'],
+        'active_deputies': deputies['active'],
+        'total_parties': Party.objects.count(),
+        'total_sessions': sessions['total'],
+        'average_attendance': round(avg_attendance, 2),
+        'upcoming_sessions': sessions['upcoming'],
+        'recent_sessions': list(SessionListSerializer(recent_sessions, many=True).data),
+        'top_attendees': list(DeputyListSerializer(top_attendees, many=True).data),
+    }
+
+
+def _acquire(owner):
+    """Взять право на пересчет снимка.
+
+    Условный UPDATE строки ComputeLock атомарен в любой базе и виден всем
+    процессам и машинам, в отличие от add файлового кэша (проверка и запись
+    там - два шага). Право истекает через LOCK_TIMEOUT, если владелец упал.
+    """
+    now = timezone.now()
+    claim = {'owner': owner, 'expires_at': now + timedelta(seconds=LOCK_TIMEOUT)}
+    free = ComputeLock.objects.filter(name=LOCK_NAME).filter(Q(expires_at__isnull=True) | Q(expires_at__lt=now))
+    try:
+        if free.update(**claim):
+            return True
+        # Строку создает миграция 0011; ее нет, только если таблицу очищали
+        ComputeLock.objects.bulk_create([ComputeLock(name=LOCK_NAME)], ignore_conflicts=True)
+        return bool(free.update(**claim))
+    except DatabaseError:
+        # База занята другой записью: пересчитывать будет тот, кто ее держит или придет позже
+        return False
+
+
+def _release(owner):
+    try:
+        ComputeLock.objects.filter(name=LOCK_NAME, owner=owner).update(expires_at=None)
+    except DatabaseError:
+        # Право истечет само через LOCK_TIMEOUT
+        pass
+
+
+def _store(data, generation):
+    cache = get_cache()
+    cache.set(SNAPSHOT_KEY, (generation, data), SNAPSHOT_TIMEOUT)
+    cache.set(STALE_KEY, data, None)
+
+
+def get_snapshot():
+    """Получить снимок статистики, пересчитав его не более чем одним процессом"""
+    cache = get_cache()
+    cached = cache.get_many([SNAPSHOT_KEY, GENERATION_KEY])
+    generation = cached.get(GENERATION_KEY)
+    if generation is None:
+        # Начальное поколение - время, чтобы после вытеснения ключа не совпасть со снимком
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(GENERATION_KEY)
+    fresh = cached.get(SNAPSHOT_KEY)
+    if fresh is not None and fresh[0] == generation:
+        return fresh[1]
+
+    owner = uuid.uuid4().hex
+    if _acquire(owner):
+        try:
+            with routers.filling(cache):
+                data = compute_snapshot()
+            _store(data, generation)
+            return data
+        finally:
+            _release(owner)
+
+    # Пересчет уже идет - отдаем предыдущий снимок, если он есть
+    stale = cache.get(STALE_KEY)
+    if stale is not None:
+        return stale
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        fresh = cache.get(SNAPSHOT_KEY)
+        if fresh is not None:
+            return fresh[1]
+    return compute_snapshot()
+
+
+def _bump():
+    cache = get_cache()
+    routers.mark_written(cache)
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def invalidate_snapshot(**kwargs):
+    """Сделать текущий снимок устаревшим (используется как обработчик сигналов).
+
+    Поколение увеличивается сразу и еще раз после фиксации транзакции, чтобы
+    снимок, посчитанный параллельным запросом по незафиксированным данным, не остался в кэше.
+    """
+    _bump()
+    transaction.on_commit(_bump)
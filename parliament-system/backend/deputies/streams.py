@@ -0,0 +1,142 @@
+"""
+Потоки Server-Sent Events для наблюдения за заседанием и голосованием.
+
+Работают только под ASGI (uvicorn deputies_project.asgi:application): каждое
+подключение - это ожидание на очереди asyncio без обращений к базе. База
+читается один раз при подключении (начальный снимок) и при пересинхронизации
+медленного клиента; дальше клиент получает только изменения. Если при
+пересинхронизации объекта уже не видно (голосование снято, заседание закрыто
+для гостя), поток завершается событием closed.
+
+EventSource не умеет передавать заголовки, а токен API в адресе попал бы в
+журналы прокси и историю браузера. Поэтому браузер сначала получает билет
+POST /api/stream/ticket/ (с обычной авторизацией) и подключается с ?ticket=.
+Билет подписан SECRET_KEY и действует STREAM_TICKET_MAX_AGE секунд.
+"""
+
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import exceptions
+
+from .authentication import CachedTokenAuthentication
+from .events import RESYNC, broker, encode, get_relay, session_channel, vote_channel
+from .models import User, Session, Vote
+
+HEARTBEAT_INTERVAL = getattr(settings, 'EVENTS_HEARTBEAT_INTERVAL', 15)
+MAX_LIFETIME = getattr(settings, 'EVENTS_MAX_LIFETIME', 3600)
+TICKET_MAX_AGE = getattr(settings, 'STREAM_TICKET_MAX_AGE', 30)
+TICKET_SALT = 'deputies.streams.ticket'
+
+
+def issue_ticket(user):
+    """Короткоживущий подписанный билет на подключение к потоку"""
+    return signing.dumps(user.pk, salt=TICKET_SALT)
+
+
+def _ticket_user_type(ticket):
+    try:
+        user_id = signing.loads(ticket, salt=TICKET_SALT, max_age=TICKET_MAX_AGE)
+    except signing.BadSignature:
+        # В том числе истекший билет (SignatureExpired)
+        return None
+    return User.objects.filter(pk=user_id, is_active=True).values_list('user_type', flat=True).first()
+
+
+def _user_type(request):
+    """Тип пользователя: билет ?ticket=, токен из заголовка Authorization или сессия"""
+    ticket = request.GET.get('ticket')
+    if ticket:
+        return _ticket_user_type(ticket) or 'guest'
+    try:
+        authenticated = CachedTokenAuthentication().authenticate(request)
+    except exceptions.AuthenticationFailed:
+        return 'guest'
+    user = authenticated[0] if authenticated else request.user
+    if user is None or not user.is_authenticated or not user.is_active:
+        return 'guest'
+    return getattr(user, 'user_type', 'guest')
+
+
+def _session_snapshot(pk, user_type):
+    sessions = Session.objects.with_attendance().filter(pk=pk)
+    if user_type == 'guest':
+        sessions = sessions.filter(is_closed=False)
+    session = sessions.first()
+    if session is None:
+        return None
+    votes = Vote.objects.filter(session=session, is_active=True).select_related('tally')
+    return {
+        'type': 'snapshot',
+        'session': session.pk,
+        'present_count': session.present_count,
+        'attendance_rate': session.attendance_rate,
+        'votes': {vote.pk: vote.results for vote in votes},
+    }
+
+
+def _vote_snapshot(pk, user_type):
+    votes = Vote.objects.filter(pk=pk, is_active=True).select_related('tally', 'session')
+    if user_type == 'guest':
+        votes = votes.filter(session__is_closed=False)
+    vote = votes.first()
+    if vote is None:
+        return None
+    return {'type': 'snapshot', 'vote': vote.pk, 'session': vote.session_id, 'results': vote.results}
+
+
+def _stream(channels, snapshot, resync):
+    get_relay()
+    subscription = broker.subscribe(*channels)
+
+    async def frames():
+        deadline = time.monotonic() + MAX_LIFETIME
+        try:
+            yield b'retry: 3000\n\n' + encode(snapshot, 0)
+            while time.monotonic() < deadline:
+                try:
+                    frame = await subscription.get(HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield b': ping\n\n'
+                    continue
+                if frame is RESYNC:
+                    state = await sync_to_async(resync)()
+                    if state is None:
+                        # Голосование снято или заседание закрыто: показывать больше нечего
+                        yield encode({'type': 'closed'}, 0)
+                        return
+                    frame = encode(state, 0)
+                yield frame
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(frames(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _not_found():
+    return JsonResponse({'detail': 'Не найдено.'}, status=404)
+
+
+async def session_stream(request, pk):
+    """Поток изменений заседания: регистрация депутатов и итоги его голосований"""
+    user_type = await sync_to_async(_user_type)(request)
+    snapshot = await sync_to_async(_session_snapshot)(pk, user_type)
+    if snapshot is None:
+        return _not_found()
+    return _stream([session_channel(pk)], snapshot, lambda: _session_snapshot(pk, user_type))
+
+
+async def vote_stream(request, pk):
+    """Поток изменений итогов голосования"""
+    user_type = await sync_to_async(_user_type)(request)
+    snapshot = await sync_to_async(_vote_snapshot)(pk, user_type)
+    if snapshot is None:
+        return _not_found()
+    return _stream([vote_channel(pk)], snapshot, lambda: _vote_snapshot(pk, user_type))
@@ -0,0 +1,186 @@
+"""
+Синтетический парламент для нагрузочных проверок и бенчмарков.
+
+Данные воспроизводимы (random.Random с фиксированным seed) и пишутся пачками
+bulk_create, поэтому сигналы не срабатывают: счетчики посещаемости, итоги
+голосований, снимки заседаний, сводная посещаемость и поисковый индекс
+пересчитываются в конце.
+"""
+
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+
+from . import cohesion, conditional, counters, response_cache, rollups, search, stats
+from .models import Party, Deputy, Session, Attendance, Vote, VoteTally, DeputyVote
+
+LAST_NAMES = [
+    'Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов',
+    'Новиков', 'Федоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семенов', 'Егоров',
+    'Павлов', 'Козлов', 'Степанов', 'Николаев', 'Орлов', 'Андреев', 'Макаров', 'Никитин',
+    'Захаров', 'Зайцев', 'Соловьев', 'Борисов', 'Яковлев', 'Григорьев', 'Романов', 'Воробьев',
+]
+FIRST_NAMES = [
+    'Александр', 'Сергей', 'Дмитрий', 'Андрей', 'Алексей', 'Максим', 'Евгений', 'Иван',
+    'Михаил', 'Николай', 'Владимир', 'Олег', 'Анна', 'Мария', 'Елена', 'Ольга', 'Наталья',
+    'Татьяна', 'Ирина', 'Светлана',
+]
+MIDDLE_NAMES = [
+    'Александрович', 'Сергеевич', 'Дмитриевич', 'Андреевич', 'Иванович', 'Петрович',
+    'Владимирович', 'Николаевич', 'Михайлович', 'Олегович',
+]
+REGIONS = [
+    'Московский', 'Санкт-Петербургский', 'Новосибирский', 'Екатеринбургский', 'Казанский',
+    'Нижегородский', 'Челябинский', 'Самарский', 'Омский', 'Ростовский', 'Уфимский', 'Красноярский',
+]
+PARTY_NAMES = [
+    ('Партия Прогресса', 'ПП'), ('Народный союз', 'НС'), ('Гражданская платформа', 'ГП'),
+    ('Зеленый путь', 'ЗП'), ('Партия Труда', 'ПТ'), ('Движение Регионов', 'ДР'),
+    ('Либеральный выбор', 'ЛВ'), ('Союз Промышленников', 'СП'),
+]
+SESSION_TYPES = ['plenary'] * 6 + ['committee'] * 3 + ['working_group', 'extraordinary']
+CHOICES = ['for', 'against', 'abstain']
+
+
+def feminine(name):
+    return name + 'а' if name.endswith(('ов', 'ев', 'ин')) else name
+
+
+def make_deputy(rng, index, **fields):
+    """Депутат со случайным ФИО и округом (без сохранения)"""
+    female = rng.random() < 0.3
+    last_name = rng.choice(LAST_NAMES)
+    middle_name = rng.choice(MIDDLE_NAMES)
+    return Deputy(
+        first_name=rng.choice(FIRST_NAMES[12:] if female else FIRST_NAMES[:12]),
+        last_name=feminine(last_name) if female else last_name,
+        middle_name=middle_name[:-2] + 'на' if female else middle_name,
+        election_date=date(2021, 9, 19),
+        district=f'{rng.choice(REGIONS)} одномандатный округ №{index % 225 + 1}',
+        **fields
+    )
+
+
+def _sitting_days(years, per_week, today):
+    """Даты заседаний за последние years лет: per_week рабочих дней в неделю"""
+    start = today - timedelta(days=round(365 * years))
+    monday = start - timedelta(days=start.weekday())
+    days = []
+    while monday <= today:
+        days.extend(monday + timedelta(days=offset) for offset in range(min(per_week, 5)))
+        monday += timedelta(weeks=1)
+    return [day for day in days if start <= day <= today]
+
+
+def generate_parliament(rng, parties=8, deputies=450, years=2, sessions_per_week=2,
+                        votes_per_session=3, batch_size=5000, log=None):
+    """Создать парламент и вернуть {модель: число созданных строк}.
+
+    Посещаемость и голоса заполняются полностью: каждый депутат отмечен на каждом
+    заседании и голосует в каждом голосовании (отсутствующие не голосуют).
+    """
+    log = log or (lambda message: None)
+    created = {}
+
+    party_rows = Party.objects.bulk_create([
+        Party(
+            name=PARTY_NAMES[i % len(PARTY_NAMES)][0] + (f' {i // len(PARTY_NAMES) + 1}' if i >= len(PARTY_NAMES) else ''),
+            short_name=PARTY_NAMES[i % len(PARTY_NAMES)][1],
+            color='#%06x' % rng.randrange(0x1000000),
+            founded_date=date(rng.randint(1990, 2015), rng.randint(1, 12), 1),
+        )
+        for i in range(parties)
+    ])
+    created['parties'] = len(party_rows)
+    # Крупные партии получают больше мест
+    weights = [1 / (rank + 1) for rank in range(len(party_rows))]
+    deputy_rows = Deputy.objects.bulk_create(
+        [make_deputy(rng, i, party=rng.choices(party_rows, weights)[0]) for i in range(deputies)],
+        batch_size=batch_size,
+    )
+    created['deputies'] = len(deputy_rows)
+    log(f'Партий: {len(party_rows)}, депутатов: {len(deputy_rows)}')
+
+    # Личная дисциплина депутата и партийная линия голосования
+    discipline = {deputy.pk: rng.uniform(0.7, 0.99) for deputy in deputy_rows}
+    loyalty = {deputy.pk: rng.uniform(0.6, 0.95) for deputy in deputy_rows}
+
+    now = timezone.now()
+    tz = timezone.get_current_timezone()
+    session_rows = Session.objects.bulk_create([
+        Session(
+            title=f'Заседание №{number}',
+            session_type=rng.choice(SESSION_TYPES),
+            date=timezone.make_aware(datetime.combine(day, time(rng.choice([10, 12, 15]))), tz),
+            agenda='Рассмотрение законопроектов',
+            location='Зал пленарных заседаний',
+            duration_minutes=rng.choice([60, 90, 120, 180]),
+            is_closed=rng.random() < 0.1,
+        )
+        for number, day in enumerate(_sitting_days(years, sessions_per_week, now.date()), start=1)
+    ], batch_size=batch_size)
+    created['sessions'] = len(session_rows)
+
+    attendance_rows = 0
+    vote_rows = 0
+    deputy_vote_rows = 0
+    attendances, deputy_votes = [], []
+    # Открытыми остаются голосования последних двух недель
+    recent = now - timedelta(days=14)
+    for session in session_rows:
+        present = set()
+        for deputy in deputy_rows:
+            is_present = rng.random() < discipline[deputy.pk]
+            if is_present:
+                present.add(deputy.pk)
+            attendances.append(Attendance(
+                deputy_id=deputy.pk, session_id=session.pk, is_present=is_present,
+                absence_reason='' if is_present else rng.choice(['Болезнь', 'Командировка', 'Без причины']),
+            ))
+        votes = Vote.objects.bulk_create([
+            Vote(session=session, title=f'Вопрос {i + 1} заседания №{session.pk}', description='-',
+                 is_active=session.date >= recent)
+            for i in range(votes_per_session)
+        ])
+        vote_rows += len(votes)
+        for vote in votes:
+            line = {party.pk: rng.choice(CHOICES) for party in party_rows}
+            for deputy in deputy_rows:
+                if deputy.pk not in present:
+                    continue
+                choice = line[deputy.party_id] if rng.random() < loyalty[deputy.pk] else rng.choice(CHOICES)
+                deputy_votes.append(DeputyVote(vote_id=vote.pk, deputy_id=deputy.pk, choice=choice))
+        if len(attendances) >= batch_size:
+            attendance_rows += len(Attendance.objects.bulk_create(attendances, batch_size=batch_size))
+            attendances = []
+        if len(deputy_votes) >= batch_size:
+            deputy_vote_rows += len(DeputyVote.objects.bulk_create(deputy_votes, batch_size=batch_size))
+            deputy_votes = []
+    attendance_rows += len(Attendance.objects.bulk_create(attendances, batch_size=batch_size))
+    deputy_vote_rows += len(DeputyVote.objects.bulk_create(deputy_votes, batch_size=batch_size))
+    created.update(votes=vote_rows, attendances=attendance_rows, deputy_votes=deputy_vote_rows)
+    log(f'Заседаний: {len(session_rows)}, отметок: {attendance_rows}, '
+        f'голосований: {vote_rows}, голосов: {deputy_vote_rows}')
+
+    refresh_derived()
+    return created
+
+
+def refresh_derived():
+    """Пересчитать все, что обычно поддерживают сигналы"""
+    counters.refresh_deputy_attendance()
+    counters.refresh_vote_tallies()
+    counters.snapshot_finished_sessions()
+    rollups.rebuild()
+    search.get_backend().rebuild()
+    stats.invalidate_snapshot()
+    cohesion.invalidate_all()
+    for model in (Party, Deputy, Attendance):
+        response_cache.invalidate(sender=model)
+    conditional.touch([Party, Deputy, Session, Attendance, Vote, VoteTally, DeputyVote])
+
+
+def percentile(values, fraction):
+    """Значение values на доле fraction (0.95 - p95) для отчетов бенчмарков"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
@@ -1,3 +1,1048 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import random
+import re
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from datetime import date, time as dt_time, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import (
+    authentication, counters, events, export, importer, ingest, response_cache, rollups, routers, search, stats,
+    streams, thumbnails,
+)
+from .middleware import QueryRecorder
+from .models import User, Party, Deputy, Session, Attendance, AttendanceRollup, Vote, DeputyVote
+from .streams import _session_snapshot, _user_type, _vote_snapshot
+from .synthetic import generate_parliament, refresh_derived
+from PIL import Image
+
+
+def build_parliament(rows):
+    """Тестовый парламент: rows депутатов, заседаний и голосований.
+
+    Все депутаты отмечены на первом заседании и голосуют в первом голосовании,
+    первый депутат - на всех заседаниях и во всех голосованиях, чтобы вложенные
+    коллекции и истории росли вместе с rows.
+    """
+    parties = Party.objects.bulk_create([
+        Party(name=f'Партия {i}', short_name=f'П{i}', color='#123456') for i in range(5)
+    ])
+    users = User.objects.bulk_create([
+        User(username=f'deputy-{i}', user_type='deputy') for i in range(rows)
+    ])
+    deputies = Deputy.objects.bulk_create([
+        Deputy(user=user, first_name='Иван', last_name=f'Иванов {i}', party=parties[i % len(parties)],
+               election_date=date(2021, 9, 19), district=f'Округ {i % 50}')
+        for i, user in enumerate(users)
+    ])
+    now = timezone.now()
+    sessions = Session.objects.bulk_create([
+        Session(title=f'Заседание {i}', date=now - timedelta(days=i), agenda='-', location='Зал')
+        for i in range(rows)
+    ])
+    Attendance.objects.bulk_create(
+        [Attendance(deputy=deputy, session=sessions[0], is_present=True) for deputy in deputies]
+        + [Attendance(deputy=deputies[0], session=session, is_present=True) for session in sessions[1:]]
+    )
+    votes = Vote.objects.bulk_create([
+        Vote(session=sessions[0], title=f'Вопрос {i}', description='-') for i in range(rows)
+    ])
+    DeputyVote.objects.bulk_create(
+        [DeputyVote(vote=votes[0], deputy=deputy, choice='for') for deputy in deputies]
+        + [DeputyVote(vote=vote, deputy=deputies[0], choice='against') for vote in votes[1:]]
+    )
+    counters.refresh_deputy_attendance()
+    counters.refresh_vote_tallies()
+    rollups.rebuild()
+    search.get_backend().rebuild()
+    return parties, deputies, sessions, votes
+
+
+class QueryBudgetMixin:
+    """Число запросов на каждый маршрут API не должно зависеть от объема данных"""
+
+    rows = 10
+
+    # (метод, адрес, авторизация) -> максимум запросов
+    BUDGETS = {
+        ('get', '/api/', None): 0,
+        ('get', '/api/parties/', None): 3,
+        ('get', '/api/parties/?expand=members_count', None): 3,
+        ('get', '/api/parties/{party}/', None): 2,
+        ('get', '/api/parties/{party}/members/', None): 3,
+        ('get', '/api/parties/{party}/cohesion/', None): 5,
+        ('get', '/api/deputies/', None): 3,
+        ('get', '/api/deputies/?expand=attendance_rate', None): 3,
+        ('get', '/api/deputies/?search=Иванов', None): 4,
+        ('get', '/api/deputies/?pagination=cursor', None): 2,
+        ('get', '/api/deputies/{deputy}/', None): 3,
+        ('get', '/api/deputies/{deputy}/attendance/', None): 3,
+        ('get', '/api/deputies/{deputy}/votes/', None): 3,
+        ('get', '/api/deputies/{deputy}/similar/', None): 5,
+        ('get', '/api/deputies/similarity/', None): 4,
+        ('get', '/api/sessions/', None): 3,
+        ('get', '/api/sessions/?expand=attendance_rate', None): 4,
+        ('get', '/api/sessions/', 'admin'): 4,
+        ('get', '/api/sessions/{session}/', None): 4,
+        ('get', '/api/votes/', None): 3,
+        ('get', '/api/votes/?expand=results,deputy_votes', None): 4,
+        ('get', '/api/votes/{vote}/', None): 3,
+        # Пересчет снимка: еще два запроса - взять и отпустить право на пересчет (ComputeLock)
+        ('get', '/api/statistics/', None): 8,
+        ('get', '/api/statistics/trends/', None): 2,
+        ('get', '/api/statistics/trends/?dimension=deputy&key={deputy}&period=day', None): 2,
+        ('get', '/api/cache/stats/', 'admin'): 1,
+        ('post', '/api/votes/{vote}/cast_vote/', 'deputy'): 14,
+        ('post', '/api/sessions/{session}/mark_attendance/', 'admin'): 15,
+        ('post', '/api/sessions/{session}/mark_attendance_bulk/', 'admin'): 14,
+        ('post', '/api/auth/register/', None): 6,
+        ('post', '/api/auth/login/', None): 10,
+        # Запрос на запись сверяет токен с базой, минуя кэш
+        ('post', '/api/auth/logout/', 'admin'): 2,
+    }
+
+    # Списки админки (с сортировкой по вычисляемым колонкам) -> максимум запросов
+    ADMIN_BUDGETS = {
+        '/admin/deputies/user/': 5,
+        '/admin/deputies/party/': 5,
+        '/admin/deputies/party/?o=4': 5,
+        '/admin/deputies/deputy/': 6,
+        '/admin/deputies/deputy/?o=5': 6,
+        # date_hierarchy и число активных депутатов для знаменателя явки
+        '/admin/deputies/session/': 8,
+        '/admin/deputies/session/?o=6': 8,
+        '/admin/deputies/attendance/': 5,
+        '/admin/deputies/vote/': 5,
+        '/admin/deputies/vote/?o=4': 5,
+        '/admin/deputies/deputyvote/': 5,
+    }
+
+    PAYLOADS = {
+        '/api/votes/{vote}/cast_vote/': lambda test: {'choice': 'abstain'},
+        '/api/sessions/{session}/mark_attendance/': lambda test: {'deputy_id': test.deputy.pk, 'is_present': False},
+        # Размер пачки постоянный: проверяется зависимость от объема таблиц, а не от тела запроса
+        '/api/sessions/{session}/mark_attendance_bulk/': lambda test: {'records': [
+            {'deputy_id': deputy.pk, 'is_present': False} for deputy in test.deputies[:10]
+        ]},
+        '/api/auth/register/': lambda test: {'username': 'new-guest', 'password': 'secret-password'},
+        '/api/auth/login/': lambda test: {'username': 'admin', 'password': 'secret-password'},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        parties, deputies, sessions, votes = build_parliament(cls.rows)
+        cls.party, cls.deputy, cls.session, cls.vote = parties[0], deputies[0], sessions[0], votes[0]
+        cls.deputies = deputies
+        cls.admin = User.objects.create_user('admin', password='secret-password', user_type='admin')
+        cls.tokens = {
+            'admin': Token.objects.create(user=cls.admin).key,
+            'deputy': Token.objects.create(user=cls.deputy.user).key,
+        }
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def request(self, method, url, auth):
+        client = APIClient()
+        if auth:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.tokens[auth]}')
+        payload = self.PAYLOADS.get(url)
+        path = url.format(party=self.party.pk, deputy=self.deputy.pk, session=self.session.pk, vote=self.vote.pk)
+        with CaptureQueriesContext(connection) as queries:
+            if payload:
+                response = getattr(client, method)(path, payload(self), format='json')
+            else:
+                response = getattr(client, method)(path)
+        return response, len(queries)
+
+    def test_route_budgets(self):
+        for (method, url, auth), budget in self.BUDGETS.items():
+            with self.subTest(method=method, url=url, auth=auth):
+                response, count = self.request(method, url, auth)
+                self.assertLess(response.status_code, 400, response.content[:200])
+                self.assertLessEqual(count, budget, f'{method.upper()} {url}: {count} запросов')
+
+    # Админка собирает статику; манифест whitenoise в тестах не построен
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_admin_changelist_budget(self):
+        client = APIClient()
+        client.force_login(User.objects.create_superuser('root', password='secret-password'))
+        for url, budget in self.ADMIN_BUDGETS.items():
+            with self.subTest(url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(queries), budget, f'{url}: {len(queries)} запросов')
+
+    def test_not_modified_budget(self):
+        """Ответ 304 - один запрос-проба без сериализации"""
+        client = APIClient()
+        path = f'/api/sessions/{self.session.pk}/'
+        etag = client.get(path)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+
+    def test_stream_snapshot_budget(self):
+        """Начальный снимок потоков SSE"""
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIsNotNone(_session_snapshot(self.session.pk, 'guest'))
+        self.assertLessEqual(len(queries), 3)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIsNotNone(_vote_snapshot(self.vote.pk, 'guest'))
+        self.assertLessEqual(len(queries), 1)
+
+    def test_export_stream_budget(self):
+        """Выгрузка читает все строки одним запросом (и даты заседаний - еще одним)"""
+        client = APIClient()
+        for dataset in export.DATASETS:
+            with self.subTest(dataset):
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(f'/api/export/{dataset}.ndjson', HTTP_ACCEPT_ENCODING='gzip')
+                    body = zlib.decompress(b''.join(response.streaming_content), 31)
+                self.assertEqual(response['Content-Encoding'], 'gzip')
+                self.assertLessEqual(len(queries), 2)
+                ids = [json.loads(line)['id'] for line in body.splitlines()]
+                self.assertEqual(ids, sorted(ids))
+                self.assertEqual(len(ids), export.queryset(dataset).count())
+
+                middle = len(ids) // 2
+                response = client.get(f'/api/export/{dataset}.csv?since_id={ids[middle]}')
+                rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+                self.assertEqual(rows[0][0], 'id')
+                self.assertEqual([int(row[0]) for row in rows[1:]], ids[middle + 1:])
+
+    def test_import_budget(self):
+        """Загрузка выгрузки обратно: пачка пишется одним запросом, ссылки разрешаются по словарям"""
+        for dataset, fmt in (('attendance', 'csv'), ('deputy-votes', 'ndjson')):
+            with self.subTest(dataset):
+                data = b''.join(export.stream(dataset, fmt, export.queryset(dataset))).decode('utf-8')
+                with CaptureQueriesContext(connection) as queries:
+                    report = importer.import_file(dataset, io.StringIO(data), fmt, refresh=False)
+                self.assertEqual(report['errors'], [])
+                self.assertEqual(report['written'], export.queryset(dataset).count())
+                self.assertLessEqual(len(queries), 5, f'{dataset}: {len(queries)} запросов')
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.tokens["admin"]}')
+        upload = io.BytesIO(b'vote,deputy,choice\n' + f'{self.vote.pk},{self.deputy.pk},abstain\n'.encode())
+        upload.name = 'deputy-votes.csv'
+        response = client.post('/api/import/deputy-votes/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        self.assertEqual(response.data['written'], 1)
+        self.assertEqual(counters.find_tally_mismatches(), [])
+
+
+class QueryBudgetSmallTests(QueryBudgetMixin, TestCase):
+    rows = 10
+
+
+class QueryBudgetLargeTests(QueryBudgetMixin, TestCase):
+    rows = 1000
+
+
+class TokenAuthenticationTests(TestCase):
+    """Токен читается из кэша, выход, смена пароля и деактивация его отзывают"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user = User.objects.create_user('deputy', password='secret-password', user_type='deputy')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=user)[0].key}')
+        return client
+
+    def test_cached_lookup(self):
+        client = self.client_for(self.user)
+        self.assertEqual(client.get('/api/sessions/').status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get('/api/sessions/').status_code, 200)
+        self.assertFalse([query for query in queries if 'authtoken_token' in query['sql']])
+        # В кэше проекция пользователя без хэша пароля
+        entry = authentication.get_cache().get(authentication._key(Token.objects.get(user=self.user).key))
+        self.assertNotIn(self.user.password, repr(entry))
+
+    def test_revocation_in_other_worker(self):
+        """Токен удален в другом воркере (кэш этого процесса не сброшен): запись уже невозможна"""
+        client = self.client_for(self.user)
+        self.assertEqual(client.get('/api/sessions/').status_code, 200)
+        cache, key = authentication.get_cache(), authentication._key(Token.objects.get(user=self.user).key)
+        entry = cache.get(key)
+        Token.objects.filter(user=self.user).delete()
+        cache.set(key, entry)
+        # Чтение до истечения TTL еще проходит по кэшу
+        self.assertEqual(client.get('/api/sessions/').status_code, 200)
+        self.assertEqual(client.post('/api/auth/logout/').status_code, 401)
+
+    def test_revocation(self):
+        client = self.client_for(self.user)
+        self.assertEqual(client.post('/api/auth/logout/').status_code, 200)
+        self.assertEqual(client.get('/api/sessions/').status_code, 401)
+
+        for change in ('password', 'is_active'):
+            with self.subTest(change):
+                user = User.objects.get(pk=self.user.pk)
+                client = self.client_for(user)
+                self.assertEqual(client.get('/api/sessions/').status_code, 200)
+                if change == 'password':
+                    user.set_password('new-secret-password')
+                else:
+                    user.is_active = False
+                user.save()
+                self.assertEqual(client.get('/api/sessions/').status_code, 401)
+                self.assertFalse(Token.objects.filter(user=user).exists())
+                User.objects.filter(pk=user.pk).update(is_active=True)
+
+        # Прочие изменения пользователя токен не отзывают, но сбрасывают его кэш
+        user = User.objects.get(pk=self.user.pk)
+        client = self.client_for(user)
+        self.assertEqual(client.get('/api/sessions/').wsgi_request.user.user_type, 'deputy')
+        user.user_type = 'admin'
+        user.save()
+        self.assertEqual(client.get('/api/sessions/').wsgi_request.user.user_type, 'admin')
+
+
+class ConditionalGetTests(TestCase):
+    """ETag меняется после записи в таблицы ответа и со сменой периода по умолчанию"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def test_etag_after_write(self):
+        client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            parties, deputies, sessions, votes = build_parliament(3)
+            refresh_derived()
+        etag = client.get('/api/parties/')['ETag']
+        self.assertEqual(client.get('/api/parties/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Удаление строки меняет версию таблицы
+        with self.captureOnCommitCallbacks(execute=True):
+            parties[-1].delete()
+        self.assertEqual(client.get('/api/parties/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Голос меняет итоги голосования, а не само голосование
+        path = f'/api/votes/{votes[1].pk}/?expand=results'
+        etag = client.get(path)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            DeputyVote.objects.create(vote=votes[1], deputy=deputies[1], choice='for')
+        response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results']['for'], 1)
+
+    def test_default_window(self):
+        client = APIClient()
+        build_parliament(3)
+        path = '/api/deputies/similarity/'
+        etag = client.get(path)['ETag']
+        self.assertEqual(client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Назавтра период по умолчанию другой, хотя адрес и таблицы те же
+        with mock.patch('django.utils.timezone.localdate', return_value=timezone.localdate() + timedelta(days=1)):
+            self.assertEqual(client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class CounterTests(TestCase):
+    """Счетчики посещаемости депутатов сходятся с отметками после любых изменений"""
+
+    def test_attendance_counters(self):
+        parties, deputies, sessions, _ = build_parliament(3)
+        stale = Deputy.objects.get(pk=deputies[1].pk)
+        mark = Attendance.objects.create(deputy=deputies[1], session=sessions[1], is_present=True)
+        mark.is_present = False
+        mark.save()
+        mark.deputy = deputies[2]
+        mark.save()
+        Attendance.objects.filter(deputy=deputies[0], session=sessions[2]).delete()
+        # Смена партии по объекту, загруженному до новых отметок, не затирает счетчики
+        stale.party = parties[2]
+        stale.save()
+        Attendance.objects.create(deputy=deputies[1], session=sessions[2], is_present=True)
+        parties[2].delete()
+        self.assertEqual(counters.find_attendance_mismatches(), [])
+        self.assertEqual(Deputy.objects.get(pk=deputies[1].pk).attendance_total, 2)
+
+        # Удаление заседания снимает его отметки со счетчиков
+        sessions[0].delete()
+        self.assertEqual(counters.find_attendance_mismatches(), [])
+        self.assertEqual(Deputy.objects.get(pk=deputies[1].pk).attendance_total, 1)
+
+
+class RollupTests(TestCase):
+    """Сводная посещаемость, обновляемая по изменениям, совпадает с полным пересчетом"""
+
+    def test_incremental_rollups(self):
+        parties, deputies, sessions, _ = build_parliament(3)
+        mark = Attendance.objects.get(deputy=deputies[1], session=sessions[0])
+        mark.is_present = False
+        mark.save()
+        mark.session = sessions[1]
+        mark.save()
+        Attendance.objects.filter(deputy=deputies[0], session=sessions[2]).delete()
+        self.assertEqual(rollups.find_mismatches(), [])
+
+        # Перенос заседания в другой месяц и смена его типа
+        session = Session.objects.get(pk=sessions[2].pk)
+        session.date -= timedelta(days=40)
+        session.save()
+        session.session_type = 'committee'
+        session.save()
+        self.assertEqual(rollups.find_mismatches(), [])
+
+        deputy = Deputy.objects.get(pk=deputies[0].pk)
+        deputy.party = parties[4]
+        deputy.save()
+        self.assertEqual(rollups.find_mismatches(), [])
+        self.assertTrue(AttendanceRollup.objects.filter(dimension='party', key=str(parties[4].pk), total__gt=0))
+
+
+class TallyTests(TestCase):
+    """Итоги голосований сходятся с голосами депутатов после любых изменений"""
+
+    def test_vote_tallies(self):
+        _, deputies, _, votes = build_parliament(3)
+        ballot = DeputyVote.objects.create(vote=votes[1], deputy=deputies[1], choice='for')
+        ballot.choice = 'against'
+        ballot.save()
+        ballot.vote = votes[2]
+        ballot.save()
+        DeputyVote.objects.filter(vote=votes[0], deputy=deputies[2]).delete()
+        self.assertEqual(counters.find_tally_mismatches(), [])
+        self.assertEqual(Vote.objects.get(pk=votes[2].pk).results, {'for': 0, 'against': 2, 'abstain': 0, 'total': 2})
+        self.assertEqual(Vote.objects.get(pk=votes[0].pk).results['for'], 2)
+
+        # Удаление депутата удаляет его голоса каскадом и снимает их с итогов
+        deputies[0].delete()
+        self.assertEqual(counters.find_tally_mismatches(), [])
+        self.assertEqual(Vote.objects.get(pk=votes[2].pk).results['total'], 1)
+
+
+class RollCallTests(TestCase):
+    """Поименная регистрация: статус каждой строки, отметки, счетчики и сводная посещаемость"""
+
+    def test_mark_attendance_bulk(self):
+        _, deputies, sessions, _ = build_parliament(4)
+        admin = User.objects.create_user('admin', password='secret-password', user_type='admin')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=admin).key}')
+        records = [
+            {'deputy_id': deputies[0].pk, 'is_present': False, 'absence_reason': 'Болезнь'},
+            {'deputy_id': deputies[1].pk, 'arrival_time': '09:05', 'departure_time': '18:00'},
+            {'deputy_id': 999999},
+            {'deputy_id': 'первый'},
+            {'deputy_id': deputies[1].pk, 'arrival_time': '09:30'},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(f'/api/sessions/{sessions[1].pk}/mark_attendance_bulk/', {'records': records},
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['status'] for row in response.data['results']],
+                         ['updated', 'duplicate', 'not_found', 'invalid', 'created'])
+        self.assertEqual(response.data['counts'],
+                         {'updated': 1, 'duplicate': 1, 'not_found': 1, 'invalid': 1, 'created': 1})
+
+        absent = Attendance.objects.get(deputy=deputies[0], session=sessions[1])
+        self.assertEqual((absent.is_present, absent.absence_reason), (False, 'Болезнь'))
+        # Повторная строка заменила первую целиком
+        late = Attendance.objects.get(deputy=deputies[1], session=sessions[1])
+        self.assertEqual((late.arrival_time, late.departure_time), (dt_time(9, 30), None))
+
+        self.assertEqual(counters.find_attendance_mismatches(), [])
+        self.assertEqual(rollups.find_mismatches(), [])
+        first, second = Deputy.objects.filter(pk__in=[deputies[0].pk, deputies[1].pk]).order_by('pk')
+        self.assertEqual((first.attendance_present, first.attendance_total), (3, 4))
+        self.assertEqual((second.attendance_present, second.attendance_total), (2, 2))
+
+
+class CohesionTests(TestCase):
+    """Индекс согласия и отступники на небольшом парламенте; новый голос сбрасывает разбор голосования"""
+
+    def test_party_report(self):
+        for cache in caches.all():
+            cache.clear()
+        party = Party.objects.create(name='Партия', short_name='П')
+        deputies = Deputy.objects.bulk_create([
+            Deputy(first_name='Иван', last_name=f'Иванов {i}', party=party, election_date=date(2021, 9, 19),
+                   district='Округ')
+            for i in range(4)
+        ])
+        session = Session.objects.create(title='Заседание', date=timezone.now(), agenda='-', location='Зал')
+        # Завершенные голосования: их разборы кэшируются
+        first, second = Vote.objects.bulk_create([
+            Vote(session=session, title=f'Вопрос {i}', description='-', is_active=False) for i in range(2)
+        ])
+        DeputyVote.objects.bulk_create(
+            [DeputyVote(vote=first, deputy=deputy, choice='for') for deputy in deputies[:3]]
+            + [DeputyVote(vote=first, deputy=deputies[3], choice='against')]
+            + [DeputyVote(vote=second, deputy=deputy, choice='for') for deputy in deputies[:3]]
+        )
+        client = APIClient()
+        url = f'/api/parties/{party.pk}/cohesion/'
+
+        def per_vote(report):
+            return {item['vote']: item['cohesion'] for item in report['votes']}
+
+        report = client.get(url).data
+        # 3 из 4 за: (3 - 1 / 2) / 4 = 0.625, единогласно - 1
+        self.assertEqual(per_vote(report), {first.pk: 0.625, second.pk: 1.0})
+        self.assertEqual(report['cohesion'], 0.8125)
+        self.assertEqual([(rebel['deputy'], rebel['votes'], rebel['defections'], rebel['rate'])
+                          for rebel in report['rebels']], [(deputies[3].pk, 1, 1, 100.0)])
+
+        DeputyVote.objects.create(vote=second, deputy=deputies[3], choice='against')
+        report = client.get(url).data
+        self.assertEqual(per_vote(report), {first.pk: 0.625, second.pk: 0.625})
+        self.assertEqual([(rebel['deputy'], rebel['votes'], rebel['defections'])
+                          for rebel in report['rebels']], [(deputies[3].pk, 2, 2)])
+
+
+class SimilarityTests(TestCase):
+    """Матрица согласия по голосам и пересчет месяца после нового голоса"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        party = Party.objects.create(name='Партия', short_name='П')
+        self.party = party
+        self.deputies = Deputy.objects.bulk_create([
+            Deputy(first_name='Иван', last_name=f'Иванов {i}', party=party if i < 2 else None,
+                   election_date=date(2021, 9, 19), district='Округ')
+            for i in range(3)
+        ])
+        session = Session.objects.create(title='Заседание', date=timezone.now(), agenda='-', location='Зал')
+        self.votes = Vote.objects.bulk_create([
+            Vote(session=session, title=f'Вопрос {i}', description='-') for i in range(4)
+        ])
+        first, second, third = self.deputies
+        choices = {
+            first: ['for', 'for', 'against', 'abstain'],
+            second: ['for', 'for', 'for', 'abstain'],
+            third: ['against', 'for', None, None],
+        }
+        DeputyVote.objects.bulk_create([
+            DeputyVote(vote=vote, deputy=deputy, choice=choice)
+            for deputy, row in choices.items() for vote, choice in zip(self.votes, row) if choice
+        ])
+        counters.refresh_vote_tallies()
+
+    def matrix(self, **params):
+        response = APIClient().get('/api/deputies/similarity/', {'min_overlap': 1, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['deputies']], response.data['agreement']
+
+    def test_matrix(self):
+        ids, agreement = self.matrix()
+        self.assertEqual(ids, [deputy.pk for deputy in self.deputies])
+        # Первый и второй совпали в 3 голосованиях из 4, третий голосовал дважды и совпал с каждым один раз
+        self.assertEqual(agreement, [[1.0, 0.75, 0.5], [0.75, 1.0, 0.5], [0.5, 0.5, 1.0]])
+        self.assertEqual(self.matrix(party=self.party.pk), ([deputy.pk for deputy in self.deputies[:2]],
+                                                            [[1.0, 0.75], [0.75, 1.0]]))
+        self.assertEqual(APIClient().get('/api/deputies/similarity/?party=первая').status_code, 400)
+
+    def test_new_vote_recomputes_month(self):
+        self.matrix()
+        with self.captureOnCommitCallbacks(execute=True):
+            DeputyVote.objects.create(vote=self.votes[2], deputy=self.deputies[2], choice='against')
+        _, agreement = self.matrix()
+        self.assertEqual(agreement[0][2], 0.6667)
+        self.assertEqual(agreement[1][2], 0.3333)
+
+
+class DynamicFieldsTests(TestCase):
+    """?fields= и ?expand= меняют состав полей ответа"""
+
+    def setUp(self):
+        self.parties, self.deputies, self.sessions, self.votes = build_parliament(3)
+        self.client = APIClient()
+
+    def keys(self, url, listed=True):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return set((response.data['results'][0] if listed else response.data).keys())
+
+    def test_fields(self):
+        self.assertEqual(self.keys('/api/deputies/?fields=id,full_name'), {'id', 'full_name'})
+        self.assertEqual(self.keys('/api/deputies/?fields=id, attendance_rate'), {'id', 'attendance_rate'})
+
+    def test_expand(self):
+        self.assertNotIn('members_count', self.keys('/api/parties/'))
+        self.assertIn('members_count', self.keys('/api/parties/?expand=members_count'))
+        listed = self.keys('/api/votes/?expand=results')
+        self.assertIn('results', listed)
+        self.assertNotIn('deputy_votes', listed)
+        # Карточка выводит все поля и без expand
+        self.assertLessEqual({'results', 'deputy_votes'}, self.keys(f'/api/votes/{self.votes[0].pk}/', listed=False))
+
+
+class CursorPaginationTests(TestCase):
+    """Курсор не теряет и не повторяет строки при равных ключах сортировки и записи между страницами"""
+
+    def walk(self, url, between=None):
+        client, seen = APIClient(), []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['id'] for row in response.data['results']]
+            if between:
+                between()
+            url = response.data['next']
+        return seen
+
+    def test_list_cursor(self):
+        _, deputies, _, _ = build_parliament(12)
+        # Однофамильцы-тезки: порядок между ними задает id
+        Deputy.objects.filter(pk__in=[deputy.pk for deputy in deputies[:6]]).update(last_name='Иванов')
+        expected = list(Deputy.objects.order_by('last_name', 'first_name', 'id').values_list('pk', flat=True))
+
+        def insert_before_cursor():
+            # Строка перед уже выданными не сдвигает следующие страницы
+            Deputy.objects.create(first_name='Иван', last_name='Аанов', election_date=date(2021, 9, 19),
+                                  district='Округ')
+
+        seen = self.walk('/api/deputies/?pagination=cursor&page_size=5', insert_before_cursor)
+        self.assertEqual(seen, expected)
+
+    def test_history_cursor(self):
+        _, deputies, _, _ = build_parliament(12)
+        url = f'/api/deputies/{deputies[0].pk}/votes/?page_size=5'
+        seen = self.walk(url)
+        self.assertEqual(seen, list(DeputyVote.objects.filter(deputy=deputies[0]).order_by(
+            '-vote__session__date', '-id').values_list('pk', flat=True)))
+        # previous со второй страницы возвращает первую
+        client = APIClient()
+        second = client.get(client.get(url).data['next']).data
+        self.assertEqual([row['id'] for row in client.get(second['previous']).data['results']], seen[:5])
+
+
+class ResponseCacheTests(TestCase):
+    def test_hit_and_invalidation(self):
+        """Повторный запрос списка - из кэша, после сохранения депутата - заново с новыми данными"""
+        for cache in caches.all():
+            cache.clear()
+        _, deputies, _, _ = build_parliament(3)
+        client = APIClient()
+        self.assertEqual(client.get('/api/deputies/')['X-Cache'], 'MISS')
+        self.assertEqual(client.get('/api/deputies/')['X-Cache'], 'HIT')
+
+        deputy = Deputy.objects.get(pk=deputies[0].pk)
+        deputy.district = 'Новый округ'
+        with self.captureOnCommitCallbacks(execute=True):
+            deputy.save()
+        response = client.get('/api/deputies/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('Новый округ', [row['district'] for row in response.data['results']])
+        self.assertEqual(response_cache.statistics()['hits'], 1)
+
+
+class ReplicaRoutingTests(TestCase):
+    def test_cache_filled_from_primary_after_write(self):
+        """После сброса кэша ответ для него собирается с основной базы, а не с отстающей реплики"""
+        cache = response_cache.get_cache()
+        cache.delete(routers.WRITE_MARK_KEY)
+        router = routers.PrimaryReplicaRouter()
+        token = routers._read_from_replica.set(True)
+        try:
+            with mock.patch.object(routers, 'replica_alias', return_value='replica'):
+                with routers.filling(cache):
+                    self.assertEqual(router.db_for_read(Deputy), 'replica')
+                response_cache.invalidate(Deputy)
+                with routers.filling(cache):
+                    self.assertEqual(router.db_for_read(Deputy), 'default')
+                self.assertEqual(router.db_for_read(Deputy), 'replica')
+        finally:
+            routers._read_from_replica.reset(token)
+            cache.delete(routers.WRITE_MARK_KEY)
+
+
+class StatisticsSnapshotTests(TransactionTestCase):
+    def test_single_computation(self):
+        """Два одновременных промаха в разных соединениях с базой - один пересчет"""
+        for cache in caches.all():
+            cache.clear()
+        calls = []
+        results = []
+
+        def compute():
+            calls.append(threading.get_ident())
+            time.sleep(0.3)
+            return {'total_deputies': 0}
+
+        def request():
+            try:
+                results.append(stats.get_snapshot())
+            finally:
+                connection.close()
+
+        def racy_add(cache, key, value, timeout=None, version=None):
+            # Как FileBasedCache.add у двух процессов, одновременно прошедших проверку: оба записали
+            cache.set(key, value, timeout, version)
+            return True
+
+        # Объекты кэша у каждого потока свои, поэтому подменяется метод класса
+        with mock.patch.object(stats, 'compute_snapshot', side_effect=compute), \
+                mock.patch.object(type(stats.get_cache()), 'add', racy_add):
+            threads = [threading.Thread(target=request) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'total_deputies': 0}] * 2)
+
+
+class AttendanceRateTests(TestCase):
+    def test_snapshot_denominator(self):
+        """Зафиксированный знаменатель прошедшего заседания не подменяется текущим, даже нулевой"""
+        _, _, sessions, _ = build_parliament(3)
+        session = Session.objects.with_attendance().get(pk=sessions[0].pk)
+        self.assertEqual(session.attendance_rate, 100)
+        session.deputies_snapshot = 6
+        self.assertEqual(session.attendance_rate, 50)
+        session.deputies_snapshot = 0
+        self.assertEqual(session.attendance_rate, 0)
+
+
+class VoteBatcherTests(TestCase):
+    def test_batching_needs_concurrent_worker(self):
+        """У синхронного воркера пачка всегда из одного голоса: голос пишется сразу"""
+        with override_settings(VOTE_INGEST_MODE='batched', WORKER_CONCURRENT_REQUESTS=True):
+            self.assertTrue(ingest.batching_enabled())
+        with override_settings(VOTE_INGEST_MODE='batched', WORKER_CONCURRENT_REQUESTS=False):
+            self.assertFalse(ingest.batching_enabled())
+
+    def test_failed_vote_isolated(self):
+        """Ошибка одного голоса в пачке достается только его запросу"""
+        _, deputies, _, votes = build_parliament(4)
+        batcher = ingest.VoteBatcher()
+        batch = [(votes[1].pk, deputy.pk, 'for', Future()) for deputy in deputies]
+        flush = batcher.flush
+
+        def strict(rows):
+            if any(deputy_id == deputies[2].pk for _, deputy_id, _, _ in rows):
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            return flush(rows)
+
+        with mock.patch.object(batcher, 'flush', strict):
+            batcher._write(batch)
+        for (_, deputy_id, _, future), deputy in zip(batch, deputies):
+            if deputy == deputies[2]:
+                self.assertIsInstance(future.exception(), IntegrityError)
+            else:
+                self.assertEqual(future.result().deputy_id, deputy_id)
+        self.assertEqual(DeputyVote.objects.filter(vote=votes[1]).count(), 3)
+        self.assertEqual(counters.find_tally_mismatches(), [])
+
+
+class ImporterTests(TestCase):
+    """Ошибки строк и пачек попадают в отчет, записанное пересчитывается и при обрыве файла"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.parties, cls.deputies, cls.sessions, cls.votes = build_parliament(3)
+
+    def test_field_validators(self):
+        data = (
+            'last_name,first_name,election_date,district,email\n'
+            'Петров,Петр,2021-09-19,Округ,petrov@example.com\n'
+            f'{"П" * 101},Петр,2021-09-19,Округ,\n'
+            'Сидоров,Сидор,2021-09-19,Округ,не-адрес\n'
+        )
+        report = importer.import_file('deputies', io.StringIO(data), 'csv', refresh=False)
+        self.assertEqual((report['written'], report['skipped']), (1, 2))
+        self.assertEqual([error['row'] for error in report['errors']], [2, 3])
+        self.assertTrue(report['errors'][0]['error'].startswith('last_name:'))
+        self.assertTrue(report['errors'][1]['error'].startswith('email:'))
+
+    def test_failed_batch(self):
+        data = ''.join(f'{vote.pk},{self.deputies[1].pk},abstain\n' for vote in self.votes[1:])
+        write_rows = importer.Importer._write_rows
+        calls = []
+
+        def flaky(loader, items, present):
+            calls.append(len(items))
+            if len(calls) == 1:
+                raise DatabaseError('нарушено ограничение')
+            return write_rows(loader, items, present)
+
+        with mock.patch.object(importer.Importer, '_write_rows', flaky):
+            report = importer.import_file('deputy-votes', io.StringIO('vote,deputy,choice\n' + data), 'csv',
+                                          batch_size=1)
+        self.assertEqual((report['written'], report['skipped']), (1, 1))
+        self.assertIn('нарушено ограничение', report['errors'][0]['error'])
+        self.assertEqual(counters.find_tally_mismatches(), [])
+
+    def test_refresh_after_broken_file(self):
+        data = json.dumps({'vote': self.votes[1].pk, 'deputy': self.deputies[2].pk, 'choice': 'for'}) + '\n{\n'
+        with self.assertRaises(ValueError):
+            importer.import_file('deputy-votes', io.StringIO(data), 'ndjson', batch_size=1)
+        self.assertTrue(DeputyVote.objects.filter(vote=self.votes[1], deputy=self.deputies[2]).exists())
+        self.assertEqual(counters.find_tally_mismatches(), [])
+
+
+class StreamTicketTests(TestCase):
+    """Поток событий открывается по короткоживущему билету, а не по токену в адресе"""
+
+    def user_type(self, **params):
+        request = RequestFactory().get('/api/stream/votes/1/', params)
+        request.user = AnonymousUser()
+        return _user_type(request)
+
+    def test_ticket(self):
+        user = User.objects.create_user('admin', password='secret-password', user_type='admin')
+        token = Token.objects.create(user=user).key
+        self.assertEqual(APIClient().post('/api/stream/ticket/').status_code, 401)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        ticket = client.post('/api/stream/ticket/').data['ticket']
+
+        self.assertEqual(self.user_type(ticket=ticket), 'admin')
+        self.assertEqual(self.user_type(ticket=ticket[:-1]), 'guest')
+        self.assertEqual(self.user_type(token=token), 'guest')
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + streams.TICKET_MAX_AGE + 1):
+            self.assertEqual(self.user_type(ticket=ticket), 'guest')
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        self.assertEqual(self.user_type(ticket=ticket), 'guest')
+
+    def test_no_listeners(self):
+        """Без подписчиков голос не читает голосование ради номера заседания"""
+        _, deputies, _, votes = build_parliament(2)
+        ballot = DeputyVote(vote_id=votes[1].pk, deputy=deputies[1], choice='for')
+        with CaptureQueriesContext(connection) as queries:
+            ballot.save()
+        self.assertFalse([query for query in queries if 'FROM "deputies_vote"' in query['sql']])
+
+
+
+class StreamTests(TestCase):
+    def test_closed_on_resync(self):
+        """Если объекта при пересинхронизации уже нет, поток завершается событием closed"""
+        async def read():
+            response = streams._stream(['vote:0'], {'type': 'snapshot'}, lambda: None)
+            frames = response.streaming_content
+            received = [await anext(frames)]
+            subscription, = events.broker._subscribers['vote:0']
+            subscription.queue.put_nowait(events.RESYNC)
+            received += [frame async for frame in frames]
+            return received
+
+        received = asyncio.run(read())
+        self.assertEqual(len(received), 2)
+        self.assertIn(b'event: closed', received[1])
+        self.assertFalse(events.broker.has_subscribers(['vote:0']))
+
+class SearchTests(TestCase):
+    """Поиск по основам слов, ФИО важнее округа, опечатки исправляются по словарю индекса"""
+
+    @classmethod
+    def setUpTestData(cls):
+        party = Party.objects.create(name='Партия', short_name='П')
+
+        def deputy(last_name, first_name, district):
+            return Deputy.objects.create(party=party, last_name=last_name, first_name=first_name,
+                                         election_date=date(2021, 9, 19), district=district)
+        cls.sokolova = deputy('Соколова', 'Анна', 'Центральный')
+        cls.ivanov = deputy('Иванов', 'Петр', 'Соколовский')
+        cls.petrov = deputy('Петров', 'Иван', 'Северный')
+
+    def found(self, text, backend=None):
+        backend = backend or search.get_backend()
+        return list(backend.search(Deputy.objects.all(), text).values_list('pk', flat=True))
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5 - только SQLite')
+    def test_sqlite_fts(self):
+        if not isinstance(search.get_backend(), search.SQLiteFTSBackend):
+            self.skipTest('SQLite собран без FTS5')
+        # Другой падеж находится по основе, совпадение в ФИО выше совпадения в округе
+        self.assertEqual(self.found('Соколовой'), [self.sokolova.pk, self.ivanov.pk])
+        # Опечатка: ближайшие термины словаря, в том числе из округа
+        self.assertEqual(self.found('соклова')[0], self.sokolova.pk)
+        # «Иванов Петр» подходит по префиксам основ, но точное совпадение слов выше
+        self.assertEqual(self.found('Иван Петров'), [self.petrov.pk, self.ivanov.pk])
+
+    @skipUnless(connection.vendor == 'postgresql', 'tsvector и pg_trgm - только PostgreSQL')
+    def test_postgresql(self):
+        found = self.found('Соколовой')
+        self.assertEqual(found[0], self.sokolova.pk)
+        self.assertNotIn(self.petrov.pk, found)
+        self.assertIn(self.sokolova.pk, self.found('Саколова'))
+
+    def test_icontains(self):
+        found = self.found('Петр', search.IContainsBackend())
+        self.assertEqual(sorted(found), sorted([self.ivanov.pk, self.petrov.pk]))
+
+
+class ThumbnailTests(TestCase):
+    """Списки отдают уменьшенные копии изображений, оригиналы - только карточки"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, THUMBNAIL_ASYNC=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for cache in caches.all():
+            cache.clear()
+
+    def image(self, size, mode='RGB'):
+        buffer = io.BytesIO()
+        Image.new(mode, size, (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30)).save(buffer, 'PNG')
+        return ContentFile(buffer.getvalue())
+
+    def test_variants(self):
+        party = Party.objects.create(name='Партия', short_name='П')
+        deputy = Deputy.objects.create(first_name='Иван', last_name='Иванов', party=party,
+                                       election_date=date(2021, 9, 19), district='Округ')
+        with self.captureOnCommitCallbacks(execute=True):
+            deputy.photo.save('portrait.png', self.image((600, 900)))
+            party.logo.save('logo.png', self.image((500, 200), 'RGBA'))
+        deputy.refresh_from_db()
+        party.refresh_from_db()
+        for image, size in ((deputy.photo_thumb, (96, 96)), (deputy.photo_medium, (320, 320)),
+                            (party.logo_thumb, (96, 96))):
+            with image.open('rb') as stored:
+                self.assertEqual(Image.open(stored).size, size)
+        self.assertRegex(deputy.photo_thumb.name, r'^thumbnails/[0-9a-f]{32}-96x96\.webp$')
+
+        client = APIClient()
+        listed = client.get('/api/deputies/').data['results'][0]
+        self.assertNotIn('photo', listed)
+        self.assertTrue(listed['photo_thumb'].endswith(deputy.photo_thumb.name))
+        self.assertIn('photo', client.get(f'/api/deputies/{deputy.pk}/').data)
+        self.assertNotIn('logo', client.get('/api/parties/').data['results'][0])
+        self.assertIn('logo', client.get(f'/api/parties/{party.pk}/').data)
+
+        response = client.get(deputy.photo_thumb.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+
+        # Сохранение без смены фотографии не перестраивает и не стирает копии
+        with self.captureOnCommitCallbacks() as callbacks:
+            Deputy.objects.get(pk=deputy.pk).save()
+        self.assertEqual([callback for callback in callbacks if callback.__module__ == thumbnails.__name__], [])
+        self.assertEqual(Deputy.objects.get(pk=deputy.pk).photo_thumb.name, deputy.photo_thumb.name)
+
+
+    def test_original_until_built(self):
+        """Пока копий нет, список отдает адрес оригинала"""
+        deputy = Deputy.objects.create(first_name='Иван', last_name='Иванов', election_date=date(2021, 9, 19),
+                                       district='Округ')
+        deputy.photo.save('portrait.png', self.image((600, 900)))
+        Deputy.objects.filter(pk=deputy.pk).update(photo_thumb=None, photo_medium='')
+        listed = APIClient().get('/api/deputies/').data['results'][0]
+        self.assertTrue(listed['photo_thumb'].endswith(deputy.photo.name))
+        self.assertTrue(listed['photo_medium'].endswith(deputy.photo.name))
+
+    def test_rebuild_missing(self):
+        """--missing находит фотографии без копий: NULL до миграции 0009 и недостающий один вариант"""
+        old, partial = [
+            Deputy.objects.create(first_name='Иван', last_name=name, election_date=date(2021, 9, 19), district='Округ')
+            for name in ('Иванов', 'Петров')
+        ]
+        for deputy in (old, partial):
+            # Без выполнения on_commit копии не строятся, как у фотографий, загруженных до 0009
+            deputy.photo.save('portrait.png', self.image((600, 900)))
+        Deputy.objects.filter(pk=old.pk).update(photo_thumb=None, photo_medium=None)
+        Deputy.objects.filter(pk=partial.pk).update(photo_thumb='thumbnails/kept.webp', photo_medium='')
+        call_command('rebuild_thumbnails', '--missing', stdout=io.StringIO())
+        for deputy in (old, partial):
+            deputy.refresh_from_db()
+            self.assertRegex(deputy.photo_thumb.name, r'^thumbnails/[0-9a-f]{32}-96x96\.webp$')
+            self.assertRegex(deputy.photo_medium.name, r'^thumbnails/[0-9a-f]{32}-320x320\.webp$')
+
+@override_settings(QUERY_INSTRUMENTATION=True, QUERY_DUPLICATE_THRESHOLD=2)
+class QueryCountMiddlewareTests(TestCase):
+    def test_headers(self):
+        Party.objects.create(name='Партия', short_name='П')
+        response = APIClient().get('/api/parties/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+        self.assertEqual(response['X-DB-Duplicates'], '0')
+        self.assertIn('X-DB-Time-Ms', response)
+
+    def test_duplicate_fingerprints(self):
+        parties = Party.objects.bulk_create([Party(name=f'Партия {i}', short_name='П') for i in range(3)])
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            # Без аннотации число членов считается отдельным COUNT на каждую партию
+            for party in Party.objects.filter(pk__in=[party.pk for party in parties]):
+                party.members_count
+        self.assertEqual(recorder.count, 4)
+        self.assertEqual(list(recorder.duplicates.values()), [3])
+
+
+def full_scans(plan):
+    """Строки плана с полным просмотром таблицы (SQLite: SCAN без индекса, PostgreSQL: Seq Scan)"""
+    return [
+        line.strip() for line in plan.splitlines()
+        if re.search(r'\bSCAN \w+$', line.strip()) or 'Seq Scan' in line
+    ]
+
+
+class QueryPlanTests(TestCase):
+    """Горячие запросы API используют индексы, а не полный просмотр таблиц"""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_parliament(random.Random(7), deputies=450, years=0.25)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.party = Party.objects.first()
+        cls.deputy = Deputy.objects.first()
+        cls.session = Session.objects.first()
+        cls.vote = Vote.objects.filter(is_active=True).first()
+
+    def hot_queries(self):
+        now = timezone.now()
+        return {
+            'заседания для гостя': Session.objects.with_attendance().filter(is_closed=False).order_by('-date', '-id')[:20],
+            'заседания по типу и датам': Session.objects.filter(
+                session_type='plenary', date__gte=now - timedelta(days=30), date__lte=now
+            ).order_by('-date')[:20],
+            'открытые заседания по датам': Session.objects.filter(
+                is_closed=False, date__gte=now - timedelta(days=30), date__lte=now
+            ).order_by('-date')[:20],
+            # Подсчеты (with_attendance, счетчики депутатов, итоги голосований) идут без сортировки
+            'присутствующие на заседании': Attendance.objects.filter(session=self.session, is_present=True).order_by(),
+            'присутствия депутата': Attendance.objects.filter(deputy=self.deputy, is_present=True).order_by(),
+            'посещаемость депутата': Attendance.objects.filter(deputy=self.deputy).order_by('-session__date', '-id')[:50],
+            'голоса за вариант': DeputyVote.objects.filter(vote=self.vote, choice='for').order_by(),
+            'голоса депутата': DeputyVote.objects.filter(deputy=self.deputy).order_by('-vote__session__date', '-id')[:50],
+            'активные депутаты': Deputy.objects.filter(is_active=True).order_by('last_name', 'first_name', 'id')[:20],
+            'депутаты партии': Deputy.objects.filter(is_active=True, party=self.party).order_by('last_name'),
+            'активные голосования': Vote.objects.filter(is_active=True).order_by('-created_at', '-id')[:20],
+            'динамика посещаемости депутата': AttendanceRollup.objects.filter(
+                dimension='deputy', period='day', key=str(self.deputy.pk), period_start__gte=now.date() - timedelta(days=90)
+            ).order_by('key', 'period_start'),
+            'динамика посещаемости партий': AttendanceRollup.objects.filter(
+                dimension='party', period='month'
+            ).order_by('key', 'period_start'),
+        }
+
+    def test_no_full_scans(self):
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertEqual(full_scans(plan), [], f'{name}:\n{plan}')
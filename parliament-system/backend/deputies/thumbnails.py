@@ -0,0 +1,170 @@
+"""
+Уменьшенные копии фотографий депутатов и логотипов партий.
+
+После загрузки изображения (по фиксации транзакции) фоновый поток строит
+варианты фиксированного размера (THUMBNAIL_VARIANTS) в WebP, а без поддержки
+WebP в Pillow - в JPEG. Имя файла - хэш содержимого оригинала и размер, поэтому
+файл по одному адресу никогда не меняется и отдается с кэшированием на год
+(см. serve; в продакшене то же правило задается веб-серверу для /media/thumbnails/).
+Списки API выводят только варианты, оригинал - лишь карточка депутата или партии.
+"""
+
+import hashlib
+import io
+import logging
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.views.static import serve as serve_static
+from PIL import Image, ImageOps, features
+
+from .models import Deputy, Party
+from . import conditional, response_cache
+
+logger = logging.getLogger('deputies.thumbnails')
+
+# Вариант -> (ширина, высота)
+VARIANTS = getattr(settings, 'THUMBNAIL_VARIANTS', {'thumb': (96, 96), 'medium': (320, 320)})
+QUALITY = getattr(settings, 'THUMBNAIL_QUALITY', 80)
+DIRECTORY = 'thumbnails'
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Модель -> (поле оригинала, вписывание). cover - обрезка по размеру (портреты),
+# contain - изображение целиком на прозрачном поле (логотипы)
+SOURCES = {
+    Deputy: ('photo', 'cover'),
+    Party: ('logo', 'contain'),
+}
+
+
+def variant_fields(model):
+    field, _ = SOURCES[model]
+    return [f'{field}_{name}' for name in VARIANTS]
+
+
+def missing(model):
+    """Условие "не хватает хотя бы одного варианта": пустая строка или NULL (строки до появления копий)"""
+    field, _ = SOURCES[model]
+    condition = Q()
+    for name in VARIANTS:
+        condition |= Q(**{f'{field}_{name}__isnull': True}) | Q(**{f'{field}_{name}': ''})
+    return condition
+
+
+def output_format():
+    if getattr(settings, 'THUMBNAIL_FORMAT', 'WEBP') == 'WEBP' and features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def render(image, size, mode, fmt):
+    """Байты варианта изображения размером size"""
+    if mode == 'cover':
+        # Портреты обрезаются со смещением вверх, чтобы не срезать голову
+        variant = ImageOps.fit(image, size, Image.LANCZOS, centering=(0.5, 0.35))
+    else:
+        variant = Image.new('RGBA', size, (255, 255, 255, 0))
+        contained = ImageOps.contain(image, size, Image.LANCZOS)
+        variant.paste(contained, ((size[0] - contained.width) // 2, (size[1] - contained.height) // 2))
+    if fmt == 'JPEG':
+        # JPEG не хранит прозрачность: фон белый
+        background = Image.new('RGB', variant.size, (255, 255, 255))
+        background.paste(variant, mask=variant.getchannel('A'))
+        variant = background
+    buffer = io.BytesIO()
+    if fmt == 'WEBP':
+        variant.save(buffer, fmt, quality=QUALITY, method=4)
+    else:
+        variant.save(buffer, fmt, quality=QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def build(content, mode):
+    """Сохранить варианты изображения content (байты): {вариант: имя файла}"""
+    digest = hashlib.sha256(content).hexdigest()[:32]
+    fmt, extension = output_format()
+    names = {}
+    image = None
+    for name, (width, height) in VARIANTS.items():
+        path = f'{DIRECTORY}/{digest}-{width}x{height}.{extension}'
+        if not default_storage.exists(path):
+            if image is None:
+                image = Image.open(io.BytesIO(content))
+                # Поворот по EXIF, иначе снимки с телефона ложатся набок
+                image = ImageOps.exif_transpose(image).convert('RGBA')
+            path = default_storage.save(path, ContentFile(render(image, (width, height), mode, fmt)))
+        names[name] = path
+    return names
+
+
+def generate(model, pk):
+    """Построить варианты изображения объекта pk; True, если они записаны"""
+    field, mode = SOURCES[model]
+    instance = model.objects.filter(pk=pk).only(field).first()
+    if instance is None:
+        return False
+    source = getattr(instance, field)
+    names = dict.fromkeys(VARIANTS, '')
+    if source:
+        try:
+            with source.open('rb') as image_file:
+                names = build(image_file.read(), mode)
+        except (OSError, ValueError, Image.DecompressionBombError) as error:
+            logger.warning('%s #%s: не удалось построить уменьшенные копии (%s)', model.__name__, pk, error)
+    # Оригинал могли заменить, пока строились варианты: тогда их запишет следующий запуск
+    current = Q(**{field: source.name}) if source else Q(**{field: ''}) | Q(**{f'{field}__isnull': True})
+    updated = model.objects.filter(current, pk=pk).update(
+        updated_at=timezone.now(),
+        **{f'{field}_{name}': path for name, path in names.items()},
+    )
+    if updated:
+        response_cache.invalidate(model)
+        conditional.touch([model])
+    return bool(updated)
+
+
+def _run(model, pk):
+    try:
+        generate(model, pk)
+    except Exception:
+        logger.exception('%s #%s: ошибка построения уменьшенных копий', model.__name__, pk)
+    finally:
+        # Соединения потока с базой не переиспользуются
+        connections.close_all()
+
+
+def schedule(instance):
+    """Построить варианты после фиксации транзакции: в фоновом потоке (THUMBNAIL_ASYNC) или сразу"""
+    model, pk = type(instance), instance.pk
+
+    def start():
+        if getattr(settings, 'THUMBNAIL_ASYNC', True):
+            threading.Thread(target=_run, args=(model, pk), daemon=True).start()
+        else:
+            generate(model, pk)
+    transaction.on_commit(start)
+
+
+def source_changed(sender, instance, created, raw=False, **kwargs):
+    """Обработчик post_save: оригинал изображения загружен, заменен или удален"""
+    field, _ = SOURCES[sender]
+    update_fields = kwargs.get('update_fields')
+    if raw or field in instance.get_deferred_fields() or (update_fields is not None and field not in update_fields):
+        return
+    name = getattr(instance, field).name or ''
+    previous = '' if created else getattr(instance, f'_loaded_{field}', name)
+    if name != previous:
+        schedule(instance)
+    setattr(instance, f'_loaded_{field}', name)
+
+
+def serve(request, path):
+    """Отдать вариант из MEDIA_ROOT с кэшированием на год (имя меняется вместе с содержимым)"""
+    response = serve_static(request, f'{DIRECTORY}/{path}', document_root=settings.MEDIA_ROOT)
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    LoginView, LogoutView, RegisterView,
+    LoginView, LogoutView, RegisterView, StreamTicketView,
     PartyViewSet, DeputyViewSet, SessionViewSet,
-    VoteViewSet, StatisticsView
+    VoteViewSet, StatisticsView, StatisticsTrendsView, ExportView, ImportView, ResponseCacheStatsView
 )
+from .streams import session_stream, vote_stream
 
 router = DefaultRouter()
 router.register('parties', PartyViewSet)
@@ -17,5 +18,12 @@ urlpatterns = [
     path('auth/logout/', LogoutView.as_view(), name='logout'),
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('statistics/', StatisticsView.as_view(), name='statistics'),
+    path('statistics/trends/', StatisticsTrendsView.as_view(), name='statistics-trends'),
+    path('export/<slug:dataset>.<slug:fmt>', ExportView.as_view(), name='export'),
+    path('import/<slug:dataset>/', ImportView.as_view(), name='import'),
+    path('cache/stats/', ResponseCacheStatsView.as_view(), name='cache-stats'),
+    path('stream/ticket/', StreamTicketView.as_view(), name='stream-ticket'),
+    path('stream/sessions/<int:pk>/', session_stream, name='session-stream'),
+    path('stream/votes/<int:pk>/', vote_stream, name='vote-stream'),
     path('', include(router.urls)),   # 👈 оставляем только роутер
 ]
@@ -1,20 +1,34 @@
-from rest_framework import viewsets, status, permissions
+from rest_framework import viewsets, status, permissions, exceptions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import login, logout
-from django.db.models import Avg, Count, Q
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Avg, Count, F, Prefetch, Q
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date, parse_etags
 from datetime import timedelta
-from .models import User, Party, Deputy, Session, Attendance, Vote, DeputyVote
+from concurrent import futures
+import io
+import numpy as np
+from .models import User, Party, Deputy, Session, Attendance, Vote, VoteTally, DeputyVote
 from .serializers import (
     UserSerializer, LoginSerializer, PartySerializer,
     DeputyListSerializer, DeputyDetailSerializer,
     SessionListSerializer, SessionDetailSerializer,
     AttendanceSerializer, VoteSerializer, DeputyVoteSerializer,
-    StatisticsSerializer
+    StatisticsSerializer, RollCallEntrySerializer, selected_fields, split_param
 )
+from . import (
+    cohesion, conditional, export, importer, ingest, response_cache, rollups, routers, search, similarity, stats,
+    streams,
+)
+from .pagination import HistoryPagination
+from .signals import attendance_bulk_changed
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -45,6 +59,9 @@ class LoginView(APIView):
 
 class LogoutView(APIView):
     def post(self, request):
+        # Токен отзывается: повторно войти можно только через /api/auth/login/
+        if isinstance(request.auth, Token):
+            request.auth.delete()
         logout(request)
         return Response({'detail': 'Вы успешно вышли из системы'})
 
@@ -74,23 +91,223 @@ class RegisterView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class PartyViewSet(viewsets.ModelViewSet):
+class StreamTicketView(APIView):
+    """Билет для подключения к потоку событий: /api/stream/...?ticket= (см. deputies/streams.py)"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        return Response({'ticket': streams.issue_ticket(request.user), 'expires_in': streams.TICKET_MAX_AGE})
+
+
+class FieldSelectionMixin:
+    """Подгрузка связанных данных только для полей, которые попадут в ответ.
+
+    field_querysets: {поле сериализатора: функция, дополняющая queryset}. Для
+    list и retrieve функция применяется, если поле выбрано (?fields=, ?expand=).
+    """
+    field_querysets = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            names = selected_fields(self.get_serializer_class(), self.request, self.action == 'list')
+            for name, extend in self.field_querysets.items():
+                if name in names:
+                    queryset = extend(queryset)
+        return queryset
+
+
+class NotModified(exceptions.APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+
+
+class ConditionalGetMixin:
+    """ETag / Last-Modified для GET-запросов и ответ 304 без сериализации.
+
+    etag_models - модели, от которых зависит ответ; etag_action_models - то же
+    для отдельных действий; etag_parts - прочее, от чего зависит ответ (например,
+    период по умолчанию, отсчитываемый от сегодняшней даты). If-Modified-Since не
+    проверяется: Last-Modified точен до секунды, поэтому 304 выдается только по ETag.
+    """
+    etag_models = ()
+    etag_action_models = {}
+
+    def etag_parts(self):
+        return ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._validators = None
+        if request.method not in ('GET', 'HEAD'):
+            return
+        models = self.etag_action_models.get(self.action, self.etag_models)
+        if not models:
+            return
+        self._validators = conditional.validators(
+            models,
+            request.get_full_path(),
+            getattr(request.user, 'user_type', 'guest') if request.user.is_authenticated else 'guest',
+            request.accepted_media_type,
+            *self.etag_parts(),
+        )
+        etags = parse_etags(request.headers.get('If-None-Match', ''))
+        etag = self._validators[0]
+        if '*' in etags or any(candidate.removeprefix('W/') == etag.removeprefix('W/') for candidate in etags):
+            raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=exc.status_code)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, '_validators', None) and response.status_code in (200, 304):
+            etag, last_modified = self._validators
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+            patch_vary_headers(response, ['Authorization'])
+        return response
+
+
+class ResponseCacheMixin:
+    """Кэш ответа list (см. deputies/response_cache.py).
+
+    response_cache_models - модели, при изменении которых ответ устаревает.
+    Заголовок X-Cache сообщает, взят ли ответ из кэша.
+    """
+    response_cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        visibility = getattr(request.user, 'user_type', 'guest') if request.user.is_authenticated else 'guest'
+        key = response_cache.make_key(request, visibility, self.response_cache_models)
+        data = response_cache.lookup(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+        with routers.filling(response_cache.get_cache()):
+            response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response_cache.store(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+def _with_party(queryset):
+    return queryset.select_related('party')
+
+
+def _date_params(params):
+    """date_from и date_to из параметров запроса (ГГГГ-ММ-ДД)"""
+    dates = []
+    for name in ('date_from', 'date_to'):
+        value = params.get(name)
+        try:
+            parsed = parse_date(value) if value else None
+        except ValueError:
+            parsed = None
+        if value and parsed is None:
+            raise exceptions.ParseError(f'{name}: дата в формате ГГГГ-ММ-ДД')
+        dates.append(parsed)
+    return dates
+
+
+def _int_param(params, name, default, minimum=0, maximum=None):
+    value = params.get(name)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise exceptions.ParseError(f'{name}: ожидается целое число')
+    if number < minimum or (maximum is not None and number > maximum):
+        raise exceptions.ParseError(f'{name}: от {minimum} до {maximum}' if maximum is not None else f'{name}: не меньше {minimum}')
+    return number
+
+
+def _deputy_labels(ids):
+    """Краткие сведения о депутатах для аналитических ответов: {id: {...}}"""
+    return {
+        deputy.pk: {
+            'id': deputy.pk,
+            'name': str(deputy),
+            'party': deputy.party.short_name if deputy.party else None,
+        }
+        for deputy in Deputy.objects.filter(pk__in=ids).select_related('party').only(
+            'first_name', 'last_name', 'middle_name', 'party__short_name'
+        )
+    }
+
+
+class PartyViewSet(ConditionalGetMixin, ResponseCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     queryset = Party.objects.all()
     serializer_class = PartySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    
+    cursor_ordering = ('name', 'id')
+    etag_models = (Party, Deputy)
+    response_cache_models = (Party, Deputy)
+    etag_action_models = {
+        'members': (Party, Deputy, Attendance),
+        # Голоса депутатов меняют версию VoteTally, смена партии - версию Deputy
+        'cohesion': (Party, Deputy, Vote, VoteTally),
+    }
+    field_querysets = {
+        'members_count': lambda queryset: queryset.with_members_count(),
+    }
+    COHESION_RANGE = timedelta(days=365)
+
+    def _cohesion_params(self, request):
+        period = request.query_params.get('period', 'month')
+        if period not in rollups.PERIODS:
+            raise exceptions.ParseError(f'period: {", ".join(rollups.PERIODS)}')
+        date_from, date_to = _date_params(request.query_params)
+        if date_from is None:
+            date_from = (date_to or timezone.localdate()) - self.COHESION_RANGE
+        return date_from, date_to, period
+
+    def etag_parts(self):
+        return self._cohesion_params(self.request)[:2] if self.action == 'cohesion' else ()
+
     @action(detail=True, methods=['get'])
     def members(self, request, pk=None):
         """Получить список депутатов партии"""
         party = self.get_object()
-        deputies = party.deputies.filter(is_active=True)
-        serializer = DeputyListSerializer(deputies, many=True)
+        deputies = party.deputies.filter(is_active=True).select_related('party')
+        serializer = DeputyListSerializer(deputies, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def cohesion(self, request, pk=None):
+        """Сплоченность партии при голосованиях и депутаты, чаще других расходящиеся с ее линией.
+
+        ?date_from=/?date_to= (по умолчанию - последний год), ?period=day|month
+        """
+        party = self.get_object()
+        date_from, date_to, period = self._cohesion_params(request)
+        report = cohesion.party_report(party.pk, date_from, date_to, period)
+        return Response({'date_from': date_from, 'date_to': date_to, 'period': period, **report})
 
-class DeputyViewSet(viewsets.ModelViewSet):
+
+class DeputyViewSet(ConditionalGetMixin, ResponseCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     queryset = Deputy.objects.filter(is_active=True)
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cursor_ordering = ('last_name', 'first_name', 'id')
+    # Счетчики посещаемости обновляются вместе с отметками - учитываем их версию
+    etag_models = (Deputy, Party, Attendance)
+    response_cache_models = (Deputy, Party, Attendance)
+    etag_action_models = {
+        'attendance': (Deputy, Attendance, Session),
+        # Голоса депутата меняют итоги голосования, а значит и версию VoteTally
+        'votes': (Deputy, VoteTally, Vote, Session),
+        # Новый голос меняет версию VoteTally
+        'similar': (Deputy, Vote, VoteTally),
+        'similarity': (Deputy, Vote, VoteTally),
+    }
+    field_querysets = {
+        'party': _with_party,
+        'party_name': _with_party,
+        'party_color': _with_party,
+    }
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -105,38 +322,113 @@ class DeputyViewSet(viewsets.ModelViewSet):
         if party_id:
             queryset = queryset.filter(party_id=party_id)
         
-        # Поиск
-        search = self.request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(middle_name__icontains=search) |
-                Q(district__icontains=search)
-            )
+        # Поиск (FTS5 / tsvector + pg_trgm, см. deputies.search)
+        query = self.request.query_params.get('search')
+        if query:
+            queryset = search.search_deputies(queryset, query)
+            # Выдача упорядочена по релевантности - курсорная пагинация неприменима
+            self.custom_ordering = True
         
         return queryset
     
+    def _paginated_history(self, queryset, serializer_class):
+        paginator = HistoryPagination()
+        page = paginator.paginate_queryset(queryset, self.request, view=self)
+        serializer = serializer_class(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['get'])
     def attendance(self, request, pk=None):
-        """Получить посещаемость депутата"""
+        """Получить посещаемость депутата (курсорная пагинация по дате заседания)"""
         deputy = self.get_object()
-        attendances = deputy.attendances.select_related('session')
-        serializer = AttendanceSerializer(attendances, many=True)
-        return Response(serializer.data)
+        attendances = deputy.attendances.select_related('session', 'deputy').annotate(
+            session_date=F('session__date')
+        )
+        return self._paginated_history(attendances, AttendanceSerializer)
     
     @action(detail=True, methods=['get'])
     def votes(self, request, pk=None):
-        """Получить голоса депутата"""
+        """Получить голоса депутата (курсорная пагинация по дате заседания)"""
         deputy = self.get_object()
-        votes = deputy.votes.select_related('vote')
-        serializer = DeputyVoteSerializer(votes, many=True)
-        return Response(serializer.data)
+        votes = deputy.votes.select_related('deputy').annotate(
+            session_date=F('vote__session__date')
+        )
+        return self._paginated_history(votes, DeputyVoteSerializer)
+
+    SIMILARITY_RANGE = timedelta(days=365)
+
+    def _similarity_params(self, request):
+        date_from, date_to = _date_params(request.query_params)
+        date_to = date_to or timezone.localdate()
+        date_from = date_from or date_to - self.SIMILARITY_RANGE
+        min_overlap = _int_param(request.query_params, 'min_overlap', similarity.MIN_OVERLAP, minimum=1)
+        return date_from, date_to, min_overlap
+
+    def etag_parts(self):
+        if self.action in ('similar', 'similarity'):
+            return self._similarity_params(self.request)[:2]
+        return ()
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Депутаты, голосующие наиболее похоже (доля совпавших голосов в общих голосованиях).
+
+        ?date_from=/?date_to= (по умолчанию - последний год), ?limit=, ?min_overlap=
+        """
+        deputy = self.get_object()
+        date_from, date_to, min_overlap = self._similarity_params(request)
+        limit = _int_param(request.query_params, 'limit', 10, minimum=1, maximum=100)
+        found = similarity.most_similar(deputy.pk, date_from, date_to, limit, min_overlap)
+        labels = _deputy_labels([pk for pk, _, _ in found])
+        return Response({
+            'deputy': deputy.pk,
+            'date_from': date_from,
+            'date_to': date_to,
+            'results': [
+                {**labels.get(pk, {'id': pk}), 'agreement': round(value, 4), 'overlap': overlap}
+                for pk, value, overlap in found
+            ],
+        })
+
+    @action(detail=False, methods=['get'])
+    def similarity(self, request):
+        """Матрица попарного согласия депутатов за период.
+
+        ?party= или ?deputies=1,2,3 ограничивают строки и столбцы; пары, у которых
+        общих голосований меньше min_overlap, - null
+        """
+        date_from, date_to, min_overlap = self._similarity_params(request)
+        deputies, agreement, _ = similarity.agreement_matrix(date_from, date_to, min_overlap)
+        selected = None
+        party_id = _int_param(request.query_params, 'party', None, minimum=1)
+        if party_id is not None:
+            selected = Deputy.objects.filter(party_id=party_id).values_list('pk', flat=True)
+        elif request.query_params.get('deputies'):
+            selected = [int(pk) for pk in split_param(request.query_params['deputies']) if pk.isdigit()]
+        if selected is not None:
+            keep = np.isin(deputies, list(selected))
+            deputies, agreement = deputies[keep], agreement[np.ix_(keep, keep)]
+        labels = _deputy_labels(deputies.tolist())
+        return Response({
+            'date_from': date_from,
+            'date_to': date_to,
+            'min_overlap': min_overlap,
+            'deputies': [labels.get(pk, {'id': pk}) for pk in deputies.tolist()],
+            'agreement': np.where(np.isnan(agreement), None, np.round(agreement, 4)).tolist(),
+        })
 
 
-class SessionViewSet(viewsets.ModelViewSet):
+class SessionViewSet(ConditionalGetMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     queryset = Session.objects.all()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cursor_ordering = ('-date', '-id')
+    etag_models = (Session, Attendance, Deputy)
+    field_querysets = {
+        'attendance_rate': lambda queryset: queryset.with_attendance(),
+        'attendances': lambda queryset: queryset.prefetch_related(
+            Prefetch('attendances', queryset=Attendance.objects.select_related('deputy', 'session'))
+        ),
+    }
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -198,11 +490,81 @@ class SessionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+    @action(detail=True, methods=['post'])
+    def mark_attendance_bulk(self, request, pk=None):
+        """Поименная регистрация: отметить посещаемость списка депутатов одним запросом"""
+        if getattr(request.user, "user_type", "guest") not in ['deputy', 'admin']:
+            return Response(
+                {'detail': 'У вас нет прав для этого действия'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        session = self.get_object()
+        records = request.data.get('records') if isinstance(request.data, dict) else request.data
+        if not isinstance(records, list) or not records:
+            return Response(
+                {'detail': 'Передайте непустой список records'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-class VoteViewSet(viewsets.ModelViewSet):
-    queryset = Vote.objects.filter(is_active=True)
+        results = [None] * len(records)
+        entries = {}
+        for index, record in enumerate(records):
+            entry = RollCallEntrySerializer(data=record)
+            if entry.is_valid():
+                deputy_id = entry.validated_data['deputy_id']
+                if deputy_id in entries:
+                    # Повторная строка для того же депутата заменяет предыдущую
+                    results[entries[deputy_id][0]] = {'deputy_id': deputy_id, 'status': 'duplicate'}
+                entries[deputy_id] = (index, entry.validated_data)
+            else:
+                results[index] = {'deputy_id': record.get('deputy_id') if isinstance(record, dict) else None,
+                                  'status': 'invalid', 'errors': entry.errors}
+
+        # Проверка депутатов и существующих отметок - по одному запросу
+        known = set(Deputy.objects.filter(id__in=entries).values_list('id', flat=True))
+        existing = set(session.attendances.filter(deputy_id__in=known).values_list('deputy_id', flat=True))
+
+        attendances = []
+        for deputy_id, (index, data) in entries.items():
+            if deputy_id not in known:
+                results[index] = {'deputy_id': deputy_id, 'status': 'not_found'}
+                continue
+            attendances.append(Attendance(session=session, **data))
+            results[index] = {'deputy_id': deputy_id, 'status': 'updated' if deputy_id in existing else 'created'}
+
+        if attendances:
+            with transaction.atomic():
+                Attendance.objects.bulk_create(
+                    attendances,
+                    update_conflicts=True,
+                    unique_fields=['deputy', 'session'],
+                    update_fields=['is_present', 'absence_reason', 'arrival_time', 'departure_time', 'updated_at'],
+                )
+                attendance_bulk_changed.send(
+                    sender=Attendance,
+                    deputy_ids=[attendance.deputy_id for attendance in attendances],
+                    session_ids=[session.pk],
+                )
+
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        return Response({'session': session.pk, 'counts': counts, 'results': results})
+
+
+class VoteViewSet(ConditionalGetMixin, FieldSelectionMixin, viewsets.ModelViewSet):
+    queryset = Vote.objects.filter(is_active=True).order_by('-created_at', '-id')
     serializer_class = VoteSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cursor_ordering = ('-created_at', '-id')
+    etag_models = (Vote, VoteTally, Deputy)
+    field_querysets = {
+        'results': lambda queryset: queryset.select_related('tally'),
+        'deputy_votes': lambda queryset: queryset.prefetch_related(
+            Prefetch('deputy_votes', queryset=DeputyVote.objects.select_related('deputy'))
+        ),
+    }
     
     @action(detail=True, methods=['post'])
     def cast_vote(self, request, pk=None):
@@ -224,11 +586,23 @@ class VoteViewSet(viewsets.ModelViewSet):
         
         try:
             deputy = request.user.deputy_profile
-            deputy_vote, created = DeputyVote.objects.update_or_create(
-                vote=vote,
-                deputy=deputy,
-                defaults={'choice': choice}
-            )
+            if ingest.batching_enabled():
+                # Голос попадает в общую пачку, ответ - после фиксации транзакции
+                try:
+                    deputy_vote = ingest.submit_vote(vote.pk, deputy.pk, choice)
+                except futures.TimeoutError:
+                    return Response(
+                        {'detail': 'Голос не подтвержден, повторите попытку'},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE
+                    )
+            else:
+                # Голос и итоги голосования (VoteTally) фиксируются одной транзакцией
+                with transaction.atomic():
+                    deputy_vote, created = DeputyVote.objects.update_or_create(
+                        vote=vote,
+                        deputy=deputy,
+                        defaults={'choice': choice}
+                    )
             serializer = DeputyVoteSerializer(deputy_vote)
             return Response(serializer.data)
         except Deputy.DoesNotExist:
@@ -243,44 +617,125 @@ class StatisticsView(APIView):
     permission_classes = [permissions.AllowAny]
     
     def get(self, request):
-        # Общая статистика
-        total_deputies = Deputy.objects.count()
-        active_deputies = Deputy.objects.filter(is_active=True).count()
-        total_parties = Party.objects.count()
-        total_sessions = Session.objects.count()
-        
-        # Средняя посещаемость
-        avg_attendance = Attendance.objects.filter(
-            is_present=True
-        ).aggregate(
-            avg=Count('id') * 100.0 / Count('session__attendances')
-        )['avg'] or 0
-        
-        # Предстоящие заседания
-        upcoming_sessions = Session.objects.filter(
-            date__gt=timezone.now()
-        ).count()
-        
-        # Недавние заседания
-        recent_sessions = Session.objects.filter(
-            date__lte=timezone.now()
-        ).order_by('-date')[:5]
-        
-        # Топ депутатов по посещаемости
-        top_attendees = Deputy.objects.filter(is_active=True).annotate(
-            present_count=Count('attendances', filter=Q(attendances__is_present=True)),
-            total_count=Count('attendances')
-        ).filter(total_count__gt=0).order_by('-present_count')[:10]
-        
-        data = {
-            'total_deputies': total_deputies,
-            'active_deputies': active_deputies,
-            'total_parties': total_parties,
-            'total_sessions': total_sessions,
-            'average_attendance': round(avg_attendance, 2),
-            'upcoming_sessions': upcoming_sessions,
-            'recent_sessions': SessionListSerializer(recent_sessions, many=True).data,
-            'top_attendees': DeputyListSerializer(top_attendees, many=True).data
-        }
-        
-        return Response(data)
+        # Снимок пересчитывается при изменении данных, а не на каждый запрос
+        return Response(stats.get_snapshot())
+
+
+class StatisticsTrendsView(APIView):
+    """Динамика посещаемости по дням или месяцам из сводных таблиц.
+
+    ?dimension=deputy|party|session_type, ?period=day|month, ?key=1,2 (id или тип),
+    ?date_from=/?date_to= (ГГГГ-ММ-ДД). Дневные ряды по умолчанию - за последние 90 дней.
+    """
+    permission_classes = [permissions.AllowAny]
+    DAY_RANGE = timedelta(days=90)
+
+    def get(self, request):
+        params = request.query_params
+        dimension = params.get('dimension', 'party')
+        period = params.get('period', 'month')
+        if dimension not in rollups.DIMENSIONS or period not in rollups.PERIODS:
+            return Response(
+                {'detail': f'dimension: {", ".join(rollups.DIMENSIONS)}; period: {", ".join(rollups.PERIODS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        keys = sorted(split_param(params.get('key')))
+        if dimension == 'deputy' and not keys:
+            return Response(
+                {'detail': 'Укажите key - id депутатов через запятую'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        date_from, date_to = _date_params(params)
+        if period == 'day' and date_from is None:
+            date_from = (date_to or timezone.localdate()) - self.DAY_RANGE
+
+        data = rollups.series(dimension, period, keys, date_from, date_to)
+        labels = self._labels(dimension, data)
+        return Response({
+            'dimension': dimension,
+            'period': period,
+            'date_from': date_from,
+            'date_to': date_to,
+            'series': [
+                {'key': key, 'label': labels.get(key, key), 'points': points}
+                for key, points in data.items()
+            ],
+        })
+
+    def _labels(self, dimension, data):
+        ids = [int(key) for key in data if key.isdigit()]
+        if dimension == 'party':
+            labels = {str(pk): name for pk, name in Party.objects.filter(pk__in=ids).values_list('pk', 'name')}
+            labels[''] = 'Без партии'
+            return labels
+        if dimension == 'deputy':
+            return {str(deputy.pk): str(deputy) for deputy in
+                    Deputy.objects.filter(pk__in=ids).only('first_name', 'last_name', 'middle_name')}
+        return dict(Session.SESSION_TYPE_CHOICES)
+
+
+class ExportView(APIView):
+    """Потоковая выгрузка открытых данных: /api/export/<набор>.<csv|ndjson>.
+
+    Наборы: attendance, votes, deputy-votes, sessions, deputies. ?date_from=/?date_to=
+    ограничивают дату заседания, ?since_id= продолжает выгрузку после строки с этим id.
+    Ответ сжимается gzip, если клиент передал Accept-Encoding: gzip.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, dataset, fmt):
+        if dataset not in export.DATASETS or fmt not in export.FORMATS:
+            raise exceptions.NotFound()
+        date_from, date_to = _date_params(request.query_params)
+        since_id = _int_param(request.query_params, 'since_id', 0)
+        # Закрытые заседания, их посещаемость и голоса гостям не выгружаются
+        include_closed = (
+            request.user.is_authenticated
+            and getattr(request.user, "user_type", "guest") != "guest"
+        )
+        rows = export.queryset(dataset, date_from, date_to, since_id, include_closed)
+        return export.response(
+            dataset, fmt, rows,
+            compress=export.accepts_gzip(request),
+            asynchronous=isinstance(request._request, ASGIRequest),
+        )
+
+
+class ImportView(APIView):
+    """Массовая загрузка файла (поле file, CSV/NDJSON/JSON): /api/import/<набор>/.
+
+    Наборы и колонки - как в deputies/importer.py. Файлы в миллионы строк лучше
+    загружать командой import_parliament: здесь загрузка идет в рамках запроса.
+    """
+
+    def post(self, request, dataset):
+        if getattr(request.user, "user_type", "guest") != 'admin':
+            return Response(
+                {'detail': 'У вас нет прав для этого действия'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        if dataset not in importer.DATASETS:
+            raise exceptions.NotFound()
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise exceptions.ParseError('Передайте файл в поле file')
+        try:
+            fmt = importer.detect_format(upload.name)
+            # Большие загрузки Django держит во временном файле, он читается построчно
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            report = importer.import_file(dataset, stream, fmt)
+        except (ValueError, UnicodeDecodeError) as error:
+            raise exceptions.ParseError(str(error))
+        return Response(report)
+
+
+class ResponseCacheStatsView(APIView):
+    """Счетчики попаданий и промахов кэша ответов"""
+
+    def get(self, request):
+        if getattr(request.user, "user_type", "guest") != 'admin':
+            return Response(
+                {'detail': 'У вас нет прав для этого действия'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return Response(response_cache.statistics())
@@ -3,6 +3,11 @@ ASGI config for deputies_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Потоки событий /api/stream/sessions/<id>/ и /api/stream/votes/<id>/ работают
+только через этот вход, например:
+
+    uvicorn deputies_project.asgi:application --host 0.0.0.0 --port 8000
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
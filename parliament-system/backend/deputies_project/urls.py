@@ -1,7 +1,9 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.http import HttpResponse
 
+from deputies import thumbnails
+
 def api_root(request):
     html = """
     <!DOCTYPE html>
@@ -68,4 +70,6 @@ urlpatterns = [
     path('', api_root, name='api-root'),
     path('admin/', admin.site.urls),
     path('api/', include('deputies.urls')),
+    # Уменьшенные копии изображений: имена по хэшу содержимого, кэшируются на год
+    re_path(r'^media/thumbnails/(?P<path>[\w.-]+)$', thumbnails.serve, name='thumbnail'),
 ]
@@ -0,0 +1,24 @@
+#!/bin/sh
+# Запуск backend в контейнере.
+#   SERVER_MODE=wsgi|asgi - gunicorn (см. gunicorn.conf.py), dev - manage.py runserver
+#   MIGRATE=0 - не применять миграции при старте (например, когда их применяет отдельная задача)
+#   CACHE_BACKEND - для gunicorn по умолчанию file (кэш, общий для воркеров)
+set -e
+
+if [ "${MIGRATE:-1}" = "1" ]; then
+    python manage.py migrate --noinput
+fi
+
+if [ "$#" -gt 0 ]; then
+    exec "$@"
+fi
+
+if [ "${SERVER_MODE:-wsgi}" = "dev" ]; then
+    DEBUG=True exec python manage.py runserver 0.0.0.0:8000
+fi
+
+# Каталог проекта в docker-compose смонтирован с хоста поверх собранной статики
+python manage.py collectstatic --noinput -v 0
+# Воркеров несколько: кэши ответов и токенов - общий каталог, чтобы сброс и отзыв видели все
+export CACHE_BACKEND="${CACHE_BACKEND:-file}"
+exec gunicorn -c gunicorn.conf.py
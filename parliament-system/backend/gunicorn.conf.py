@@ -0,0 +1,61 @@
+"""
+Настройки gunicorn для продакшена: gunicorn -c gunicorn.conf.py
+
+SERVER_MODE=wsgi (по умолчанию) - синхронные воркеры на deputies_project.wsgi,
+2 * CPU + 1 процессов (GUNICORN_THREADS > 1 - воркеры gthread).
+SERVER_MODE=asgi - воркеры uvicorn на deputies_project.asgi, по процессу на CPU (не меньше двух);
+нужен для потоков событий /api/stream/....
+
+Приложение загружается до форка (preload_app): воркеры стартуют быстрее и делят
+память кода. Воркер перезапускается после max_requests запросов (с разбросом,
+чтобы не все сразу), так что утечки памяти не накапливаются.
+"""
+
+import multiprocessing
+import os
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+if SERVER_MODE not in ('wsgi', 'asgi'):
+    raise ValueError(f'SERVER_MODE: ожидается wsgi или asgi, получено {SERVER_MODE!r}')
+
+# Доступные процессу ядра: в контейнере с cpuset их меньше, чем на машине
+CPUS = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else multiprocessing.cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'deputies_project.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    # Не меньше двух: пока один воркер перезапускается (max_requests), запросы принимает другой
+    workers = int(os.environ.get('WEB_CONCURRENCY') or max(CPUS, 2))
+else:
+    wsgi_app = 'deputies_project.wsgi:application'
+    threads = int(os.environ.get('GUNICORN_THREADS') or 1)
+    worker_class = 'gthread' if threads > 1 else 'sync'
+    workers = int(os.environ.get('WEB_CONCURRENCY') or CPUS * 2 + 1)
+
+# Одновременные запросы в процессе (gthread, uvicorn) нужны пакетной записи голосов
+# (VOTE_INGEST_MODE=batched, см. deputies/ingest.py); синхронный воркер пишет голос сразу.
+# Приложение загружается после чтения этого файла, и настройки видят значение
+os.environ.setdefault('WORKER_CONCURRENT_REQUESTS', '0' if worker_class == 'sync' else '1')
+
+preload_app = True
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS') or 2000)
+max_requests_jitter = max_requests // 10
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 30)
+graceful_timeout = 30
+keepalive = 5
+
+# Файл сердцебиения воркеров - в памяти: на overlay-ФС Docker запись в /tmp может подвисать
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+# Адрес клиента и схема из заголовков обратного прокси
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+
+def when_ready(server):
+    # Соединения с базой, открытые при загрузке приложения, не должны достаться воркерам после форка
+    from django.db import connections
+    connections.close_all()